@@ -2,72 +2,618 @@
 """
 Mock aptly_publish.py script for testing the setup-aptly action.
 This simulates the real aptly_publish.py behavior for CI testing.
+
+The aptly database steps (repository, snapshot, publish) are only logged,
+but with an aptly root the published tree is real: packages are laid out
+under `<channel>/pool/<component>/`, `Packages` indexes and their
+compressed variants are written from the .deb control data, every
+distribution gets a `Release` with correct checksums, signed (InRelease
+and Release.gpg) when signing is enabled, and a local pages repository
+receives the touched paths as one commit. Tests and benchmarks therefore
+pay realistic disk, gpg and git costs without aptly or the network.
+
+The pipeline is available in-process as `publish(PublishConfig) -> PublishResult`;
+`main()` is a thin argparse wrapper around it.
+
+A distribution that is already published is updated one component at a
+time: only the targets' component indexes are rewritten, only their entries
+are patched in the distribution's `Release`, and only that `Release` is
+re-signed, so the cost scales with the component touched.
 """
 
 import argparse
 import logging
+import re
 import sys
+import tempfile
+from contextlib import ExitStack
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from batch import Target, group_packages, load_manifest
+from db_cache import check, invalidate, published_state, write_stamp
+from debscan import DebFormatError, DebInfo, data_files, set_control_field
+from indexes import (
+    DEFAULT_BY_HASH_WINDOW,
+    IndexWriteError,
+    merge_contents,
+    merge_packages,
+    packages_stanza,
+    parse_contents,
+    parse_packages,
+    pool_path,
+    render_contents,
+    render_packages,
+    write_indexes,
+)
+from ingest_cache import IngestCache, default_manifest_path
+from pages_sync import PagesSync, SyncError, SyncResult, touched_paths
+from planner import Plan, log_plan, plan_target, published_from_checkout
+from pool import LINK_MODES, ContentStore, PoolError, default_store, store_packages
+from preflight import check_deb, expected_filename, preflight
+from release import patch_release, release_components, write_release
+from retention import REFS_NAME, RefIndex
+from signing import GpgSession, SigningError
+from timing import PhaseTimer, write_report
+
+logger = logging.getLogger(__name__)
+
+GITHUB_REPO = re.compile(r"github\.com[/:](?P<owner>[^/]+)/(?P<repo>[^/]+?)(?:\.git)?/?$")
+RELEASE_ORIGIN = "Feel++"
+
+
+class PublishError(RuntimeError):
+    """Raised when a publish cannot be carried out."""
+
+
+@dataclass
+class PublishConfig:
+    """Everything one publish run needs; mirrors the command-line options."""
+
+    pages_repo: str
+    targets: List[Target] = field(default_factory=list)
+    branch: str = "gh-pages"
+    sign: bool = False
+    keyid: Optional[str] = None
+    passphrase: Optional[str] = field(default=None, repr=False)
+    gnupghome: Optional[str] = None
+    jobs: Optional[int] = None
+    aptly_root: Optional[str] = None
+    ingest_cache: Optional[str] = None
+    db_cache: bool = False
+    index_formats: Tuple[str, ...] = ("gz", "xz")
+    contents: bool = False
+    pdiffs: int = 0
+    by_hash: bool = False
+    by_hash_window: float = DEFAULT_BY_HASH_WINDOW
+    link_mode: str = "auto"
+    allow_invalid: bool = False
+    base_url: Optional[str] = None
+    pages_checkout: Optional[str] = None
+    dry_run: bool = False
+    auto_bump: bool = False
+
+    @classmethod
+    def single(cls, component: str, debs, pages_repo: str, distro: str = "noble",
+               channel: str = "stable", **options) -> "PublishConfig":
+        """Configuration for one component/distro/channel target."""
+        return cls(pages_repo, [Target(component, distro, channel, str(debs))], **options)
+
+
+@dataclass
+class PublishResult:
+    """What a publish did: packages per outcome, per-phase timings and where it is served."""
+
+    targets: List[Target]
+    added: List[DebInfo] = field(default_factory=list)
+    skipped: List[DebInfo] = field(default_factory=list)
+    invalid: List[str] = field(default_factory=list)
+    report: Dict = field(default_factory=dict)
+    urls: Dict[str, Optional[str]] = field(default_factory=dict)
+    plans: List[Plan] = field(default_factory=list)
+    releases: List[str] = field(default_factory=list)
+    sync: Optional[SyncResult] = None
+
+    @property
+    def published(self) -> bool:
+        return bool(self.added)
+
+    @property
+    def seconds(self) -> float:
+        return self.report.get("total", {}).get("wall_seconds", 0.0)
+
+
+def publication_url(pages_repo: str, channel: str, distro: str, base_url: Optional[str] = None) -> Optional[str]:
+    """URL of a published distribution; derived from GitHub pages repositories when no base is given."""
+    if base_url is None:
+        match = GITHUB_REPO.search(pages_repo)
+        if match is None:
+            return None
+        base_url = f"https://{match['owner']}.github.io/{match['repo']}"
+    return f"{base_url.rstrip('/')}/{channel}/dists/{distro}/"
+
+
+def _dists_dir(public, target: Target) -> Path:
+    return Path(public) / target.channel / "dists" / target.distro
+
+
+def write_distribution_indexes(public, groups, formats, contents=False, jobs=None, pdiffs=0, by_hash=None):
+    """Merge the groups' packages into each distribution's indexes and write them; returns the result per dists dir."""
+    by_dists = {}
+    for group in groups:
+        target = group.target
+        dists = _dists_dir(public, target)
+        indexes = by_dists.setdefault(dists, {})
+        packages_rel = f"{target.component}/binary-{group.architecture}/Packages"
+        existing = dists / packages_rel
+        stanzas = parse_packages(existing.read_text()) if existing.exists() else []
+        added = [packages_stanza(pkg, pool_path(target.component, pkg)) for pkg in group.packages]
+        indexes[packages_rel] = render_packages(merge_packages(stanzas, added))
+
+        if contents:
+            contents_rel = f"{target.component}/Contents-{group.architecture}"
+            existing = dists / contents_rel
+            entries = parse_contents(existing.read_text()) if existing.exists() else {}
+            locations = {pkg: f"{pkg.control.get('Section', 'misc')}/{pkg.name}" for pkg in group.packages}
+            added = {}
+            for pkg, location in locations.items():
+                for path in data_files(pkg.path):
+                    added.setdefault(path, []).append(location)
+            indexes[contents_rel] = render_contents(merge_contents(entries, locations.values(), added))
+
+    return {dists: write_indexes(dists, indexes, formats, jobs, pdiffs=pdiffs, by_hash=by_hash)
+            for dists, indexes in by_dists.items()}
+
+
+def is_local_repo(pages_repo: str) -> bool:
+    """Whether the pages repository is a local path or file:// URL (the mock pushes only there)."""
+    return pages_repo.startswith("file://") or Path(pages_repo).exists()
+
+
+def write_distribution_releases(written, components, by_hash: bool = False) -> List[Path]:
+    """
+    Bring each distribution's Release up to date with the index files just written.
+
+    An existing Release only has those files' entries patched, and gets the
+    components written but not listed yet added to `Components`; a
+    distribution without one gets a complete Release. Returns the Release files.
+    """
+    releases = []
+    for dists, indexes in written.items():
+        fields = {"Acquire-By-Hash": "yes"} if by_hash else {}
+        listed = release_components(dists)
+        if listed is None:
+            releases.append(write_release(dists, dists.name, origin=RELEASE_ORIGIN, label=RELEASE_ORIGIN,
+                                          fields=fields))
+            continue
+        missing = sorted(set(components.get(dists, ())) - set(listed))
+        if missing:
+            fields["Components"] = " ".join(listed + missing)
+        releases.append(patch_release(dists, indexes.files, fields=fields or None))
+    return releases
+
+
+def bump_package(pkg: DebInfo, version: str, stage_dir) -> DebInfo:
+    """
+    The package rebuilt as `version` (auto-bump).
+
+    A copy with the Version of its control.tar.* rewritten is written to
+    stage_dir under the matching name, so what apt installs, the pool path
+    and the Filename all carry the new version and never replace the
+    published build. Size and digests are those of the rebuilt file.
+    """
+    path = Path(stage_dir) / expected_filename(dict(pkg.control, Version=version))
+    set_control_field(pkg.path, path, "Version", version)
+    return check_deb(path)
+
+
+def publish(config: PublishConfig) -> PublishResult:
+    """Run the publish pipeline for every target of `config`."""
+    with ExitStack() as stack:
+        return _publish(config, stack)
+
+
+def _publish(config: PublishConfig, stack: ExitStack) -> PublishResult:
+    targets = config.targets
+    if not targets:
+        raise PublishError("No publication targets")
+    if config.sign and not config.keyid:
+        raise PublishError("GPG key ID required for signing")
+    if config.db_cache and not config.aptly_root:
+        raise PublishError("db_cache requires aptly_root")
+
+    logger.info("Mock aptly_publish.py started")
+    for target in targets:
+        logger.info("Target %s from %s", target.key, target.debs)
+    logger.info("Pages repo: %s", config.pages_repo)
+    logger.info("Signing: %s", "yes" if config.sign else "no")
+
+    # Verify .deb files exist
+    deb_dirs = {}
+    for debs in sorted({target.debs for target in targets}):
+        debs_path = Path(debs)
+        if not debs_path.exists():
+            raise PublishError(f"Debs path does not exist: {debs_path}")
+        found = list(debs_path.glob("*.deb"))
+        if not found:
+            raise PublishError(f"No .deb files found in: {debs_path}")
+        deb_dirs.update((str(deb), debs) for deb in found)
+
+    logger.info("Found %d .deb files", len(deb_dirs))
+
+    timer = PhaseTimer()
+    result = PublishResult(targets)
+
+    # Validate and hash every debs directory once, in one pool, for all targets;
+    # later stages reuse these digests
+    with timer.phase("preflight") as span:
+        checked = preflight(deb_dirs, jobs=config.jobs)
+        packages = checked.packages
+        span.packages = len(packages)
+        span.bytes_read = sum(pkg.size for pkg in packages)
+    for path, problems in sorted(checked.failures.items()):
+        for problem in problems:
+            logger.log(logging.WARNING if config.allow_invalid else logging.ERROR,
+                       "%s: %s", Path(path).name, problem)
+    if checked.failures and not config.allow_invalid:
+        raise PublishError(f"Preflight failed for {len(checked.failures)} of {len(deb_dirs)} .deb files")
+    logger.info("Preflight passed for %d packages", len(packages))
+    result.invalid = sorted(checked.failures)
+    packages_by_dir = {}
+    for pkg in packages:
+        logger.info("  - %s %s (%s, %d bytes, sha256 %s)",
+                    pkg.name, pkg.version, pkg.architecture, pkg.size, pkg.sha256[:12])
+        packages_by_dir.setdefault(deb_dirs[pkg.path], []).append(pkg)
+
+    groups = group_packages(targets, packages_by_dir)
+
+    # Diff against what is already served before any aptly work
+    if config.pages_checkout:
+        with timer.phase("plan") as span:
+            for target in targets:
+                own = {pkg.path: pkg for group in groups if group.target is target for pkg in group.packages}
+                plan = plan_target(target, own.values(),
+                                   published_from_checkout(config.pages_checkout, target))
+                log_plan(plan)
+                result.plans.append(plan)
+            span.packages = sum(len(plan.entries) for plan in result.plans)
+        conflicts = [e for plan in result.plans for e in plan.of("conflict")]
+        changes = {(plan.target.key, e.path) for plan in result.plans for e in plan.changes}
+        if config.dry_run:
+            logger.info("Dry run: %d packages would be published", len(changes))
+            result.report = timer.report()
+            return result
+        bumps = {}
+        if config.auto_bump:
+            # The conflicting builds go out under the next free Debian revision
+            bumps = {(plan.target.key, e.path): e.bump for plan in result.plans for e in plan.of("conflict")}
+            changes.update(bumps)
+        elif conflicts and not config.allow_invalid:
+            raise PublishError(f"{len(conflicts)} packages are already published with different content")
+        unchanged = {}
+        for group in groups:
+            unchanged.update((pkg.path, pkg) for pkg in group.packages
+                             if (group.target.key, pkg.path) not in changes)
+            group.packages = [pkg for pkg in group.packages if (group.target.key, pkg.path) in changes]
+        result.skipped.extend(unchanged.values())
+        if bumps:
+            bump_dir = stack.enter_context(tempfile.TemporaryDirectory(prefix="auto-bump-"))
+            try:
+                for group in groups:
+                    bumped = []
+                    for pkg in group.packages:
+                        version = bumps.get((group.target.key, pkg.path))
+                        if version:
+                            logger.info("Auto-bumping %s %s to %s", pkg.name, pkg.version, version)
+                            pkg = bump_package(pkg, version, bump_dir)
+                        bumped.append(pkg)
+                    group.packages = bumped
+            except (DebFormatError, OSError) as e:
+                raise PublishError(f"Cannot rebuild bumped packages: {e}") from e
+        if not changes:
+            logger.info("Nothing to publish: every package is already published")
+            result.report = timer.report()
+            return result
+    elif config.dry_run:
+        raise PublishError("dry_run requires pages_checkout")
+
+    cache = None
+    ingested = {}
+    if config.ingest_cache or config.aptly_root:
+        with timer.phase("ingest-cache") as span:
+            manifest = (Path(config.ingest_cache) if config.ingest_cache
+                        else default_manifest_path(config.aptly_root))
+            cache = IngestCache.load(manifest)
+            for group in groups:
+                new, unchanged = cache.partition(group.target.key, group.packages)
+                logger.info("Ingest cache: %d new or changed, %d unchanged (skipped)",
+                            len(new), len(unchanged))
+                group.packages = new
+                ingested.setdefault(group.target.key, []).extend(new)
+                result.skipped.extend(unchanged)
+            span.packages = sum(len(group.packages) for group in groups)
+
+    if config.db_cache:
+        with timer.phase("db-check"):
+            try:
+                valid, reasons = check(config.aptly_root, published_state(config.pages_repo, config.branch))
+            except SyncError as e:
+                raise PublishError(f"Cannot read published state: {e}") from e
+        if valid:
+            logger.info("aptly database matches the published repository, skipping recovery")
+        else:
+            with timer.phase("recover"):
+                logger.info("aptly database is stale: %s", "; ".join(reasons))
+                invalidate(config.aptly_root)
+                logger.info("Mock: Recovering aptly database from published repository...")
+                (Path(config.aptly_root) / "db").mkdir(parents=True, exist_ok=True)
+
+    # Simulate aptly operations against one shared aptly DB
+    with timer.phase("add-packages") as span:
+        for group in groups:
+            logger.info("Mock: Creating aptly repository %s...", group.repo_name)
+            logger.info("Mock: Adding %d packages to repository...", len(group.packages))
+        span.packages = sum(len(group.packages) for group in groups)
+    with timer.phase("snapshot"):
+        for target in targets:
+            logger.info("Mock: Creating snapshot for %s...", target.key)
+    # A published distribution only gets the targets' components switched to
+    # their new snapshots; a first publication is always complete
+    switched = set()
+    if config.aptly_root:
+        public = Path(config.aptly_root) / "public"
+        switched = {target.key for target in targets if (_dists_dir(public, target) / "Release").exists()}
+    with timer.phase("publish"):
+        for target in targets:
+            if target.key in switched:
+                logger.info("Mock: Switching component %s of %s/%s to its new snapshot...",
+                            target.component, target.channel, target.distro)
+        if len(switched) < len(targets):
+            logger.info("Mock: Publishing %d snapshot(s)...", len(targets) - len(switched))
+
+    sync_local = bool(config.aptly_root) and is_local_repo(config.pages_repo)
+    if sync_local:
+        # A fresh or stale aptly root builds on what is published, not on an empty tree
+        with timer.phase("seed") as span:
+            public = Path(config.aptly_root) / "public"
+            channels = sorted({target.channel for target in targets})
+            try:
+                with PagesSync(config.pages_repo, config.branch) as pages:
+                    span.packages = pages.seed(pages.fetch_tip(), public,
+                                               [path for channel in channels
+                                                for path in (f"{channel}/dists", f"{channel}/{REFS_NAME}")])
+            except SyncError as e:
+                raise PublishError(f"Cannot read the pages repository: {e}") from e
+            if span.packages:
+                logger.info("Seeded %d published files from the pages repository", span.packages)
+
+    if config.aptly_root:
+        with timer.phase("pool") as span:
+            store = ContentStore(default_store(config.aptly_root), config.link_mode)
+            public = Path(config.aptly_root) / "public"
+            try:
+                for group in groups:
+                    target = group.target
+                    entries = store_packages(store, target.component, group.packages, pool_path)
+                    linked = store.materialize(entries, public / target.channel)
+                    logger.info("Pool %s: %s", group.repo_name,
+                                ", ".join(f"{n} {m}" for m, n in sorted(linked.methods.items()))
+                                or "nothing new")
+            except PoolError as e:
+                raise PublishError(str(e)) from e
+            span.packages = sum(len(group.packages) for group in groups)
+        with timer.phase("indexes") as span:
+            try:
+                written = write_distribution_indexes(public, groups, config.index_formats,
+                                                     config.contents, config.jobs, config.pdiffs,
+                                                     config.by_hash_window if config.by_hash else None)
+                components = {}
+                for group in groups:
+                    components.setdefault(_dists_dir(public, group.target), set()).add(group.target.component)
+                releases = write_distribution_releases(written, components, config.by_hash)
+                result.releases = [str(release) for release in releases]
+            except (IndexWriteError, DebFormatError, OSError) as e:
+                raise PublishError(f"Cannot write indexes: {e}") from e
+            # Keep the pool reference counts current for retention and GC
+            for channel in sorted({target.channel for target in targets}):
+                refs = RefIndex.load(public / channel / REFS_NAME)
+                refs.reconcile(public / channel)
+                refs.save()
+            span.packages = sum(len(group.packages) for group in groups)
+        logger.info("Indexes written: %d, unchanged: %d", sum(len(r.written) for r in written.values()),
+                    sum(len(r.skipped) for r in written.values()))
+
+    if config.sign:
+        with timer.phase("sign"):
+            if config.aptly_root:
+                # Only the Release files written by this run changed
+                try:
+                    with GpgSession(config.keyid, config.passphrase, config.gnupghome, config.jobs) as session:
+                        session.sign_all(result.releases)
+                except SigningError as e:
+                    raise PublishError(f"Cannot sign Release: {e}") from e
+            else:
+                logger.info("Mock: Signing repository with key %s", config.keyid)
+    elif config.aptly_root:
+        # Signatures of a Release rewritten without signing no longer match it
+        for release in result.releases:
+            for name in ("InRelease", "Release.gpg"):
+                Path(release).with_name(name).unlink(missing_ok=True)
+
+    with timer.phase("sync") as span:
+        paths = sorted({path for target in targets
+                        for path in touched_paths(target.channel, target.distro, [target.component])
+                        + [f"{target.channel}/{REFS_NAME}"]})
+        if sync_local:
+            # Only what this publish owns may disappear: its components' index files,
+            # and the distribution signatures dropped above
+            prune = sorted({path for target in targets
+                            for path in (f"{target.channel}/dists/{target.distro}/{target.component}",
+                                         f"{target.channel}/dists/{target.distro}/InRelease",
+                                         f"{target.channel}/dists/{target.distro}/Release.gpg")})
+            try:
+                with PagesSync(config.pages_repo, config.branch) as pages:
+                    result.sync = pages.sync(public, paths, "Publish " + ", ".join(t.key for t in targets),
+                                             prune=prune)
+            except SyncError as e:
+                raise PublishError(f"Cannot sync to the pages repository: {e}") from e
+            span.bytes_written = result.sync.bytes_written
+        elif switched:
+            logger.info("Mock: Syncing %s to pages repository...", ", ".join(paths))
+        else:
+            logger.info("Mock: Syncing to pages repository...")
+
+    if config.db_cache:
+        try:
+            write_stamp(config.aptly_root, published_state(config.pages_repo, config.branch))
+        except SyncError as e:
+            raise PublishError(f"Cannot read published state: {e}") from e
+
+    if cache is not None:
+        with timer.phase("ingest-record"):
+            for key, new in ingested.items():
+                cache.record(key, new)
+            cache.save()
+
+    logger.info("Mock: Publishing completed successfully")
+
+    # A package shared by several targets (e.g. Architecture: all) counts once
+    seen = set()
+    for group in groups:
+        for pkg in group.packages:
+            if pkg.path not in seen:
+                seen.add(pkg.path)
+                result.added.append(pkg)
+    result.report = timer.report()
+    result.urls = {target.key: publication_url(config.pages_repo, target.channel, target.distro,
+                                               config.base_url)
+                   for target in targets}
+    for phase in result.report["phases"]:
+        logger.debug("Phase %-14s %8.3fs wall %8.3fs cpu %6d packages", phase["name"],
+                     phase["wall_seconds"], phase["cpu_seconds"], phase["packages"])
+    return result
+
 
 def main():
     parser = argparse.ArgumentParser(description="Mock aptly publish script for testing")
-    parser.add_argument("--component", required=True)
+    parser.add_argument("--component", default=None)
     parser.add_argument("--distro", default="noble")
     parser.add_argument("--channel", default="stable")
-    parser.add_argument("--debs", required=True)
+    parser.add_argument("--debs", default=None)
+    parser.add_argument("--manifest", default=None,
+                        help="YAML/JSON list of targets to publish in one batch "
+                             "(replaces --component/--distro/--channel/--debs)")
     parser.add_argument("--pages-repo", required=True)
     parser.add_argument("--branch", default="gh-pages")
     parser.add_argument("--verbose", action="store_true")
     parser.add_argument("--sign", action="store_true")
     parser.add_argument("--keyid", default=None)
     parser.add_argument("--passphrase", default=None)
-    
+    parser.add_argument("--gnupghome", default=None,
+                        help="GnuPG home holding the signing key (default: GNUPGHOME or ~/.gnupg)")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="Worker processes for scanning .deb files (default: CPU count)")
+    parser.add_argument("--aptly-root", default=None,
+                        help="aptly root; enables the ingest cache stored next to it")
+    parser.add_argument("--ingest-cache", default=None,
+                        help="Ingest cache manifest path (overrides the --aptly-root default)")
+    parser.add_argument("--db-cache", action="store_true",
+                        help="Reuse the aptly database in --aptly-root when it matches the published "
+                             "Release files; recover it only otherwise")
+    parser.add_argument("--index-formats", default="gz,xz",
+                        help="Compressed variants of the Packages/Contents indexes (gz, xz, zst)")
+    parser.add_argument("--contents", action="store_true", help="Also write Contents-<arch> indexes")
+    parser.add_argument("--pdiffs", type=int, default=0,
+                        help="Keep this many Packages pdiffs so apt fetches deltas (0 disables them)")
+    parser.add_argument("--by-hash", action="store_true",
+                        help="Also publish indexes under by-hash/SHA256/ and set Acquire-By-Hash")
+    parser.add_argument("--by-hash-window-hours", type=float, default=DEFAULT_BY_HASH_WINDOW / 3600,
+                        help="How long superseded by-hash indexes are kept")
+    parser.add_argument("--link-mode", choices=LINK_MODES, default="auto",
+                        help="How channel pools are materialized from the content store")
+    parser.add_argument("--allow-invalid", action="store_true",
+                        help="Skip .deb files that fail preflight validation instead of failing")
+    parser.add_argument("--pages-checkout", default=None,
+                        help="Local checkout of the pages branch; packages already published "
+                             "there are left out of the publish")
+    parser.add_argument("--auto-bump", action="store_true",
+                        help="Rebuild packages that conflict with a published version with the next "
+                             "Debian revision in their control data and publish them (with --pages-checkout)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Print the publish plan and stop before any aptly work "
+                             "(requires --pages-checkout)")
+    parser.add_argument("--report", default=None,
+                        help="Write a JSON report of per-phase timings to this file")
+
     args = parser.parse_args()
-    
+    if not args.manifest and not (args.component and args.debs):
+        parser.error("--component and --debs are required unless --manifest is given")
+    if args.db_cache and not args.aptly_root:
+        parser.error("--db-cache requires --aptly-root")
+    if args.dry_run and not args.pages_checkout:
+        parser.error("--dry-run requires --pages-checkout")
+
     logging.basicConfig(
         level=logging.DEBUG if args.verbose else logging.INFO,
         format="%(levelname)s: %(message)s",
     )
-    
-    logging.info("Mock aptly_publish.py started")
-    logging.info("Component: %s", args.component)
-    logging.info("Distribution: %s", args.distro)
-    logging.info("Channel: %s", args.channel)
-    logging.info("Debs path: %s", args.debs)
-    logging.info("Pages repo: %s", args.pages_repo)
-    logging.info("Signing: %s", "yes" if args.sign else "no")
-    
-    # Verify .deb files exist
-    debs_path = Path(args.debs)
-    if not debs_path.exists():
-        logging.error("Debs path does not exist: %s", debs_path)
-        sys.exit(1)
-    
-    deb_files = list(debs_path.glob("*.deb"))
-    if not deb_files:
-        logging.error("No .deb files found in: %s", debs_path)
-        sys.exit(1)
-    
-    logging.info("Found %d .deb files", len(deb_files))
-    for deb in deb_files:
-        logging.info("  - %s", deb.name)
-    
-    # Simulate aptly operations
-    logging.info("Mock: Creating aptly repository...")
-    logging.info("Mock: Adding packages to repository...")
-    logging.info("Mock: Creating snapshot...")
-    logging.info("Mock: Publishing snapshot...")
-    
-    if args.sign:
-        if not args.keyid:
-            logging.error("GPG key ID required for signing")
+
+    if args.manifest:
+        try:
+            targets = load_manifest(args.manifest)
+        except (OSError, ValueError) as e:
+            logging.error("Invalid manifest: %s", e)
             sys.exit(1)
-        logging.info("Mock: Signing repository with key %s", args.keyid)
-    
-    logging.info("Mock: Syncing to pages repository...")
-    logging.info("Mock: Publishing completed successfully")
-    
-    print(f"Mock publish completed for {args.component} ({args.distro}/{args.channel})")
+        logging.info("Manifest: %s (%d targets)", args.manifest, len(targets))
+    else:
+        targets = [Target(args.component, args.distro, args.channel, args.debs)]
+
+    config = PublishConfig(
+        pages_repo=args.pages_repo,
+        targets=targets,
+        branch=args.branch,
+        sign=args.sign,
+        keyid=args.keyid,
+        passphrase=args.passphrase,
+        gnupghome=args.gnupghome,
+        jobs=args.jobs,
+        aptly_root=args.aptly_root,
+        ingest_cache=args.ingest_cache,
+        db_cache=args.db_cache,
+        index_formats=tuple(f for f in args.index_formats.split(",") if f),
+        contents=args.contents,
+        pdiffs=args.pdiffs,
+        by_hash=args.by_hash,
+        by_hash_window=args.by_hash_window_hours * 3600,
+        link_mode=args.link_mode,
+        allow_invalid=args.allow_invalid,
+        pages_checkout=args.pages_checkout,
+        dry_run=args.dry_run,
+        auto_bump=args.auto_bump,
+    )
+    try:
+        result = publish(config)
+    except PublishError as e:
+        logging.error("%s", e)
+        sys.exit(1)
+
+    if args.report:
+        write_report(result.report, args.report)
+        logging.info("Performance report written to %s", args.report)
+
+    if args.dry_run:
+        for plan in result.plans:
+            for entry in plan.entries:
+                print(f"{entry.action}\t{entry.name}\t{entry.version}\t{entry.architecture}\t{plan.target.key}"
+                      + (f"\t{entry.bump}" if entry.bump else ""))
+        return
+    if not result.published:
+        print("Nothing to publish")
+        return
+    for target in targets:
+        print(f"Mock publish completed for {target.component} ({target.distro}/{target.channel})")
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
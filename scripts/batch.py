@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Manifest-driven batch publishing.
+
+A manifest lists publication targets (component/distro/channel/debs), either
+as a top-level list or as a mapping with `targets` and optional `defaults`:
+
+    defaults:
+      channel: testing
+    targets:
+      - component: base
+        distro: noble
+        debs: build/base
+      - component: feelpp
+        distro: jammy
+        debs: build/feelpp
+        architectures: [amd64, arm64]
+
+Packages are scanned once and grouped per target by their Architecture
+control field, so every snapshot can be built against one shared aptly DB.
+
+The command line lists the targets of a manifest, one tab-separated
+`component distro channel debs architectures` line each, and stages the
+packages of a debs directory that belong to a target's architectures, so a
+publisher without architecture selection only sees those:
+
+    python scripts/batch.py --manifest targets.yml
+    python scripts/batch.py --debs build/feelpp --architectures amd64,arm64 --stage staged/
+"""
+
+import argparse
+import json
+import logging
+import sys
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from debscan import DebFormatError, DebInfo
+from ingest_cache import stage_packages
+from preflight import load_records, scan_known
+
+ARCH_ALL = "all"
+
+
+@dataclass(frozen=True)
+class Target:
+    """One channel/distro/component publication fed from a debs directory."""
+
+    component: str
+    distro: str = "noble"
+    channel: str = "stable"
+    debs: str = ""
+    architectures: Optional[Tuple[str, ...]] = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.channel}/{self.distro}/{self.component}"
+
+
+@dataclass
+class BatchGroup:
+    """Packages of one architecture destined for one target."""
+
+    target: Target
+    architecture: str
+    packages: List[DebInfo]
+
+    @property
+    def repo_name(self) -> str:
+        return f"{self.target.channel}-{self.target.distro}-{self.target.component}-{self.architecture}"
+
+
+def _load_document(path: Path):
+    text = path.read_text()
+    if path.suffix == ".json":
+        return json.loads(text)
+    try:
+        import yaml
+    except ImportError as e:
+        raise ValueError(f"Reading {path} requires PyYAML (or use a .json manifest)") from e
+    return yaml.safe_load(text)
+
+
+def target_from_dict(entry, defaults: Optional[dict] = None, where: str = "target") -> Target:
+    """Validate one manifest entry (merged over `defaults`) and build its Target."""
+    if not isinstance(entry, dict):
+        raise ValueError(f"{where} is not a mapping")
+    merged = {**(defaults or {}), **entry}
+    unknown = set(merged) - {"component", "distro", "channel", "debs", "architectures"}
+    if unknown:
+        raise ValueError(f"{where} has unknown keys: {', '.join(sorted(unknown))}")
+    for required in ("component", "debs"):
+        if not merged.get(required):
+            raise ValueError(f"{where} lacks '{required}'")
+    archs = merged.get("architectures")
+    if isinstance(archs, str):
+        archs = [archs]
+    return Target(
+        component=str(merged["component"]),
+        distro=str(merged.get("distro", "noble")),
+        channel=str(merged.get("channel", "stable")),
+        debs=str(merged["debs"]),
+        architectures=tuple(archs) if archs else None,
+    )
+
+
+def write_manifest(targets: Iterable[Target], path) -> Path:
+    """Write targets as a JSON manifest that load_manifest() reads back."""
+    path = Path(path)
+    entries = []
+    for target in targets:
+        entry = {"component": target.component, "distro": target.distro,
+                 "channel": target.channel, "debs": target.debs}
+        if target.architectures:
+            entry["architectures"] = list(target.architectures)
+        entries.append(entry)
+    path.write_text(json.dumps({"targets": entries}, indent=2) + "\n")
+    return path
+
+
+def load_manifest(path) -> List[Target]:
+    """Load and validate a YAML or JSON batch manifest."""
+    path = Path(path)
+    document = _load_document(path)
+    defaults = {}
+    if isinstance(document, dict):
+        defaults = document.get("defaults") or {}
+        document = document.get("targets")
+    if not isinstance(document, list) or not document:
+        raise ValueError(f"{path}: expected a non-empty list of targets")
+
+    targets = [target_from_dict(entry, defaults, f"{path}: target #{index + 1}")
+               for index, entry in enumerate(document)]
+
+    seen = set()
+    for target in targets:
+        if target.key in seen:
+            raise ValueError(f"{path}: duplicate target {target.key}")
+        seen.add(target.key)
+    return targets
+
+
+def group_packages(targets: Iterable[Target], packages_by_dir: Dict[str, List[DebInfo]]) -> List[BatchGroup]:
+    """
+    Group scanned packages per target and Architecture.
+
+    Architecture: all packages are published into every concrete architecture
+    of their target, as apt expects; they form their own group only when the
+    target has no architecture-specific packages.
+    """
+    groups = []
+    for target in targets:
+        by_arch: Dict[str, List[DebInfo]] = OrderedDict()
+        arch_all = []
+        for pkg in packages_by_dir.get(target.debs, []):
+            if pkg.architecture == ARCH_ALL:
+                arch_all.append(pkg)
+            elif target.architectures is None or pkg.architecture in target.architectures:
+                by_arch.setdefault(pkg.architecture, []).append(pkg)
+
+        if target.architectures:
+            for arch in target.architectures:
+                if arch != ARCH_ALL:
+                    by_arch.setdefault(arch, [])
+        if arch_all and not by_arch:
+            by_arch[ARCH_ALL] = []
+
+        for arch in sorted(by_arch):
+            members = by_arch[arch] + arch_all
+            if members:
+                groups.append(BatchGroup(target, arch, members))
+    return groups
+
+
+def select_packages(target: Target, packages: Iterable[DebInfo]) -> List[DebInfo]:
+    """The packages `target` publishes: its architectures' packages plus Architecture: all ones."""
+    packages = list(packages)
+    selected = {pkg.path for group in group_packages([target], {target.debs: packages})
+                for pkg in group.packages}
+    return [pkg for pkg in packages if pkg.path in selected]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List the targets of a batch publish manifest, "
+                                                 "or stage the packages of some architectures")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--manifest", help="Print one component/distro/channel/debs/architectures line per target")
+    mode.add_argument("--debs", help="Stage the packages of this directory built for --architectures")
+    parser.add_argument("--architectures", default="", help="Comma-separated architectures to stage (--debs)")
+    parser.add_argument("--stage", default=None, help="Directory receiving the selected packages (--debs)")
+    parser.add_argument("--jobs", type=int, default=None)
+    parser.add_argument("--records", default=None, help="Package records saved by preflight.py --records (--debs)")
+    args = parser.parse_args()
+
+    if args.debs:
+        archs = tuple(arch for arch in args.architectures.split(",") if arch)
+        if not archs or not args.stage:
+            parser.error("--debs requires --architectures and --stage")
+        logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+        target = Target("", debs=args.debs, architectures=archs)
+        records = load_records(args.records) if args.records else None
+        try:
+            packages = scan_known(Path(args.debs).glob("*.deb"), records, args.jobs)
+        except DebFormatError as e:
+            logging.error("%s", e)
+            sys.exit(1)
+        selected = select_packages(target, packages)
+        stage_packages(selected, args.stage)
+        logging.info("%s: %d of %d packages built for %s", args.debs, len(selected), len(packages),
+                     ", ".join(archs))
+        print(len(selected))
+        return
+
+    try:
+        targets = load_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    for target in targets:
+        print("\t".join([target.component, target.distro, target.channel, target.debs,
+                         ",".join(target.architectures or ())]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Publishing scalability benchmark.
+
+Generates synthetic repositories (configurable package counts, payload
+sizes and version histories), publishes them end to end with
+aptly_publish.py against a local aptly root and a local bare git "pages"
+repository, and records wall time, peak RSS and bytes written per phase.
+
+    python scripts/benchmark.py run --counts 10,100,1000 --output bench.json
+    python scripts/benchmark.py compare baseline.json bench.json
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+PUBLISH_SCRIPT = SCRIPTS_DIR / "aptly_publish.py"
+RESULTS_VERSION = 1
+
+
+def _ar_member(name: str, data: bytes) -> bytes:
+    header = f"{name:<16}{0:<12}{0:<6}{0:<6}{'100644':<8}{len(data):<10}`\n".encode("ascii")
+    return header + data + (b"\n" if len(data) % 2 else b"")
+
+
+def _tar_gz(files: Dict[str, bytes]) -> bytes:
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz", compresslevel=1) as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mode = 0o644
+            tar.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def build_deb(output_dir, name: str, version: str, architecture: str = "amd64",
+              payload_size: int = 4096, fields: Optional[Dict[str, str]] = None) -> Path:
+    """Write a minimal but well-formed .deb without dpkg-deb."""
+    control = {
+        "Package": name,
+        "Version": version,
+        "Architecture": architecture,
+        "Maintainer": "Benchmark <bench@example.com>",
+        "Section": "misc",
+        "Priority": "optional",
+        "Description": f"Synthetic package {name}",
+    }
+    control.update(fields or {})
+    control_text = "".join(f"{key}: {value}\n" for key, value in control.items())
+
+    deb = Path(output_dir) / f"{name}_{version}_{architecture}.deb"
+    with open(deb, "wb") as f:
+        f.write(b"!<arch>\n")
+        f.write(_ar_member("debian-binary", b"2.0\n"))
+        f.write(_ar_member("control.tar.gz", _tar_gz({"./control": control_text.encode()})))
+        f.write(_ar_member("data.tar.gz", _tar_gz({f"./usr/share/{name}/payload": os.urandom(payload_size)})))
+    return deb
+
+
+def generate_repository(output_dir, count: int, payload_size: int = 4096,
+                        revision: int = 1, changed: Optional[int] = None,
+                        depends: bool = False) -> List[Path]:
+    """
+    Generate `count` packages named bench-pkg-NNNNN.
+
+    Revision r of the history bumps the version of the first `changed`
+    packages (all of them by default); the rest keep revision 1. With
+    `depends`, package i depends on package (i - 1) // 2, a binary tree
+    rooted at bench-pkg-00000, so installs have something to resolve.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for stale in output_dir.glob("*.deb"):
+        stale.unlink()
+    changed = count if changed is None else changed
+    debs = []
+    for index in range(count):
+        rev = revision if index < changed else 1
+        fields = {"Depends": f"bench-pkg-{(index - 1) // 2:05d}"} if depends and index else None
+        debs.append(build_deb(output_dir, f"bench-pkg-{index:05d}", f"1.0.0-{rev}",
+                              payload_size=payload_size, fields=fields))
+    return debs
+
+
+def tree_size(path) -> int:
+    """Total size of the files under path (or of path itself if it is a file)."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def run_phase(name: str, cmd: List[str], watched: List[Path]) -> dict:
+    """Run one phase in a child process and measure it (POSIX: uses wait4 for per-child rusage)."""
+    before = sum(tree_size(p) for p in watched)
+    start = time.perf_counter()
+    with tempfile.TemporaryFile() as stderr:
+        proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=stderr)
+        _, status, usage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - start
+        proc.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+        if proc.returncode != 0:
+            stderr.seek(0)
+            raise RuntimeError(f"{name} failed ({proc.returncode}): "
+                               f"{stderr.read().decode(errors='replace')[-2000:]}")
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    maxrss = usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    return {
+        "phase": name,
+        "wall_seconds": round(wall, 4),
+        "cpu_seconds": round(usage.ru_utime + usage.ru_stime, 4),
+        "peak_rss_bytes": maxrss,
+        "bytes_written": sum(tree_size(p) for p in watched) - before,
+    }
+
+
+def bench_case(workdir: Path, count: int, payload_size: int, rounds: int, churn: float,
+               jobs: Optional[int]) -> dict:
+    """Benchmark one repository size over `rounds` publishes of its version history."""
+    debs = workdir / "debs"
+    aptly_root = workdir / "aptly"
+    pages = workdir / "pages.git"
+    subprocess.run(["git", "init", "-q", "--bare", str(pages)], check=True)
+
+    phases = []
+    for revision in range(1, rounds + 1):
+        changed = None if revision == 1 else max(1, int(count * churn))
+        start = time.perf_counter()
+        generate_repository(debs, count, payload_size, revision, changed)
+        phases.append({
+            "phase": "generate",
+            "round": revision,
+            "wall_seconds": round(time.perf_counter() - start, 4),
+            "bytes_written": tree_size(debs),
+        })
+
+        report = workdir / f"report-{revision}.json"
+        cmd = [sys.executable, str(PUBLISH_SCRIPT),
+               "--component", "bench", "--distro", "noble", "--channel", "testing",
+               "--debs", str(debs), "--pages-repo", str(pages), "--aptly-root", str(aptly_root),
+               "--report", str(report)]
+        if jobs:
+            cmd += ["--jobs", str(jobs)]
+        result = run_phase("publish", cmd, [aptly_root, aptly_root.parent / "aptly-ingest.json", pages])
+        result["round"] = revision
+        # Per-phase spans reported by the pipeline itself
+        result["pipeline"] = json.loads(report.read_text())["phases"]
+        phases.append(result)
+        logger.info("%5d packages, round %d: publish %.3fs", count, revision, result["wall_seconds"])
+
+    return {"packages": count, "payload_size": payload_size, "rounds": rounds,
+            "churn": churn, "phases": phases}
+
+
+def _source_revision() -> str:
+    result = subprocess.run(["git", "-C", str(SCRIPTS_DIR), "describe", "--always", "--dirty"],
+                            capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 else "unknown"
+
+
+def results_header() -> dict:
+    """Version, time, source revision and host of a results file."""
+    return {
+        "version": RESULTS_VERSION,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "revision": _source_revision(),
+        "host": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+    }
+
+
+def run_benchmark(counts: List[int], payload_size: int = 4096, rounds: int = 2,
+                  churn: float = 0.01, jobs: Optional[int] = None, workdir=None) -> dict:
+    cases = []
+    for count in counts:
+        with tempfile.TemporaryDirectory(dir=workdir, prefix=f"bench-{count}-") as tmp:
+            cases.append(bench_case(Path(tmp), count, payload_size, rounds, churn, jobs))
+    return {**results_header(), "cases": cases}
+
+
+def _phase_totals(results: dict) -> Dict[tuple, float]:
+    totals = {}
+    for case in results["cases"]:
+        for phase in case["phases"]:
+            # Consumer benchmark cases are also split by index format
+            name = f"{phase['phase']} [{case['format']}]" if "format" in case else phase["phase"]
+            key = (case["packages"], name, phase.get("round", 1))
+            totals[key] = phase["wall_seconds"]
+    return totals
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.2) -> List[str]:
+    """Return a line per phase that got slower than baseline by more than `threshold`."""
+    regressions = []
+    before = _phase_totals(baseline)
+    for key, wall in sorted(_phase_totals(current).items()):
+        if key not in before or before[key] <= 0:
+            continue
+        ratio = wall / before[key]
+        if ratio > 1 + threshold:
+            count, phase, round_ = key
+            regressions.append(f"{count} packages, {phase} round {round_}: "
+                               f"{before[key]:.3f}s -> {wall:.3f}s (x{ratio:.2f})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark publishing at increasing repository sizes")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Run the benchmark and write JSON results")
+    run.add_argument("--counts", default="10,100,1000", help="Comma-separated package counts")
+    run.add_argument("--payload-size", type=int, default=4096, help="Payload bytes per package")
+    run.add_argument("--rounds", type=int, default=2, help="Publishes per size (version history length)")
+    run.add_argument("--churn", type=float, default=0.01, help="Fraction of packages rebuilt per round")
+    run.add_argument("--jobs", type=int, default=None)
+    run.add_argument("--workdir", default=None)
+    run.add_argument("--output", default="-", help="Results file (default: stdout)")
+
+    cmp = sub.add_parser("compare", help="Compare two result files")
+    cmp.add_argument("baseline")
+    cmp.add_argument("current")
+    cmp.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown ratio")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    if args.command == "run":
+        counts = [int(c) for c in args.counts.split(",") if c]
+        results = run_benchmark(counts, args.payload_size, args.rounds, args.churn,
+                                args.jobs, args.workdir)
+        text = json.dumps(results, indent=2)
+        if args.output == "-":
+            print(text)
+        else:
+            Path(args.output).write_text(text + "\n")
+            logging.info("Results written to %s", args.output)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION: {line}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Catalog of every published package across channels, distributions and components.
+
+All `<channel>/dists/<distro>/<component>/binary-*/Packages` indexes are
+loaded, from a pages checkout or straight from the pages repository (only
+the index blobs are fetched), into a compact structure: every string
+(package name, version, architecture, channel, ...) is interned once, and
+each index keeps its rows as parallel `array` columns of string ids, so tens
+of thousands of entries cost a few bytes each instead of a dict apiece. A
+name -> rows map makes lookups a dict access.
+
+The catalog can be saved to a cache file together with the digest of every
+index it was built from; refreshing it then re-reads only the indexes whose
+digest changed and drops those that disappeared.
+
+    catalog.py --pages-repo URL feelpp-tools
+    catalog.py --pages-checkout gh-pages --channel stable --channel testing --json 'feelpp-*'
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import sys
+from array import array
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from indexes import parse_packages
+from pages_sync import PagesSync, SyncError
+from planner import INDEX_NAMES, decode_index, pick_indexes
+from versions import VersionError, version_key
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+# Row references in the name map: slot << ROW_BITS | row
+ROW_BITS = 32
+
+
+class CatalogError(RuntimeError):
+    """Raised when the published indexes cannot be read."""
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    """One published package, as returned by queries."""
+
+    name: str
+    version: str
+    architecture: str
+    channel: str
+    distro: str
+    component: str
+    size: int
+
+    @property
+    def target(self) -> str:
+        return f"{self.channel}/{self.distro}/{self.component}"
+
+
+class StringPool:
+    """Interned strings, referenced by their integer id."""
+
+    __slots__ = ("strings", "_ids")
+
+    def __init__(self, strings: Iterable[str] = ()):
+        self.strings: List[str] = []
+        self._ids: Dict[str, int] = {}
+        for string in strings:
+            self.intern(string)
+
+    def intern(self, string: str) -> int:
+        sid = self._ids.get(string)
+        if sid is None:
+            sid = self._ids[string] = len(self.strings)
+            self.strings.append(string)
+        return sid
+
+    def id(self, string: str) -> Optional[int]:
+        return self._ids.get(string)
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+
+class IndexRows:
+    """Rows of one Packages index as parallel columns of string ids."""
+
+    __slots__ = ("digest", "channel", "distro", "component", "names", "versions", "arches", "sizes")
+
+    def __init__(self, digest: str, channel: int, distro: int, component: int):
+        self.digest = digest
+        self.channel, self.distro, self.component = channel, distro, component
+        self.names = array("I")
+        self.versions = array("I")
+        self.arches = array("I")
+        self.sizes = array("Q")
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+def index_location(rel: str) -> Tuple[str, str, str]:
+    """(channel, distro, component) of `<channel>/dists/<distro>/<component>/binary-<arch>/Packages*`."""
+    parts = rel.split("/")
+    if len(parts) < 6 or parts[1] != "dists" or not parts[-2].startswith("binary-"):
+        raise CatalogError(f"Not a Packages index path: {rel}")
+    return parts[0], parts[2], "/".join(parts[3:-2])
+
+
+class Catalog:
+    """Published packages of every index, refreshed incrementally."""
+
+    def __init__(self):
+        self.strings = StringPool()
+        self._slots: List[Optional[IndexRows]] = []
+        self._paths: Dict[str, int] = {}
+        self._by_name: Optional[Dict[int, array]] = None
+
+    def __len__(self) -> int:
+        return sum(len(rows) for rows in self._slots if rows is not None)
+
+    @property
+    def indexes(self) -> Dict[str, str]:
+        """Index path -> digest of every index in the catalog."""
+        return {path: self._slots[slot].digest for path, slot in self._paths.items()}
+
+    def add_index(self, rel: str, digest: str, stanzas: Iterable[Dict[str, str]]) -> int:
+        """Replace the rows of one index; returns the number of rows."""
+        intern = self.strings.intern
+        channel, distro, component = index_location(rel)
+        rows = IndexRows(digest, intern(channel), intern(distro), intern(component))
+        for stanza in stanzas:
+            rows.names.append(intern(stanza["Package"]))
+            rows.versions.append(intern(stanza["Version"]))
+            rows.arches.append(intern(stanza.get("Architecture", "")))
+            rows.sizes.append(int(stanza.get("Size", 0) or 0))
+        slot = self._paths.get(rel)
+        if slot is None:
+            slot = self._paths[rel] = len(self._slots)
+            self._slots.append(rows)
+        else:
+            self._slots[slot] = rows
+        self._by_name = None
+        return len(rows)
+
+    def drop_index(self, rel: str) -> None:
+        slot = self._paths.pop(rel, None)
+        if slot is not None:
+            self._slots[slot] = None
+            self._by_name = None
+
+    def refresh(self, digests: Dict[str, str], read: Callable[[str], bytes]) -> Tuple[List[str], List[str]]:
+        """
+        Bring the catalog to the given indexes (path -> digest).
+
+        Only indexes that are new or whose digest changed are read, through
+        `read(path)`. Returns (re-read paths, dropped paths).
+        """
+        current = self.indexes
+        changed = sorted(rel for rel, digest in digests.items() if current.get(rel) != digest)
+        dropped = sorted(set(current) - set(digests))
+        for rel in dropped:
+            self.drop_index(rel)
+        for rel in changed:
+            count = self.add_index(rel, digests[rel], parse_packages(decode_index(rel, read(rel))))
+            logger.debug("Read %s: %d packages", rel, count)
+        return changed, dropped
+
+    def _name_map(self) -> Dict[int, array]:
+        if self._by_name is None:
+            by_name: Dict[int, array] = {}
+            for slot, rows in enumerate(self._slots):
+                if rows is None:
+                    continue
+                base = slot << ROW_BITS
+                for row, name in enumerate(rows.names):
+                    refs = by_name.get(name)
+                    if refs is None:
+                        refs = by_name[name] = array("Q")
+                    refs.append(base | row)
+            self._by_name = by_name
+        return self._by_name
+
+    def names(self) -> List[str]:
+        strings = self.strings.strings
+        return sorted(strings[name] for name in self._name_map())
+
+    def query(self, names: Iterable[str] = (), channels: Iterable[str] = (), distros: Iterable[str] = (),
+              components: Iterable[str] = (), architectures: Iterable[str] = ()) -> List[CatalogEntry]:
+        """
+        Published entries matching every given filter (an empty filter matches all).
+
+        Names may be shell patterns (`feelpp-*`). Results are sorted by name,
+        channel, distribution, component, architecture and dpkg version order.
+        """
+        strings = self.strings.strings
+        by_name = self._name_map()
+        name_ids = set()
+        for pattern in names:
+            if any(c in pattern for c in "*?["):
+                name_ids.update(n for n in by_name if fnmatch.fnmatchcase(strings[n], pattern))
+            elif self.strings.id(pattern) in by_name:
+                name_ids.add(self.strings.id(pattern))
+        if not names:
+            name_ids = set(by_name)
+
+        def wanted(values: Iterable[str]) -> Optional[set]:
+            values = list(values)
+            return {self.strings.id(v) for v in values} if values else None
+
+        channel_ids, distro_ids, component_ids, arch_ids = (
+            wanted(channels), wanted(distros), wanted(components), wanted(architectures))
+        entries = []
+        for name in name_ids:
+            for ref in by_name[name]:
+                rows = self._slots[ref >> ROW_BITS]
+                if ((channel_ids is not None and rows.channel not in channel_ids)
+                        or (distro_ids is not None and rows.distro not in distro_ids)
+                        or (component_ids is not None and rows.component not in component_ids)):
+                    continue
+                row = ref & ((1 << ROW_BITS) - 1)
+                if arch_ids is not None and rows.arches[row] not in arch_ids:
+                    continue
+                entries.append(CatalogEntry(strings[name], strings[rows.versions[row]],
+                                            strings[rows.arches[row]], strings[rows.channel],
+                                            strings[rows.distro], strings[rows.component], rows.sizes[row]))
+        return sorted(entries, key=_entry_key)
+
+    def save(self, path) -> Path:
+        """Write the catalog and its index digests, keeping only the strings still referenced."""
+        pool = StringPool()
+        indexes = {}
+        for rel, slot in sorted(self._paths.items()):
+            rows = self._slots[slot]
+            strings = self.strings.strings
+            indexes[rel] = {
+                "digest": rows.digest,
+                "names": [pool.intern(strings[i]) for i in rows.names],
+                "versions": [pool.intern(strings[i]) for i in rows.versions],
+                "arches": [pool.intern(strings[i]) for i in rows.arches],
+                "sizes": rows.sizes.tolist(),
+            }
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"version": CACHE_VERSION, "strings": pool.strings, "indexes": indexes},
+                                  separators=(",", ":")))
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path) -> "Catalog":
+        """A saved catalog; empty when the cache is missing, unreadable or from another version."""
+        catalog = cls()
+        try:
+            data = json.loads(Path(path).read_text())
+        except (OSError, ValueError):
+            return catalog
+        if data.get("version") != CACHE_VERSION:
+            return catalog
+        catalog.strings = StringPool(data["strings"])
+        intern = catalog.strings.intern
+        for rel, saved in data["indexes"].items():
+            channel, distro, component = index_location(rel)
+            rows = IndexRows(saved["digest"], intern(channel), intern(distro), intern(component))
+            rows.names.extend(saved["names"])
+            rows.versions.extend(saved["versions"])
+            rows.arches.extend(saved["arches"])
+            rows.sizes.extend(saved["sizes"])
+            catalog._paths[rel] = len(catalog._slots)
+            catalog._slots.append(rows)
+        return catalog
+
+
+def _entry_key(entry: CatalogEntry):
+    try:
+        order = version_key(entry.version)
+    except VersionError:
+        order = (-1, (), ())
+    return entry.name, entry.channel, entry.distro, entry.component, entry.architecture, order
+
+
+def _is_index(rel: str, channels: Optional[Iterable[str]]) -> bool:
+    parts = rel.split("/")
+    return (len(parts) >= 6 and parts[1] == "dists" and parts[-1] in INDEX_NAMES
+            and parts[-2].startswith("binary-") and (channels is None or parts[0] in channels))
+
+
+def refresh_from_checkout(catalog: Catalog, root, channels: Optional[Iterable[str]] = None
+                          ) -> Tuple[List[str], List[str]]:
+    """Refresh from a pages checkout or published tree; digests are the SHA256 of the index files."""
+    root = Path(root)
+    channels = list(channels) if channels is not None else None
+    names = [p.relative_to(root).as_posix() for name in INDEX_NAMES
+             for p in root.glob(f"*/dists/*/*/binary-*/{name}")]
+    picked = pick_indexes(n for n in names if _is_index(n, channels))
+    digests = {rel: hashlib.sha256((root / rel).read_bytes()).hexdigest() for rel in picked}
+    return catalog.refresh(digests, lambda rel: (root / rel).read_bytes())
+
+
+def refresh_from_repo(catalog: Catalog, pages: PagesSync, tip: Optional[str],
+                      channels: Optional[Iterable[str]] = None) -> Tuple[List[str], List[str]]:
+    """Refresh from the pages repository; digests are blob ids, so unchanged indexes are never fetched."""
+    if tip is None:
+        return catalog.refresh({}, pages.read_blob)
+    if channels is None:
+        top = pages.git("ls-tree", "-z", tip)
+        channels = [record.split("\t", 1)[1] for record in filter(None, top.split("\0"))
+                    if record.split()[1] == "tree"]
+    channels = list(channels)
+    entries = pages.entries(tip, [f"{channel}/dists" for channel in channels])
+    picked = pick_indexes(n for n in entries if _is_index(n, channels))
+    digests = {rel: entries[rel][1] for rel in picked}
+    return catalog.refresh(digests, lambda rel: pages.read_blob(digests[rel]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the packages published across channels and distributions")
+    parser.add_argument("names", nargs="*", help="Package names or shell patterns (default: every package)")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--pages-repo", help="Pages repository to read the published indexes from")
+    source.add_argument("--pages-checkout", help="Local checkout (or published tree) of the pages branch")
+    parser.add_argument("--branch", default="gh-pages")
+    parser.add_argument("--cache", help="Catalog cache file, refreshed from the indexes that changed")
+    parser.add_argument("--channel", action="append", default=[], help="Only this channel (repeatable)")
+    parser.add_argument("--distro", action="append", default=[], help="Only this distribution (repeatable)")
+    parser.add_argument("--component", action="append", default=[], help="Only this component (repeatable)")
+    parser.add_argument("--arch", action="append", default=[], help="Only this architecture (repeatable)")
+    parser.add_argument("--json", action="store_true", help="Print the matching entries as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    catalog = Catalog.load(args.cache) if args.cache else Catalog()
+    channels = args.channel or None
+    try:
+        if args.pages_checkout:
+            changed, dropped = refresh_from_checkout(catalog, args.pages_checkout, channels)
+        else:
+            with PagesSync(args.pages_repo, args.branch) as pages:
+                changed, dropped = refresh_from_repo(catalog, pages, pages.fetch_tip(), channels)
+    except (SyncError, CatalogError, OSError, ValueError) as e:
+        logging.error("Cannot read the published indexes: %s", e)
+        sys.exit(1)
+    logging.info("Catalog: %d entries from %d indexes (%d re-read, %d dropped), %d strings",
+                 len(catalog), len(catalog.indexes), len(changed), len(dropped), len(catalog.strings))
+    if args.cache:
+        catalog.save(args.cache)
+
+    entries = catalog.query(args.names, channels or (), args.distro, args.component, args.arch)
+    if args.json:
+        print(json.dumps([asdict(entry) for entry in entries], indent=2))
+    else:
+        for entry in entries:
+            print(f"{entry.name}\t{entry.version}\t{entry.architecture}\t{entry.target}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Consumer-side benchmark: what `apt-get update` and `apt-get install` cost
+the people installing from the published repository.
+
+A synthetic repository is published with the mock publisher, its
+`<channel>` tree (dists/ and pool/) is served by a local HTTP server that
+can add per-request latency and cap per-connection bandwidth, and an
+isolated apt configuration (own sources.list, state, cache and status
+file, no host configuration) is pointed at it. For every repository size
+and index format the benchmark records the cold and warm `apt-get update`
+time, the bytes and requests served, and the `apt-get install` resolution
+time (simulated, nothing is installed).
+
+    python scripts/consumer_bench.py run --counts 100,1000 --formats xz,gz,none --latency-ms 50
+    python scripts/consumer_bench.py serve gh-pages/stable --latency-ms 100 --bandwidth-kib 512
+    python scripts/benchmark.py compare baseline.json consumer.json
+"""
+
+import argparse
+import getpass
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List, Optional
+
+from aptly_publish import PublishConfig, PublishError, publish
+from benchmark import generate_repository, results_header
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "testing"
+DISTRO = "noble"
+COMPONENT = "bench"
+ARCHITECTURE = "amd64"
+# "none": only the uncompressed Packages index is published
+FORMATS = ("xz", "gz", "zst", "none")
+CHUNK_SIZE = 16 * 1024
+PROXY_VARIABLES = ("http_proxy", "https_proxy", "HTTP_PROXY", "HTTPS_PROXY", "no_proxy", "NO_PROXY")
+
+
+class ConsumerBenchError(RuntimeError):
+    """Raised when the repository cannot be published, served or read by apt."""
+
+
+class _Handler(SimpleHTTPRequestHandler):
+    """Static files with the server's latency and bandwidth applied, counting what is sent."""
+
+    protocol_version = "HTTP/1.1"
+
+    def send_head(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.server.record(requests=1)
+        return super().send_head()
+
+    def copyfile(self, source, outputfile):
+        bandwidth = self.server.bandwidth
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+            outputfile.write(chunk)
+            self.server.record(sent=len(chunk))
+            if bandwidth:
+                time.sleep(len(chunk) / bandwidth)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class ThrottledServer(ThreadingHTTPServer):
+    """
+    HTTP server for a directory with injected latency and bandwidth limits.
+
+    `latency` seconds are added before every response; `bandwidth` (bytes
+    per second, per connection) paces the body. Use as a context manager;
+    `requests` and `bytes_sent` count what was served since the last reset.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, root, latency: float = 0.0, bandwidth: Optional[float] = None,
+                 address: str = "127.0.0.1", port: int = 0):
+        super().__init__((address, port), partial(_Handler, directory=str(root)))
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.requests = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def record(self, requests: int = 0, sent: int = 0) -> None:
+        with self._lock:
+            self.requests += requests
+            self.bytes_sent += sent
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests = self.bytes_sent = 0
+
+    def __enter__(self) -> "ThrottledServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="apt-http", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class AptSandbox:
+    """
+    apt-get with its own configuration, sources, state and cache under `root`.
+
+    The host's apt configuration, sources and dpkg status are never read,
+    and nothing outside `root` is written.
+    """
+
+    def __init__(self, root, sources: List[str], architecture: str = ARCHITECTURE):
+        self.root = Path(root)
+        for name in ("apt.conf.d", "sources.list.d", "preferences.d", "state/lists/partial",
+                     "cache/archives/partial", "log"):
+            (self.root / name).mkdir(parents=True, exist_ok=True)
+        (self.root / "status").touch()
+        (self.root / "sources.list").write_text("".join(f"{line}\n" for line in sources))
+        options = {
+            "Dir::Etc::main": "/dev/null",
+            "Dir::Etc::parts": self.root / "apt.conf.d",
+            "Dir::Etc::sourcelist": self.root / "sources.list",
+            "Dir::Etc::sourceparts": self.root / "sources.list.d",
+            "Dir::Etc::preferences": self.root / "preferences",
+            "Dir::Etc::preferencesparts": self.root / "preferences.d",
+            "Dir::State": self.root / "state",
+            "Dir::State::status": self.root / "status",
+            "Dir::Cache": self.root / "cache",
+            "Dir::Log": self.root / "log",
+            "Debug::NoLocking": "true",
+            "APT::Architecture": architecture,
+            "APT::Architectures": architecture,
+            "APT::Sandbox::User": getpass.getuser(),
+            "Acquire::Languages": "none",
+            "Acquire::PDiffs": "false",
+        }
+        self.config = self.root / "apt.conf"
+        self.config.write_text("".join(f'{key} "{value}";\n' for key, value in options.items()))
+        self.env = {key: value for key, value in os.environ.items() if key not in PROXY_VARIABLES}
+        self.env["APT_CONFIG"] = str(self.config)
+
+    def run(self, *args: str) -> subprocess.CompletedProcess:
+        result = subprocess.run(["apt-get", "-q", *args], capture_output=True, text=True, env=self.env)
+        if result.returncode != 0 or "\nE: " in f"\n{result.stderr}" or "W: Failed" in result.stderr:
+            raise ConsumerBenchError(f"apt-get {args[0]} failed ({result.returncode}): "
+                                     f"{result.stderr.strip()[-2000:]}")
+        return result
+
+    def update(self) -> float:
+        start = time.perf_counter()
+        self.run("update")
+        seconds = time.perf_counter() - start
+        if not any((self.root / "state" / "lists").glob("*_Packages*")):
+            raise ConsumerBenchError("apt-get update fetched no Packages index")
+        return seconds
+
+    def install(self, packages: List[str]) -> float:
+        """Time a simulated install: dependency resolution only."""
+        start = time.perf_counter()
+        result = self.run("install", "-s", "-y", *packages)
+        seconds = time.perf_counter() - start
+        missing = [name for name in packages if f"Inst {name} " not in result.stdout]
+        if missing:
+            raise ConsumerBenchError(f"apt-get would not install {', '.join(missing)}")
+        return seconds
+
+
+def publish_tree(workdir: Path, count: int, index_format: str, payload_size: int = 4096,
+                 jobs: Optional[int] = None) -> Path:
+    """Publish a synthetic repository and return its channel tree (dists/ and pool/)."""
+    debs = workdir / "debs"
+    aptly_root = workdir / "aptly"
+    generate_repository(debs, count, payload_size, depends=True)
+    formats = () if index_format == "none" else (index_format,)
+    try:
+        publish(PublishConfig.single(COMPONENT, debs, str(workdir / "pages.git"), distro=DISTRO,
+                                     channel=CHANNEL, aptly_root=str(aptly_root), index_formats=formats,
+                                     jobs=jobs))
+    except PublishError as e:
+        raise ConsumerBenchError(f"Cannot publish the benchmark repository: {e}") from e
+    return aptly_root / "public" / CHANNEL
+
+
+def bench_consumer_case(workdir: Path, count: int, index_format: str, latency: float = 0.0,
+                        bandwidth: Optional[float] = None, payload_size: int = 4096,
+                        jobs: Optional[int] = None) -> dict:
+    """Cold update, warm update and install resolution against one published repository."""
+    tree = publish_tree(workdir, count, index_format, payload_size, jobs)
+    suffix = "" if index_format == "none" else f".{index_format}"
+    index = tree / "dists" / DISTRO / COMPONENT / f"binary-{ARCHITECTURE}" / f"Packages{suffix}"
+    phases = []
+    with ThrottledServer(tree, latency, bandwidth) as server:
+        apt = AptSandbox(workdir / "apt", [f"deb [trusted=yes] {server.url} {DISTRO} {COMPONENT}"])
+        for phase in ("update", "update-warm"):
+            server.reset()
+            seconds = apt.update()
+            phases.append({"phase": phase, "wall_seconds": round(seconds, 4),
+                           "bytes_transferred": server.bytes_sent, "requests": server.requests})
+        # The deepest package pulls in its whole dependency chain
+        seconds = apt.install([f"bench-pkg-{count - 1:05d}"])
+        phases.append({"phase": "install", "wall_seconds": round(seconds, 4)})
+    logger.info("%5d packages, %-4s: update %.3fs (%d bytes), warm %.3fs, install %.3fs", count,
+                index_format, phases[0]["wall_seconds"], phases[0]["bytes_transferred"],
+                phases[1]["wall_seconds"], phases[2]["wall_seconds"])
+    return {"packages": count, "format": index_format, "index_bytes": index.stat().st_size,
+            "phases": phases}
+
+
+def run_consumer_benchmark(counts: List[int], formats: List[str], latency: float = 0.0,
+                           bandwidth: Optional[float] = None, payload_size: int = 4096,
+                           jobs: Optional[int] = None, workdir=None) -> dict:
+    if shutil.which("apt-get") is None:
+        raise ConsumerBenchError("apt-get is not available")
+    unknown = sorted(set(formats) - set(FORMATS))
+    if unknown:
+        raise ConsumerBenchError(f"Unknown index formats: {', '.join(unknown)}")
+    cases = []
+    for count in counts:
+        for index_format in formats:
+            with tempfile.TemporaryDirectory(dir=workdir, prefix=f"consumer-{count}-{index_format}-") as tmp:
+                cases.append(bench_consumer_case(Path(tmp), count, index_format, latency, bandwidth,
+                                                 payload_size, jobs))
+    return {**results_header(), "latency_seconds": latency, "bandwidth_bytes_per_second": bandwidth,
+            "cases": cases}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark apt-get against a published repository")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Publish synthetic repositories and time apt-get against them")
+    run.add_argument("--counts", default="10,100,1000", help="Comma-separated package counts")
+    run.add_argument("--formats", default="xz,gz,none", help=f"Comma-separated index formats ({', '.join(FORMATS)})")
+    run.add_argument("--payload-size", type=int, default=4096, help="Payload bytes per package")
+    run.add_argument("--jobs", type=int, default=None)
+    run.add_argument("--workdir", default=None)
+    run.add_argument("--output", default="-", help="Results file (default: stdout)")
+
+    serve = sub.add_parser("serve", help="Serve a published tree (dists/ and pool/) until interrupted")
+    serve.add_argument("root")
+    serve.add_argument("--port", type=int, default=8080)
+
+    for command in (run, serve):
+        command.add_argument("--latency-ms", type=float, default=0.0, help="Latency added to every request")
+        command.add_argument("--bandwidth-kib", type=float, default=None,
+                             help="Per-connection bandwidth limit in KiB/s (default: unlimited)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    latency = args.latency_ms / 1000
+    bandwidth = args.bandwidth_kib * 1024 if args.bandwidth_kib else None
+    if args.command == "serve":
+        with ThrottledServer(args.root, latency, bandwidth, port=args.port) as server:
+            logging.info("Serving %s at %s", args.root, server.url)
+            try:
+                threading.Event().wait()
+            except KeyboardInterrupt:
+                pass
+        return
+
+    try:
+        results = run_consumer_benchmark([int(c) for c in args.counts.split(",") if c],
+                                         [f for f in args.formats.split(",") if f], latency, bandwidth,
+                                         args.payload_size, args.jobs, args.workdir)
+    except ConsumerBenchError as e:
+        logging.error("%s", e)
+        sys.exit(1)
+    text = json.dumps(results, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        Path(args.output).write_text(text + "\n")
+        logging.info("Results written to %s", args.output)
+
+
+if __name__ == "__main__":
+    main()
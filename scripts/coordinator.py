@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Publish coordinator: coalesce concurrent publish requests into one publish.
+
+A long-running local service accepts publish requests (component, distro,
+channel, debs) over HTTP on a loopback address. Requests that arrive within
+a batching window are merged per target and published by one worker, so N
+workflows finishing together never race each other's pushes. A publisher
+that reads manifests (`aptly_publish.py --manifest`) publishes the whole
+batch in a single run, one snapshot/publish/sign/sync cycle and one push;
+any other publisher (`feelpp-apt-publish publish`) runs once per target.
+
+Every request keeps its own id and outcome: when a batched run fails, its
+targets are published again one by one, so a bad request only fails itself.
+
+    python scripts/coordinator.py serve --publisher ".venv-publish/bin/feelpp-apt-publish publish" \
+        -- --sign --keyid KEY
+    python scripts/coordinator.py serve --publisher "python3 scripts/aptly_publish.py" --manifest-publisher \
+        -- --pages-repo URL
+    python scripts/coordinator.py submit --component base --debs build/ --wait
+
+API:
+    POST /publish                  {"component", "distro", "channel", "debs"} -> request
+    GET  /requests/<id>[?wait=S]   request status, optionally blocking until finished
+    GET  /health
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.error import HTTPError, URLError
+from urllib.parse import parse_qs, urlparse
+from urllib.request import Request, urlopen
+
+from batch import Target, select_packages, target_from_dict, write_manifest
+from debscan import scan_debs
+from ingest_cache import stage_packages
+
+logger = logging.getLogger(__name__)
+
+PUBLISH_SCRIPT = Path(__file__).resolve().parent / "aptly_publish.py"
+DEFAULT_ADDRESS = "127.0.0.1:8765"
+OUTPUT_TAIL = 4000
+KEEP_FINISHED = 3600.0
+
+
+class CoordinatorError(RuntimeError):
+    """Raised when a request cannot be submitted or its publish failed."""
+
+
+@dataclass
+class PublishRequest:
+    """One client request and its progress through the batches."""
+
+    id: str
+    target: Target
+    state: str = "queued"  # queued -> running -> done | failed
+    batch: Optional[int] = None
+    returncode: Optional[int] = None
+    output: str = ""
+    submitted: float = field(default_factory=time.time)
+    finished: Optional[float] = None
+    done: threading.Event = field(default_factory=threading.Event, repr=False, compare=False)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "target": self.target.key,
+            "debs": self.target.debs,
+            "state": self.state,
+            "batch": self.batch,
+            "returncode": self.returncode,
+            "output": self.output,
+            "submitted": self.submitted,
+            "finished": self.finished,
+        }
+
+
+def _link_debs(source_dirs: List[str], dest: Path) -> None:
+    """Hardlink (or copy) every .deb of the source directories into dest; later ones win."""
+    dest.mkdir(parents=True, exist_ok=True)
+    for source in source_dirs:
+        for deb in sorted(Path(source).glob("*.deb")):
+            target = dest / deb.name
+            if target.exists():
+                target.unlink()
+            try:
+                os.link(deb, target)
+            except OSError:
+                shutil.copy2(deb, target)
+
+
+def merge_targets(requests: List[PublishRequest], stage_dir: Path) -> List[Target]:
+    """
+    One Target per channel/distro/component across a batch.
+
+    Requests for the same target from different debs directories are staged
+    into a single directory so that the manifest stays free of duplicates.
+    """
+    by_key: Dict[str, List[Target]] = OrderedDict()
+    for request in requests:
+        by_key.setdefault(request.target.key, []).append(request.target)
+
+    merged = []
+    for key, targets in by_key.items():
+        first = targets[0]
+        dirs = list(OrderedDict.fromkeys(t.debs for t in targets))
+        archs = None
+        if all(t.architectures for t in targets):
+            archs = tuple(sorted({a for t in targets for a in t.architectures}))
+        debs = first.debs
+        if len(dirs) > 1:
+            staged = stage_dir / key.replace("/", "-")
+            _link_debs(dirs, staged)
+            debs = str(staged)
+        merged.append(Target(first.component, first.distro, first.channel, debs, archs))
+    return merged
+
+
+class Coordinator:
+    """Queue of publish requests drained by one worker thread, one batch at a time."""
+
+    def __init__(self, publish_args: List[str], window: float = 5.0, max_batch: int = 64,
+                 workdir=None, command: Optional[List[str]] = None,
+                 runner: Optional[Callable[[List[str]], subprocess.CompletedProcess]] = None,
+                 manifest: Optional[bool] = None, keep: float = KEEP_FINISHED):
+        self.publish_args = list(publish_args)
+        self.window = window
+        self.max_batch = max_batch
+        # Seconds a finished request stays available to status queries
+        self.keep = keep
+        self.command = command or [sys.executable, str(PUBLISH_SCRIPT)]
+        # The bundled aptly_publish.py reads manifests; other publishers take one target per run
+        self.manifest = command is None if manifest is None else manifest
+        self.runner = runner or (lambda cmd: subprocess.run(cmd, capture_output=True, text=True))
+        self._tmp = None
+        if workdir is None:
+            self._tmp = tempfile.TemporaryDirectory(prefix="publish-coordinator-")
+            workdir = self._tmp.name
+        self.workdir = Path(workdir)
+        self.requests: Dict[str, PublishRequest] = {}
+        self._queue: List[PublishRequest] = []
+        self._cond = threading.Condition()
+        self._batches = itertools.count(1)
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, target: Target) -> PublishRequest:
+        if not Path(target.debs).is_dir():
+            raise CoordinatorError(f"Debs path does not exist: {target.debs}")
+        request = PublishRequest(uuid.uuid4().hex[:12], target)
+        with self._cond:
+            self._expire()
+            self.requests[request.id] = request
+            self._queue.append(request)
+            self._cond.notify_all()
+        logger.info("Queued %s: %s from %s", request.id, target.key, target.debs)
+        return request
+
+    def get(self, request_id: str) -> Optional[PublishRequest]:
+        with self._cond:
+            self._expire()
+            return self.requests.get(request_id)
+
+    def _expire(self) -> None:
+        """Forget requests finished more than `keep` seconds ago; call with the lock held."""
+        cutoff = time.time() - self.keep
+        expired = [rid for rid, request in self.requests.items()
+                   if request.finished is not None and request.finished < cutoff]
+        for rid in expired:
+            del self.requests[rid]
+        if expired:
+            logger.debug("Expired %d finished requests", len(expired))
+
+    def _next_batch(self) -> List[PublishRequest]:
+        """Wait for a request, then for the window to close or the batch to fill."""
+        with self._cond:
+            while not self._queue and not self._stopping:
+                self._cond.wait()
+            if not self._queue:
+                return []
+            deadline = self._queue[0].submitted + self.window
+            while len(self._queue) < self.max_batch and not self._stopping:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+            return batch
+
+    def _target_args(self, target: Target, batch_dir: Path) -> List[str]:
+        debs = target.debs
+        if target.architectures:
+            # Publishers run per target have no architecture filter: stage the selected packages
+            staged = batch_dir / ("arch-" + target.key.replace("/", "-"))
+            stage_packages(select_packages(target, scan_debs(Path(debs).glob("*.deb"))), staged)
+            debs = str(staged)
+        return ["--component", target.component, "--distro", target.distro,
+                "--channel", target.channel, "--debs", debs]
+
+    def _publish(self, targets: List[Target], batch_dir: Path) -> Tuple[int, str]:
+        """One publisher run: the targets' manifest, or the options of a single target."""
+        try:
+            if self.manifest:
+                manifest = write_manifest(targets, batch_dir / "manifest.json")
+                args = ["--manifest", str(manifest)]
+            else:
+                (target,) = targets
+                args = self._target_args(target, batch_dir)
+            result = self.runner(self.command + args + self.publish_args)
+        except (OSError, ValueError) as e:
+            return 1, str(e)
+        return result.returncode, (result.stdout or "") + (result.stderr or "")
+
+    def run_batch(self, batch: List[PublishRequest]) -> int:
+        """Publish a batch and complete each of its requests with its own target's outcome."""
+        number = next(self._batches)
+        batch_dir = self.workdir / f"batch-{number}"
+        batch_dir.mkdir(parents=True, exist_ok=True)
+        for request in batch:
+            request.state, request.batch = "running", number
+
+        start = time.perf_counter()
+        outcomes: Dict[str, Tuple[int, str]] = {}
+        failure = (1, "")
+        try:
+            targets = merge_targets(batch, batch_dir)
+            logger.info("Batch %d: %d requests -> %d targets", number, len(batch), len(targets))
+            if self.manifest:
+                returncode, output = self._publish(targets, batch_dir)
+                if returncode == 0 or len(targets) == 1:
+                    outcomes = {target.key: (returncode, output) for target in targets}
+                else:
+                    logger.info("Batch %d failed, publishing its %d targets one by one", number, len(targets))
+            for target in targets:
+                if target.key not in outcomes:
+                    outcomes[target.key] = self._publish([target], batch_dir)
+        except (OSError, ValueError) as e:
+            failure = (1, str(e))
+        finally:
+            shutil.rmtree(batch_dir, ignore_errors=True)
+
+        failed = {key for key, (returncode, _) in outcomes.items() if returncode != 0}
+        logger.info("Batch %d: %d of %d targets failed in %.3fs", number, len(failed),
+                    len(outcomes), time.perf_counter() - start)
+        for request in batch:
+            request.returncode, output = outcomes.get(request.target.key, failure)
+            request.output = output[-OUTPUT_TAIL:]
+            request.state = "done" if request.returncode == 0 else "failed"
+            request.finished = time.time()
+            request.done.set()
+        return max((request.returncode for request in batch), default=0)
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            self.run_batch(batch)
+
+    def start(self) -> "Coordinator":
+        self._thread = threading.Thread(target=self._loop, name="publish-batches", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop after publishing what is already queued."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        if self._tmp is not None:
+            self._tmp.cleanup()
+
+    def __enter__(self) -> "Coordinator":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    coordinator: Coordinator
+
+    def _reply(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if self.path != "/publish":
+            return self._reply(404, {"error": "not found"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            target = target_from_dict(json.loads(self.rfile.read(length) or b"null"), where="request")
+            request = self.coordinator.submit(target)
+        except (ValueError, CoordinatorError) as e:
+            return self._reply(400, {"error": str(e)})
+        self._reply(202, request.to_dict())
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            return self._reply(200, {"status": "ok"})
+        if not url.path.startswith("/requests/"):
+            return self._reply(404, {"error": "not found"})
+        request = self.coordinator.get(url.path[len("/requests/"):])
+        if request is None:
+            return self._reply(404, {"error": "unknown request"})
+        wait = parse_qs(url.query).get("wait")
+        if wait:
+            request.done.wait(float(wait[0]))
+        self._reply(200, request.to_dict())
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+def make_server(coordinator: Coordinator, address: str = DEFAULT_ADDRESS) -> ThreadingHTTPServer:
+    host, port = address.rsplit(":", 1)
+    handler = type("Handler", (_Handler,), {"coordinator": coordinator})
+    return ThreadingHTTPServer((host, int(port)), handler)
+
+
+def _call(url: str, data: Optional[dict] = None, timeout: float = 30) -> dict:
+    body = json.dumps(data).encode() if data is not None else None
+    request = Request(url, data=body, headers={"Content-Type": "application/json"})
+    try:
+        with urlopen(request, timeout=timeout) as resp:
+            return json.load(resp)
+    except HTTPError as e:
+        raise CoordinatorError(json.load(e).get("error", f"HTTP {e.code}")) from e
+    except (URLError, OSError) as e:
+        raise CoordinatorError(f"Coordinator unreachable at {url}: {e}") from e
+
+
+def submit(url: str, target: Target, wait: bool = True, timeout: float = 3600,
+           poll: float = 30) -> dict:
+    """Submit a request and, with `wait`, block until its batch has been published."""
+    url = url.rstrip("/")
+    entry = {"component": target.component, "distro": target.distro,
+             "channel": target.channel, "debs": str(Path(target.debs).resolve())}
+    if target.architectures:
+        entry["architectures"] = list(target.architectures)
+    status = _call(f"{url}/publish", entry)
+    deadline = time.time() + timeout
+    while wait and status["state"] in ("queued", "running"):
+        if time.time() > deadline:
+            raise CoordinatorError(f"Request {status['id']} not finished after {timeout:.0f}s")
+        status = _call(f"{url}/requests/{status['id']}?wait={poll}", timeout=poll + 30)
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coalesce concurrent publish requests into batched publishes")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="Run the coordinator")
+    serve.add_argument("--listen", default=DEFAULT_ADDRESS, help="host:port (loopback by default)")
+    serve.add_argument("--window", type=float, default=5.0,
+                       help="Seconds to wait for more requests after the first one of a batch")
+    serve.add_argument("--max-batch", type=int, default=64)
+    serve.add_argument("--workdir", default=None)
+    serve.add_argument("--keep", type=float, default=KEEP_FINISHED,
+                       help="Seconds a finished request's status stays available")
+    serve.add_argument("--publisher", required=True,
+                       help="Publisher command (shell-quoted), run with --component/--distro/--channel/--debs "
+                            "per target, e.g. '.venv-publish/bin/feelpp-apt-publish publish'")
+    serve.add_argument("--manifest-publisher", action="store_true",
+                       help="The publisher reads --manifest (scripts/aptly_publish.py): one run per batch")
+    serve.add_argument("publish_args", nargs=argparse.REMAINDER,
+                       help="-- followed by arguments passed to every publisher run")
+
+    client = sub.add_parser("submit", help="Submit a publish request")
+    client.add_argument("--url", default=f"http://{DEFAULT_ADDRESS}")
+    client.add_argument("--component", required=True)
+    client.add_argument("--distro", default="noble")
+    client.add_argument("--channel", default="stable")
+    client.add_argument("--debs", required=True)
+    client.add_argument("--wait", action="store_true", help="Wait until the request is published")
+    client.add_argument("--timeout", type=float, default=3600)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    if args.command == "serve":
+        publish_args = args.publish_args[1:] if args.publish_args[:1] == ["--"] else args.publish_args
+        coordinator = Coordinator(publish_args, args.window, args.max_batch, args.workdir,
+                                  command=shlex.split(args.publisher), manifest=args.manifest_publisher,
+                                  keep=args.keep)
+        server = make_server(coordinator, args.listen)
+        logging.info("Publish coordinator listening on http://%s (window %.1fs)", args.listen, args.window)
+        with coordinator:
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                server.server_close()
+        return
+
+    try:
+        status = submit(args.url, Target(args.component, args.distro, args.channel, args.debs),
+                        wait=args.wait, timeout=args.timeout)
+    except CoordinatorError as e:
+        logging.error("%s", e)
+        sys.exit(1)
+    print(json.dumps(status, indent=2))
+    if status["state"] == "failed":
+        logging.error("Publishing %s failed with exit code %s (batch %s)", status["target"],
+                      status["returncode"], status["batch"])
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
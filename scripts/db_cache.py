@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Persistent aptly root keyed on the published Release state.
+
+Rebuilding the aptly database from the published repository is the slowest
+part of a publish. Instead, the aptly root (database and pool) is cached
+between runs under a key derived from the git blob ids of every published
+`<channel>/dists/<distro>/Release` file, which are listed from a shallow,
+blob-less fetch of the pages branch. The root carries a stamp of the state
+it was saved for; when a restored root does not match what is published
+(a fallback cache entry, or someone else published in between) its
+database is discarded so that recovery runs, and only then.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pages_sync import PagesSync, SyncError
+
+logger = logging.getLogger(__name__)
+
+STAMP_NAME = "published-state.json"
+STAMP_VERSION = 1
+KEY_PREFIX = "aptly-db-"
+
+
+def published_state(repo: str, branch: str = "gh-pages",
+                    channels: Optional[Iterable[str]] = None) -> Dict[str, str]:
+    """Map each published Release file path to its git blob id (empty if nothing is published)."""
+    with PagesSync(repo, branch) as pages:
+        tip = pages.fetch_tip()
+        if tip is None:
+            return {}
+        if channels is None:
+            top = pages.git("ls-tree", "-z", tip)
+            channels = [record.split("\t", 1)[1] for record in filter(None, top.split("\0"))
+                        if record.split()[1] == "tree"]
+        entries = pages.entries(tip, [f"{channel}/dists" for channel in channels])
+    return {path: sha for path, (_, sha) in sorted(entries.items())
+            if path.endswith("/Release")}
+
+
+def state_key(state: Dict[str, str]) -> str:
+    """Cache key for a published state; identical Release files give identical keys."""
+    digest = hashlib.sha256()
+    for path in sorted(state):
+        digest.update(f"{path}\0{state[path]}\n".encode())
+    return KEY_PREFIX + digest.hexdigest()[:32]
+
+
+def read_stamp(aptly_root) -> Optional[Dict[str, str]]:
+    try:
+        with open(Path(aptly_root).expanduser() / STAMP_NAME) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != STAMP_VERSION:
+        return None
+    return data.get("releases")
+
+
+def write_stamp(aptly_root, state: Dict[str, str]) -> Path:
+    """Record the published state the aptly root now corresponds to."""
+    aptly_root = Path(aptly_root).expanduser()
+    aptly_root.mkdir(parents=True, exist_ok=True)
+    stamp = aptly_root / STAMP_NAME
+    tmp = stamp.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"version": STAMP_VERSION, "key": state_key(state),
+                               "releases": state}, indent=1, sort_keys=True) + "\n")
+    os.replace(tmp, stamp)
+    return stamp
+
+
+def check(aptly_root, state: Dict[str, str]) -> Tuple[bool, List[str]]:
+    """
+    Compare an aptly root with the published state.
+
+    Returns (valid, reasons); reasons name what is missing or which Release
+    files differ from the ones the root was stamped with.
+    """
+    aptly_root = Path(aptly_root).expanduser()
+    if not (aptly_root / "db").is_dir():
+        return False, ["no aptly database"]
+    stamped = read_stamp(aptly_root)
+    if stamped is None:
+        return False, ["no published-state stamp"]
+    changed = sorted(path for path in set(stamped) | set(state) if stamped.get(path) != state.get(path))
+    return not changed, [f"{path} changed" for path in changed]
+
+
+def invalidate(aptly_root) -> None:
+    """Drop the database and stamp; pool files are content-addressed and kept."""
+    aptly_root = Path(aptly_root).expanduser()
+    shutil.rmtree(aptly_root / "db", ignore_errors=True)
+    try:
+        (aptly_root / STAMP_NAME).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache the aptly root keyed on the published Release files")
+    parser.add_argument("command", choices=["key", "check", "stamp"],
+                        help="key: print the cache key of the published state; "
+                             "check: invalidate a stale aptly root (prints hit or miss); "
+                             "stamp: record the published state in the aptly root (prints its key)")
+    parser.add_argument("--pages-repo", required=True)
+    parser.add_argument("--branch", default="gh-pages")
+    parser.add_argument("--channel", action="append", default=None,
+                        help="Only consider these channels (repeatable; default: all)")
+    parser.add_argument("--aptly-root", default=os.environ.get("APTLY_ROOT", "~/.aptly"))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    try:
+        state = published_state(args.pages_repo, args.branch, args.channel)
+    except SyncError as e:
+        logging.error("%s", e)
+        sys.exit(1)
+
+    if args.command == "key":
+        print(state_key(state))
+    elif args.command == "check":
+        valid, reasons = check(args.aptly_root, state)
+        if valid:
+            logging.info("aptly root matches %d published Release files", len(state))
+        else:
+            logging.info("aptly root is stale (%s), database will be recovered", "; ".join(reasons))
+            invalidate(args.aptly_root)
+        print("hit" if valid else "miss")
+    else:
+        write_stamp(args.aptly_root, state)
+        print(state_key(state))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+Streaming .deb metadata scanner.
+
+Each package is read once, front to back: the ar header and the
+control.tar.* member are parsed in memory, every other member (notably
+data.tar.*) is only streamed through the SHA256 digest and never extracted.
+Packages are scanned in parallel across a process pool. Listing the files
+of data.tar.* (for Contents indexes) streams the member through tarfile,
+so memory use does not grow with the package either. `set_control_field`
+rewrites one control field into a copy of a package the same way: only
+control.tar.* is rebuilt, every other member is streamed through.
+"""
+
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import logging
+import lzma
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tarfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+AR_MAGIC = b"!<arch>\n"
+AR_HEADER_SIZE = 60
+AR_HEADER_END = b"`\n"
+CHUNK_SIZE = 1 << 20
+
+
+class DebFormatError(ValueError):
+    """Raised when a file is not a well-formed Debian binary package."""
+
+
+@dataclass(frozen=True)
+class DebInfo:
+    """Compact metadata record for one .deb file."""
+
+    path: str
+    name: str
+    version: str
+    architecture: str
+    size: int
+    sha256: str
+    control: Dict[str, str] = field(default_factory=dict, repr=False, compare=False)
+    md5: str = field(default="", compare=False)
+
+    @property
+    def filename(self) -> str:
+        return os.path.basename(self.path)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def parse_control(text: str) -> Dict[str, str]:
+    """Parse a single deb822 paragraph into an ordered field dict."""
+    fields: Dict[str, str] = {}
+    current = None
+    for line in text.splitlines():
+        if not line.strip():
+            if fields:
+                break
+            continue
+        if line[0] in " \t":
+            if current is None:
+                raise DebFormatError(f"Continuation line without field: {line!r}")
+            fields[current] += "\n" + line
+            continue
+        key, sep, value = line.partition(":")
+        if not sep:
+            raise DebFormatError(f"Malformed control line: {line!r}")
+        current = key.strip()
+        fields[current] = value.strip()
+    return fields
+
+
+def _decompress_zstd(data: bytes) -> bytes:
+    try:
+        import zstandard
+    except ImportError:
+        zstandard = None
+
+    if zstandard is not None:
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+    zstd = shutil.which("zstd")
+    if zstd is None:
+        raise DebFormatError("control.tar.zst requires the 'zstandard' module or the zstd binary")
+    result = subprocess.run([zstd, "-dc"], input=data, capture_output=True, check=False)
+    if result.returncode != 0:
+        raise DebFormatError(f"zstd failed: {result.stderr.decode(errors='replace').strip()}")
+    return result.stdout
+
+
+def _compress_zstd(data: bytes) -> bytes:
+    try:
+        import zstandard
+    except ImportError:
+        zstandard = None
+
+    if zstandard is not None:
+        return zstandard.ZstdCompressor().compress(data)
+
+    zstd = shutil.which("zstd")
+    if zstd is None:
+        raise DebFormatError("control.tar.zst requires the 'zstandard' module or the zstd binary")
+    result = subprocess.run([zstd, "-q", "-c"], input=data, capture_output=True, check=False)
+    if result.returncode != 0:
+        raise DebFormatError(f"zstd failed: {result.stderr.decode(errors='replace').strip()}")
+    return result.stdout
+
+
+def member_path(name: str) -> str:
+    """Path of a tar entry without its leading "./" (dot files keep their dot)."""
+    return name[2:] if name.startswith("./") else name
+
+
+def control_from_tar(member_name: str, data: bytes) -> Dict[str, str]:
+    """Parse the control file out of a control.tar.* member."""
+    if member_name.endswith(".zst"):
+        data = _decompress_zstd(data)
+    try:
+        with tarfile.open(fileobj=io.BytesIO(data), mode="r:*") as tar:
+            for entry in tar:
+                if entry.isfile() and member_path(entry.name) == "control":
+                    content = tar.extractfile(entry).read()
+                    return parse_control(content.decode("utf-8"))
+    except (tarfile.TarError, EOFError, OSError) as e:
+        raise DebFormatError(f"Unreadable {member_name}: {e}") from e
+    raise DebFormatError(f"{member_name} has no control file")
+
+
+class _HashingReader:
+    """Sequential reader that feeds every byte it passes through a digest."""
+
+    def __init__(self, fileobj, digest):
+        self._f = fileobj
+        self._digest = digest
+        self.offset = 0
+
+    def read(self, size: int) -> bytes:
+        data = self._f.read(size)
+        self._digest.update(data)
+        self.offset += len(data)
+        return data
+
+    def skip(self, size: int) -> int:
+        remaining = size
+        while remaining > 0:
+            chunk = self.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+        return size - remaining
+
+    def drain(self) -> None:
+        while self.read(CHUNK_SIZE):
+            pass
+
+
+class _MemberReader:
+    """File-like view of the next `size` bytes of a reader, for streaming one ar member."""
+
+    def __init__(self, reader, size: int):
+        self._reader = reader
+        self.remaining = size
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self._reader.read(size) if size else b""
+        self.remaining -= len(data)
+        return data
+
+
+def iter_ar_members(reader: _HashingReader) -> Iterable[Tuple[str, int]]:
+    """Yield (name, size) for each ar member; the caller must consume `size` bytes."""
+    if reader.read(len(AR_MAGIC)) != AR_MAGIC:
+        raise DebFormatError("Missing ar archive magic")
+    while True:
+        header = reader.read(AR_HEADER_SIZE)
+        if not header:
+            return
+        if len(header) != AR_HEADER_SIZE or header[58:60] != AR_HEADER_END:
+            raise DebFormatError(f"Truncated ar header at offset {reader.offset - len(header)}")
+        name = header[:16].decode("ascii", errors="replace").strip().rstrip("/")
+        try:
+            size = int(header[48:58].decode("ascii").strip())
+        except ValueError as e:
+            raise DebFormatError(f"Invalid ar member size for {name!r}") from e
+        yield name, size
+        if size % 2:
+            reader.skip(1)
+
+
+def read_deb(path) -> DebInfo:
+    """Scan one package, returning its metadata record."""
+    path = str(path)
+    digest = hashlib.sha256()
+    control = None
+    with open(path, "rb") as f:
+        reader = _HashingReader(f, digest)
+        for index, (name, size) in enumerate(iter_ar_members(reader)):
+            if index == 0 and name != "debian-binary":
+                raise DebFormatError(f"First member is {name!r}, expected 'debian-binary'")
+            if name.startswith("control.tar"):
+                data = reader.read(size)
+                if len(data) != size:
+                    raise DebFormatError(f"Truncated {name}")
+                control = control_from_tar(name, data)
+            elif reader.skip(size) != size:
+                raise DebFormatError(f"Truncated {name}")
+        reader.drain()
+
+    if control is None:
+        raise DebFormatError("No control.tar member")
+    for required in ("Package", "Version", "Architecture"):
+        if not control.get(required):
+            raise DebFormatError(f"Control file lacks {required}")
+
+    return DebInfo(
+        path=path,
+        name=control["Package"],
+        version=control["Version"],
+        architecture=control["Architecture"],
+        size=reader.offset,
+        sha256=digest.hexdigest(),
+        control=control,
+    )
+
+
+def _list_tar_stream(fileobj, mode: str) -> List[str]:
+    with tarfile.open(fileobj=fileobj, mode=mode) as tar:
+        return [member_path(entry.name) for entry in tar if entry.isfile() or entry.issym()]
+
+
+def _list_zstd_tar(member: _MemberReader) -> List[str]:
+    try:
+        import zstandard
+    except ImportError:
+        zstandard = None
+
+    if zstandard is not None:
+        with zstandard.ZstdDecompressor().stream_reader(member) as stream:
+            return _list_tar_stream(stream, "r|")
+
+    zstd = shutil.which("zstd")
+    if zstd is None:
+        raise DebFormatError("data.tar.zst requires the 'zstandard' module or the zstd binary")
+    proc = subprocess.Popen([zstd, "-dc"], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL)
+
+    def feed():
+        try:
+            for chunk in iter(lambda: member.read(CHUNK_SIZE), b""):
+                proc.stdin.write(chunk)
+        except OSError:
+            pass
+        finally:
+            proc.stdin.close()
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    try:
+        return _list_tar_stream(proc.stdout, "r|")
+    finally:
+        proc.stdout.close()
+        proc.kill()
+        proc.wait()
+        feeder.join()
+
+
+def data_files(path) -> List[str]:
+    """
+    List the regular files and symlinks shipped in a package's data.tar.* member.
+
+    The member is streamed through tarfile (and the decompressor), never
+    held in memory whole.
+    """
+    with open(path, "rb") as f:
+        reader = _HashingReader(f, hashlib.sha256())
+        for name, size in iter_ar_members(reader):
+            if not name.startswith("data.tar"):
+                reader.skip(size)
+                continue
+            member = _MemberReader(reader, size)
+            try:
+                if name.endswith(".zst"):
+                    return _list_zstd_tar(member)
+                return _list_tar_stream(member, "r|*")
+            except (tarfile.TarError, EOFError, OSError) as e:
+                raise DebFormatError(f"Unreadable {name}: {e}") from e
+    raise DebFormatError("No data.tar member")
+
+
+def _decompress_member(member_name: str, data: bytes) -> bytes:
+    if member_name.endswith(".gz"):
+        return gzip.decompress(data)
+    if member_name.endswith(".xz"):
+        return lzma.decompress(data)
+    if member_name.endswith(".zst"):
+        return _decompress_zstd(data)
+    return data
+
+
+def _compress_member(member_name: str, data: bytes) -> bytes:
+    if member_name.endswith(".gz"):
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if member_name.endswith(".xz"):
+        return lzma.compress(data)
+    if member_name.endswith(".zst"):
+        return _compress_zstd(data)
+    return data
+
+
+def _set_tar_control_field(member_name: str, data: bytes, name: str, value: str) -> bytes:
+    """The control.tar.* member with one field of its control file replaced."""
+    pattern = re.compile(rb"^" + re.escape(name.encode()) + rb":.*$", re.MULTILINE)
+    out = io.BytesIO()
+    replaced = 0
+    try:
+        with tarfile.open(fileobj=io.BytesIO(_decompress_member(member_name, data))) as src, \
+                tarfile.open(fileobj=out, mode="w", format=tarfile.GNU_FORMAT) as dst:
+            for entry in src:
+                if not entry.isfile():
+                    dst.addfile(entry)
+                    continue
+                content = src.extractfile(entry).read()
+                if member_path(entry.name) == "control":
+                    content, replaced = pattern.subn(f"{name}: {value}".encode(), content, count=1)
+                    entry.size = len(content)
+                dst.addfile(entry, io.BytesIO(content))
+    except (tarfile.TarError, EOFError, OSError, lzma.LZMAError) as e:
+        raise DebFormatError(f"Unreadable {member_name}: {e}") from e
+    if not replaced:
+        raise DebFormatError(f"{member_name} has no control file with a {name} field")
+    return _compress_member(member_name, out.getvalue())
+
+
+def _write_ar_member(out, name: str, size: int, fileobj) -> None:
+    out.write(f"{name:<16}{0:<12}{0:<6}{0:<6}{100644:<8}{size:<10}".encode("ascii") + AR_HEADER_END)
+    shutil.copyfileobj(fileobj, out, CHUNK_SIZE)
+    if size % 2:
+        out.write(b"\n")
+
+
+def set_control_field(path, dest, name: str, value: str) -> Path:
+    """
+    Copy a package to `dest` with the `name` field of its control file set to `value`.
+
+    control.tar.* is rebuilt in its original compression; the other members,
+    data.tar.* included, are streamed through unchanged.
+    """
+    dest = Path(dest)
+    try:
+        with open(path, "rb") as f, open(dest, "wb") as out:
+            reader = _HashingReader(f, hashlib.sha256())
+            out.write(AR_MAGIC)
+            for member, size in iter_ar_members(reader):
+                if member.startswith("control.tar"):
+                    data = reader.read(size)
+                    if len(data) != size:
+                        raise DebFormatError(f"Truncated {member}")
+                    data = _set_tar_control_field(member, data, name, value)
+                    _write_ar_member(out, member, len(data), io.BytesIO(data))
+                    continue
+                stream = _MemberReader(reader, size)
+                _write_ar_member(out, member, size, stream)
+                if stream.remaining:
+                    raise DebFormatError(f"Truncated {member}")
+    except BaseException:
+        if dest.exists():
+            dest.unlink()
+        raise
+    return dest
+
+
+def _scan_worker(path: str) -> Tuple[str, Optional[DebInfo], Optional[str]]:
+    try:
+        return path, read_deb(path), None
+    except (DebFormatError, OSError) as e:
+        return path, None, str(e)
+
+
+def scan_debs(paths: Iterable, jobs: Optional[int] = None, strict: bool = True) -> List[DebInfo]:
+    """
+    Scan packages in parallel and return their records in path order.
+
+    With `strict`, the first unreadable package raises DebFormatError;
+    otherwise unreadable packages are logged and left out of the result.
+    """
+    paths = sorted(str(p) for p in paths)
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    jobs = max(1, min(jobs, len(paths)))
+
+    if jobs == 1:
+        results = [_scan_worker(p) for p in paths]
+    else:
+        chunksize = max(1, len(paths) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(_scan_worker, paths, chunksize=chunksize))
+
+    records = []
+    for path, info, error in results:
+        if info is not None:
+            records.append(info)
+        elif strict:
+            raise DebFormatError(f"{path}: {error}")
+        else:
+            logger.warning("Skipping %s: %s", os.path.basename(path), error)
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan .deb files and print their metadata")
+    parser.add_argument("debs", nargs="+", help=".deb files or directories containing them")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--json", action="store_true", help="Emit records as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    paths = []
+    for entry in args.debs:
+        entry = Path(entry)
+        paths.extend(entry.glob("*.deb") if entry.is_dir() else [entry])
+
+    try:
+        records = scan_debs(paths, jobs=args.jobs)
+    except DebFormatError as e:
+        logging.error("%s", e)
+        sys.exit(1)
+
+    if args.json:
+        json.dump([r.to_dict() for r in records], sys.stdout, indent=2)
+        print()
+    else:
+        for r in records:
+            print(f"{r.name}\t{r.version}\t{r.architecture}\t{r.size}\t{r.sha256}")
+
+
+if __name__ == "__main__":
+    main()
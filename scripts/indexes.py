@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Index writer stage: Packages and Contents files and their compressed variants.
+
+Every index of a distribution (`<component>/binary-<arch>/Packages`,
+`<component>/Contents-<arch>`) is rendered uncompressed, compared by SHA256
+with the copy already on disk, and only indexes whose content changed are
+rewritten. All compressed variants of the changed indexes (.gz, .xz and
+optionally .zst) are then produced in parallel across a process pool, with
+xz and zstd themselves running multi-threaded when their CLIs are available.
+Changed Packages indexes can also get a pdiff from their previous revision,
+and every index file can be published under `by-hash/SHA256/<digest>` next
+to it (Acquire-By-Hash), with superseded digests kept for a grace window.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import lzma
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from debscan import DebInfo, parse_control
+from pdiff import DIFF_SUFFIX, INDEX_NAME, PdiffError, update_pdiffs
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FORMATS = ("gz", "xz")
+SUPPORTED_FORMATS = ("gz", "xz", "zst")
+XZ_PRESET = 6
+ZSTD_LEVEL = 19
+CHUNK_SIZE = 1 << 20
+BY_HASH_DIR = "by-hash/SHA256"
+BY_HASH_STATE = "by-hash.json"
+# Superseded by-hash files stay this long, for clients holding an older InRelease
+DEFAULT_BY_HASH_WINDOW = 2 * 86400
+
+# Control fields written first, in this order; the rest follow as found
+FIELD_ORDER = ("Package", "Source", "Version", "Installed-Size", "Maintainer", "Architecture")
+
+
+class IndexWriteError(RuntimeError):
+    """Raised when an index cannot be compressed."""
+
+
+@dataclass
+class IndexWriteResult:
+    """Indexes rewritten or left untouched, and the size/SHA256 of every file on disk."""
+
+    written: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+    files: Dict[str, Tuple[int, str]] = field(default_factory=dict)
+    seconds: float = 0.0
+
+
+def pool_path(component: str, pkg: DebInfo) -> str:
+    """Pool location of a package, using Debian's lib* prefix rule."""
+    source = pkg.control.get("Source", pkg.name).split()[0]
+    prefix = source[:4] if source.startswith("lib") else source[:1]
+    return f"pool/{component}/{prefix}/{source}/{pkg.filename}"
+
+
+def packages_stanza(pkg: DebInfo, filename: str) -> Dict[str, str]:
+    fields = {key: pkg.control[key] for key in FIELD_ORDER if key in pkg.control}
+    fields.update((k, v) for k, v in pkg.control.items() if k not in fields)
+    fields["Filename"] = filename
+    fields["Size"] = str(pkg.size)
+    if pkg.md5:
+        fields["MD5sum"] = pkg.md5
+    fields["SHA256"] = pkg.sha256
+    return fields
+
+
+def parse_packages(text: str) -> List[Dict[str, str]]:
+    """Parse every paragraph of a Packages file."""
+    return [parse_control(paragraph) for paragraph in text.split("\n\n") if paragraph.strip()]
+
+
+def render_packages(stanzas: Iterable[Dict[str, str]]) -> bytes:
+    """Render stanzas sorted by package, version and architecture."""
+    ordered = sorted(stanzas, key=lambda s: (s["Package"], s["Version"], s.get("Architecture", "")))
+    return "".join("".join(f"{k}: {v}\n" for k, v in s.items()) + "\n" for s in ordered).encode()
+
+
+def merge_packages(existing: Iterable[Dict[str, str]], added: Iterable[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Add stanzas to an index, replacing any with the same package, version and architecture."""
+    def key(stanza):
+        return stanza["Package"], stanza["Version"], stanza.get("Architecture")
+
+    merged = {key(s): s for s in existing}
+    merged.update((key(s), s) for s in added)
+    return list(merged.values())
+
+
+def parse_contents(text: str) -> Dict[str, List[str]]:
+    """Map each path of a Contents file to its section/package list."""
+    entries = {}
+    for line in text.splitlines():
+        path, _, locations = line.rpartition(" ")
+        if path.strip():
+            entries[path.strip()] = locations.split(",")
+    return entries
+
+
+def render_contents(entries: Dict[str, List[str]]) -> bytes:
+    width = max((len(p) for p in entries), default=0)
+    return "".join(f"{path:<{width}}   {','.join(sorted(set(locs)))}\n"
+                   for path, locs in sorted(entries.items()) if locs).encode()
+
+
+def merge_contents(existing: Dict[str, List[str]], replaced: Iterable[str],
+                   added: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    """Drop the entries of `replaced` packages (section/name) and add new file lists."""
+    replaced = set(replaced)
+    merged = {path: [loc for loc in locs if loc not in replaced] for path, locs in existing.items()}
+    for path, locs in added.items():
+        merged.setdefault(path, []).extend(locs)
+    return {path: locs for path, locs in merged.items() if locs}
+
+
+def _sha256_file(path: Path) -> Tuple[int, str]:
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+            size += len(chunk)
+    return size, digest.hexdigest()
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _compress(job: Tuple[str, str, int]) -> Tuple[str, float]:
+    """Worker: write `<source>.<fmt>` from an uncompressed index."""
+    source, fmt, threads = job
+    dest = f"{source}.{fmt}"
+    tmp = dest + ".tmp"
+    start = time.perf_counter()
+    try:
+        with open(source, "rb") as src, open(tmp, "wb") as out:
+            if fmt == "gz":
+                # No name or timestamp in the header, so unchanged content compresses identically
+                with gzip.GzipFile(filename="", mode="wb", fileobj=out, compresslevel=9, mtime=0) as gz:
+                    shutil.copyfileobj(src, gz, CHUNK_SIZE)
+            elif fmt == "xz" and shutil.which("xz"):
+                subprocess.run(["xz", f"-{XZ_PRESET}", f"-T{threads}", "-c"], stdin=src, stdout=out,
+                               stderr=subprocess.PIPE, check=True)
+            elif fmt == "xz":
+                with lzma.open(out, "wb", preset=XZ_PRESET) as xz:
+                    shutil.copyfileobj(src, xz, CHUNK_SIZE)
+            elif fmt == "zst":
+                _compress_zstd(src, out, threads)
+            else:
+                raise IndexWriteError(f"Unsupported index format: {fmt}")
+    except subprocess.CalledProcessError as e:
+        Path(tmp).unlink(missing_ok=True)
+        stderr = e.stderr.decode(errors="replace").strip() if e.stderr else ""
+        raise IndexWriteError(f"{e.cmd[0]} failed on {source} (exit {e.returncode}): {stderr}") from e
+    os.replace(tmp, dest)
+    return dest, time.perf_counter() - start
+
+
+def _compress_zstd(src, out, threads: int) -> None:
+    try:
+        import zstandard
+    except ImportError:
+        zstandard = None
+
+    if zstandard is not None:
+        zstandard.ZstdCompressor(level=ZSTD_LEVEL, threads=threads).copy_stream(src, out)
+        return
+    if shutil.which("zstd") is None:
+        raise IndexWriteError(".zst indexes require the 'zstandard' module or the zstd binary")
+    subprocess.run(["zstd", f"-{ZSTD_LEVEL}", f"-T{threads}", "-q", "-c"], stdin=src, stdout=out,
+                   stderr=subprocess.PIPE, check=True)
+
+
+def link_by_hash(dists_dir, files: Dict[str, Tuple[int, str]],
+                 window: float = DEFAULT_BY_HASH_WINDOW, now: Optional[float] = None) -> List[str]:
+    """
+    Make every file available as `<dir>/by-hash/SHA256/<sha256>`; returns the paths added.
+
+    The current digest of every file and the time each older digest was
+    superseded are kept in `<dists_dir>/by-hash.json`, which travels with the
+    tree; superseded files are deleted once older than `window`.
+    """
+    dists_dir = Path(dists_dir)
+    now = time.time() if now is None else now
+    state_file = dists_dir / BY_HASH_STATE
+    state = json.loads(state_file.read_text()) if state_file.exists() else {}
+    # Current digest of every index file of the distribution, not only the ones written now
+    current_files: Dict[str, str] = state.get("current", {})
+    current_files.update((name, sha256) for name, (_, sha256) in files.items())
+    superseded: Dict[str, float] = state.get("superseded", {})
+    current: Dict[Path, Dict[str, str]] = {}
+    for name, sha256 in current_files.items():
+        if (dists_dir / name).exists():
+            current.setdefault((dists_dir / name).parent / BY_HASH_DIR, {})[sha256] = name
+    touched = {(dists_dir / name).parent / BY_HASH_DIR for name in files}
+
+    added = []
+    for by_hash in sorted(touched):
+        digests = current.get(by_hash, {})
+        by_hash.mkdir(parents=True, exist_ok=True)
+        for entry in sorted(by_hash.iterdir()):
+            rel = entry.relative_to(dists_dir).as_posix()
+            if entry.name in digests:
+                superseded.pop(rel, None)
+            elif now - superseded.setdefault(rel, now) > window:
+                entry.unlink()
+                del superseded[rel]
+        for sha256, name in sorted(digests.items()):
+            target = by_hash / sha256
+            if target.exists():
+                continue
+            # Indexes are replaced atomically, so the link keeps this revision's content
+            try:
+                os.link(dists_dir / name, target)
+            except OSError:
+                shutil.copy2(dists_dir / name, target)
+            added.append(target.relative_to(dists_dir).as_posix())
+
+    state = {
+        "current": {name: sha256 for name, sha256 in current_files.items() if (dists_dir / name).exists()},
+        "superseded": {rel: t for rel, t in superseded.items() if (dists_dir / rel).exists()},
+    }
+    _write_atomic(state_file, json.dumps(state, indent=1, sort_keys=True).encode())
+    return added
+
+
+def write_indexes(dists_dir, indexes: Dict[str, bytes], formats: Iterable[str] = DEFAULT_FORMATS,
+                  jobs: Optional[int] = None, threads: Optional[int] = None,
+                  pdiffs: int = 0, by_hash: Optional[float] = None) -> IndexWriteResult:
+    """
+    Write uncompressed indexes (paths relative to dists_dir) and their compressed variants.
+
+    Indexes whose content and variants are already on disk are skipped;
+    variants of formats no longer requested are removed. With `pdiffs`, a
+    rewritten Packages index gets a patch from its previous revision in
+    `Packages.diff/`, keeping that many patches. With `by_hash` (a window in
+    seconds), every file is also linked under `by-hash/SHA256/`.
+    """
+    dists_dir = Path(dists_dir)
+    formats = tuple(formats)
+    unknown = set(formats) - set(SUPPORTED_FORMATS)
+    if unknown:
+        raise IndexWriteError(f"Unsupported index formats: {', '.join(sorted(unknown))}")
+
+    start = time.perf_counter()
+    result = IndexWriteResult()
+    jobs_list = []
+    for rel, content in sorted(indexes.items()):
+        path = dists_dir / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        for fmt in set(SUPPORTED_FORMATS) - set(formats):
+            stale = Path(f"{path}.{fmt}")
+            if stale.exists():
+                stale.unlink()
+
+        unchanged = (path.exists() and _sha256_file(path)[1] == hashlib.sha256(content).hexdigest()
+                     and all(Path(f"{path}.{fmt}").exists() for fmt in formats))
+        if unchanged:
+            result.skipped.append(rel)
+            continue
+        if pdiffs and path.name == "Packages" and path.exists():
+            try:
+                update_pdiffs(path, path.read_bytes(), content, pdiffs)
+            except (PdiffError, UnicodeDecodeError) as e:
+                raise IndexWriteError(f"Cannot write pdiff for {rel}: {e}") from e
+        _write_atomic(path, content)
+        result.written.append(rel)
+        jobs_list.extend((str(path), fmt) for fmt in formats)
+
+    if jobs_list:
+        jobs = max(1, min(jobs or os.cpu_count() or 1, len(jobs_list)))
+        threads = threads or max(1, (os.cpu_count() or 1) // jobs)
+        work = [(source, fmt, threads) for source, fmt in jobs_list]
+        if jobs == 1:
+            done = [_compress(job) for job in work]
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                done = list(pool.map(_compress, work))
+        for dest, seconds in done:
+            logger.debug("Compressed %s in %.3fs", os.path.relpath(dest, dists_dir), seconds)
+
+    for rel in sorted(indexes):
+        for name in [rel] + [f"{rel}.{fmt}" for fmt in formats]:
+            result.files[name] = _sha256_file(dists_dir / name)
+        diff_index = f"{rel}{DIFF_SUFFIX}/{INDEX_NAME}"
+        if pdiffs and (dists_dir / diff_index).exists():
+            result.files[diff_index] = _sha256_file(dists_dir / diff_index)
+    if by_hash is not None:
+        link_by_hash(dists_dir, result.files, by_hash)
+    result.seconds = time.perf_counter() - start
+    logger.info("Indexes: %d written, %d unchanged, %d variants compressed in %.3fs",
+                len(result.written), len(result.skipped), len(jobs_list), result.seconds)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compress APT index files in parallel")
+    parser.add_argument("dists_dir", help="dists/<distro> directory")
+    parser.add_argument("indexes", nargs="+", help="Uncompressed index paths relative to dists_dir")
+    parser.add_argument("--formats", default=",".join(DEFAULT_FORMATS),
+                        help="Comma-separated compressed variants (gz, xz, zst)")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--threads", type=int, default=None, help="Threads per xz/zstd process")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    dists_dir = Path(args.dists_dir)
+    try:
+        indexes = {rel: (dists_dir / rel).read_bytes() for rel in args.indexes}
+        # Indexes whose variants are all present are considered up to date
+        result = write_indexes(dists_dir, indexes, [f for f in args.formats.split(",") if f],
+                               args.jobs, args.threads)
+    except (OSError, IndexWriteError, subprocess.CalledProcessError) as e:
+        logging.error("%s", e)
+        sys.exit(1)
+    for name, (size, sha256) in sorted(result.files.items()):
+        print(f" {sha256} {size:>16} {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Content-addressed ingest cache for .deb files.
+
+Keeps a SHA256-keyed JSON manifest of the packages already added to each
+publication target (channel/distro/component), stored next to the aptly
+root so it can be persisted between runs with actions/cache. Only packages
+whose digest is not in the manifest need to be added again.
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+from debscan import DebFormatError, DebInfo
+from preflight import load_records, scan_known
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+def default_manifest_path(aptly_root) -> Path:
+    """Return the manifest location for an aptly root, e.g. ~/.aptly -> ~/.aptly-ingest.json."""
+    aptly_root = Path(aptly_root).expanduser()
+    return aptly_root.with_name(aptly_root.name + "-ingest.json")
+
+
+def target_key(channel: str, distro: str, component: str) -> str:
+    return f"{channel}/{distro}/{component}"
+
+
+class IngestCache:
+    """SHA256-keyed record of the packages ingested per publication target."""
+
+    def __init__(self, path, targets: Dict[str, Dict[str, dict]] = None):
+        self.path = Path(path)
+        self.targets = targets if targets is not None else {}
+
+    @classmethod
+    def load(cls, path) -> "IngestCache":
+        """Load a manifest; a missing or unreadable one yields an empty cache."""
+        path = Path(path)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls(path)
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable ingest cache %s: %s", path, e)
+            return cls(path)
+
+        if data.get("version") != MANIFEST_VERSION:
+            logger.warning("Ignoring ingest cache %s with unsupported version %r",
+                           path, data.get("version"))
+            return cls(path)
+        return cls(path, data.get("targets", {}))
+
+    def partition(self, target: str, packages: Iterable[DebInfo]) -> Tuple[List[DebInfo], List[DebInfo]]:
+        """Split packages into (new or changed, already ingested) for a target."""
+        known = self.targets.get(target, {})
+        new, unchanged = [], []
+        for pkg in packages:
+            (unchanged if pkg.sha256 in known else new).append(pkg)
+        return new, unchanged
+
+    def record(self, target: str, packages: Iterable[DebInfo]) -> None:
+        """Mark packages as ingested, replacing older builds of the same name/version/arch."""
+        entries = self.targets.setdefault(target, {})
+        for pkg in packages:
+            identity = (pkg.name, pkg.version, pkg.architecture)
+            stale = [digest for digest, entry in entries.items()
+                     if (entry["name"], entry["version"], entry["architecture"]) == identity]
+            for digest in stale:
+                del entries[digest]
+            entries[pkg.sha256] = {
+                "name": pkg.name,
+                "version": pkg.version,
+                "architecture": pkg.architecture,
+                "filename": pkg.filename,
+                "size": pkg.size,
+            }
+
+    def save(self) -> None:
+        """Write the manifest atomically."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=str(self.path.parent), prefix=self.path.name, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"version": MANIFEST_VERSION, "targets": self.targets}, f,
+                          indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+def stage_packages(packages: Iterable[DebInfo], stage_dir) -> List[Path]:
+    """Hardlink (or copy, across filesystems) packages into a staging directory."""
+    stage_dir = Path(stage_dir)
+    stage_dir.mkdir(parents=True, exist_ok=True)
+    staged = []
+    for pkg in packages:
+        dest = stage_dir / pkg.filename
+        if dest.exists():
+            dest.unlink()
+        try:
+            os.link(pkg.path, dest)
+        except OSError:
+            shutil.copy2(pkg.path, dest)
+        staged.append(dest)
+    return staged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Skip .deb files that were already ingested")
+    parser.add_argument("command", choices=["filter", "record"],
+                        help="filter: stage new/changed debs; record: mark debs as ingested")
+    parser.add_argument("--manifest", default=None, help="Manifest path (default: next to --aptly-root)")
+    parser.add_argument("--aptly-root", default=os.environ.get("APTLY_ROOT", "~/.aptly"))
+    parser.add_argument("--component", required=True)
+    parser.add_argument("--distro", default="noble")
+    parser.add_argument("--channel", default="stable")
+    parser.add_argument("--debs", required=True)
+    parser.add_argument("--stage", default=None, help="Directory receiving new/changed debs (filter)")
+    parser.add_argument("--jobs", type=int, default=None)
+    parser.add_argument("--records", default=None, help="Package records saved by preflight.py --records")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    manifest = Path(args.manifest) if args.manifest else default_manifest_path(args.aptly_root)
+    cache = IngestCache.load(manifest)
+    target = target_key(args.channel, args.distro, args.component)
+
+    records = load_records(args.records) if args.records else None
+    try:
+        packages = scan_known(Path(args.debs).glob("*.deb"), records, args.jobs)
+    except DebFormatError as e:
+        logging.error("%s", e)
+        sys.exit(1)
+
+    if args.command == "filter":
+        if not args.stage:
+            parser.error("--stage is required for filter")
+        new, unchanged = cache.partition(target, packages)
+        stage_packages(new, args.stage)
+        logging.info("%s: %d new or changed, %d unchanged (skipped)", target, len(new), len(unchanged))
+        print(len(new))
+    else:
+        cache.record(target, packages)
+        cache.save()
+        logging.info("%s: recorded %d packages in %s", target, len(packages), manifest)
+
+
+if __name__ == "__main__":
+    main()
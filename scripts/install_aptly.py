@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Install the aptly binary from a release zip.
+
+The archive is streamed to a resumable `.part` file (or read in place for
+file:// mirrors) and its SHA256 is checked against the digest given with
+--sha256 or an entry of PINNED_SHA256 (logged when neither is known); only
+the `aptly` member is read out of it, in memory, and written to the destination.
+Any base URL with the GitHub release layout (`v<version>/aptly_<version>_<os>_<arch>.zip`)
+can be used as a mirror, including file:// and local HTTP servers.
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.error import HTTPError, URLError
+from urllib.parse import unquote, urlparse
+from urllib.request import Request, urlopen
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://github.com/aptly-dev/aptly/releases/download"
+CHUNK_SIZE = 1 << 20
+TIMEOUT = 30
+
+# SHA256 of release archives, keyed by archive name. The table ships empty:
+# entries are added from verified release assets (the installer logs the
+# digest of every archive it reads). An archive with neither an entry nor a
+# --sha256 digest is installed with a warning, or refused with --require-checksum.
+PINNED_SHA256: Dict[str, str] = {}
+
+ARCH_ALIASES = {"x86_64": "amd64", "aarch64": "arm64"}
+
+
+class InstallError(RuntimeError):
+    """Raised when aptly cannot be downloaded, verified or installed."""
+
+
+def archive_name(version: str, os_name: str, arch: str) -> str:
+    arch = ARCH_ALIASES.get(arch, arch)
+    return f"aptly_{version}_{os_name}_{arch}.zip"
+
+
+def release_url(version: str, os_name: str, arch: str, base_url: str = DEFAULT_BASE_URL) -> str:
+    return f"{base_url.rstrip('/')}/v{version}/{archive_name(version, os_name, arch)}"
+
+
+def _sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def download(url: str, part: Path, retries: int = 3) -> Path:
+    """
+    Stream `url` into `part`, resuming from its current size.
+
+    Interrupted transfers are retried with an HTTP Range request; servers
+    that ignore the range restart the transfer from scratch.
+    """
+    part.parent.mkdir(parents=True, exist_ok=True)
+    for attempt in range(1, retries + 1):
+        offset = part.stat().st_size if part.exists() else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        try:
+            with urlopen(Request(url, headers=headers), timeout=TIMEOUT) as resp:
+                if offset and resp.status != 206:
+                    logger.info("Server ignored range request, restarting download")
+                    offset = 0
+                elif offset:
+                    logger.info("Resuming download at byte %d", offset)
+                with open(part, "ab" if offset else "wb") as f:
+                    shutil.copyfileobj(resp, f, CHUNK_SIZE)
+            return part
+        except HTTPError as e:
+            if e.code == 416 and offset:
+                # Range not satisfiable: the partial file is already complete
+                return part
+            if 400 <= e.code < 500:
+                raise InstallError(f"Download failed: {url}: HTTP {e.code}") from e
+            error = e
+        except (URLError, OSError) as e:
+            error = e
+        logger.warning("Download attempt %d/%d failed: %s", attempt, retries, error)
+        if attempt < retries:
+            time.sleep(min(2 ** attempt, 10))
+    raise InstallError(f"Download failed after {retries} attempts: {url}")
+
+
+def fetch_archive(url: str, download_dir: Path, retries: int = 3) -> Path:
+    """Return a local path to the archive, downloading it only when remote."""
+    parsed = urlparse(url)
+    if parsed.scheme in ("", "file"):
+        path = Path(unquote(parsed.path))
+        if not path.is_file():
+            raise InstallError(f"Archive not found: {path}")
+        return path
+    return download(url, download_dir / (os.path.basename(parsed.path) + ".part"), retries)
+
+
+def verify(archive: Path, name: str, expected: Optional[str], require: bool = False) -> str:
+    actual = _sha256_file(archive)
+    expected = expected or PINNED_SHA256.get(name)
+    if expected is None:
+        if require:
+            raise InstallError(f"No pinned SHA256 for {name} (got {actual}); pass the digest of the "
+                               f"verified release asset with --sha256")
+        logger.warning("No pinned SHA256 for %s (got %s)", name, actual)
+    elif actual != expected.lower():
+        raise InstallError(f"SHA256 mismatch for {name}: expected {expected}, got {actual}")
+    else:
+        logger.info("Verified SHA256 of %s", name)
+    return actual
+
+
+def extract_binary(archive: Path, dest: Path) -> Path:
+    """Read only the aptly executable out of the archive and write it to dest."""
+    try:
+        with zipfile.ZipFile(archive) as zf:
+            members = [m for m in zf.namelist() if os.path.basename(m) in ("aptly", "aptly.exe")]
+            if not members:
+                raise InstallError(f"aptly binary not found in {archive.name}")
+            member = members[0]
+            data = zf.read(member)
+    except zipfile.BadZipFile as e:
+        raise InstallError(f"Corrupt archive {archive.name}: {e}") from e
+
+    dest.mkdir(parents=True, exist_ok=True)
+    target = dest / os.path.basename(member)
+    fd, tmp = tempfile.mkstemp(dir=str(dest), prefix=".aptly-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp, 0o755)
+        os.replace(tmp, target)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return target
+
+
+def install(version: str, os_name: str, arch: str, dest, base_url: str = DEFAULT_BASE_URL,
+            sha256: Optional[str] = None, require_checksum: bool = False,
+            download_dir=None, retries: int = 3) -> Path:
+    """Download, verify and install aptly, returning the installed binary path."""
+    name = archive_name(version, os_name, arch)
+    url = release_url(version, os_name, arch, base_url)
+    logger.info("Installing aptly %s from %s", version, url)
+
+    cleanup = download_dir is None
+    download_dir = Path(download_dir) if download_dir else Path(tempfile.mkdtemp(prefix="aptly-dl-"))
+    try:
+        archive = fetch_archive(url, download_dir, retries)
+        try:
+            verify(archive, name, sha256, require_checksum)
+        except InstallError:
+            if archive.suffix == ".part":
+                archive.unlink()
+            raise
+        binary = extract_binary(archive, Path(dest).expanduser())
+        if archive.suffix == ".part":
+            archive.unlink()
+    finally:
+        if cleanup:
+            shutil.rmtree(download_dir, ignore_errors=True)
+
+    logger.info("Installed %s", binary)
+    return binary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Install aptly from a release archive")
+    parser.add_argument("--version", required=True)
+    parser.add_argument("--os", dest="os_name", default="linux")
+    parser.add_argument("--arch", default="amd64")
+    parser.add_argument("--dest", default="~/.local/bin")
+    parser.add_argument("--mirror", default="", help="Base URL replacing the GitHub releases URL")
+    parser.add_argument("--sha256", default=None, help="Expected archive SHA256 (overrides the pinned table)")
+    parser.add_argument("--require-checksum", action="store_true",
+                        help="Fail when no expected SHA256 is known")
+    parser.add_argument("--download-dir", default=None,
+                        help="Keep partial downloads here so a rerun can resume them")
+    parser.add_argument("--retries", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    try:
+        binary = install(args.version, args.os_name, args.arch, args.dest,
+                         base_url=args.mirror or DEFAULT_BASE_URL, sha256=args.sha256,
+                         require_checksum=args.require_checksum,
+                         download_dir=args.download_dir, retries=args.retries)
+    except InstallError as e:
+        logging.error("%s", e)
+        sys.exit(1)
+
+    print(binary)
+
+
+if __name__ == "__main__":
+    main()
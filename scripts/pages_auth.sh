@@ -0,0 +1,17 @@
+# Sourced by the action steps that talk to the pages repository.
+#
+# Authenticates every git call of the sourcing step, and of the processes it
+# starts, to github.com with PAGES_TOKEN through GIT_CONFIG_* variables, so the
+# token is never written to a remote URL or a config file. The variables are
+# exported to the step only: written to $GITHUB_ENV they would reach the later
+# steps of the caller's job and add a second Authorization header to their git
+# calls (actions/checkout configures its own).
+
+if [[ -n "${PAGES_TOKEN:-}" ]]; then
+  PAGES_AUTH=$(printf 'x-access-token:%s' "${PAGES_TOKEN}" | base64 -w0)
+  echo "::add-mask::${PAGES_AUTH}"
+  export GIT_CONFIG_COUNT=1
+  export GIT_CONFIG_KEY_0="http.https://github.com/.extraheader"
+  export GIT_CONFIG_VALUE_0="AUTHORIZATION: basic ${PAGES_AUTH}"
+  unset PAGES_AUTH
+fi
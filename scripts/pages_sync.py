@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Incremental sync of a published tree to the pages repository.
+
+Instead of cloning gh-pages with every pool file ever published, the sync
+fetches only the branch tip, shallow and blob-less, and never checks out a
+working tree. Local files under the touched paths (e.g. `dists/<distro>`,
+`pool/<component>`) are compared with the tip by git object id; only the
+changed blobs are written, and a single commit is built through a
+temporary index and pushed. Clone and push cost tracks the change set.
+
+Remote files missing locally are deleted only under the `prune` paths
+(all touched paths by default); a publisher that writes into a partial
+tree restricts them to what it owns, after `seed()` has brought the
+published files it builds on into that tree.
+"""
+
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EMPTY_MODE_SHA = "0 " + "0" * 40
+
+
+class SyncError(RuntimeError):
+    """Raised when the pages repository cannot be fetched or updated."""
+
+
+@dataclass
+class SyncResult:
+    """Outcome of one sync: the pushed commit (None when nothing changed) and its size."""
+
+    commit: Optional[str]
+    written: int = 0
+    deleted: int = 0
+    bytes_written: int = 0
+
+    @property
+    def changed(self) -> bool:
+        return self.commit is not None
+
+
+def touched_paths(channel: str, distro: str, components: Iterable[str]) -> List[str]:
+    """Repository paths a publish of `components` into channel/distro may modify."""
+    paths = [f"{channel}/dists/{distro}"]
+    paths.extend(f"{channel}/pool/{component}" for component in components)
+    return paths
+
+
+def remote_url(repo: str) -> str:
+    """Local paths become file:// URLs so that shallow and filtered fetches apply."""
+    if "://" not in repo and not repo.startswith("git@") and Path(repo).exists():
+        return Path(repo).resolve().as_uri()
+    return repo
+
+
+class _Git:
+    def __init__(self, gitdir: Path, index: Optional[Path] = None):
+        self.gitdir = gitdir
+        self.env = dict(os.environ, GIT_DIR=str(gitdir))
+        if index is not None:
+            self.env["GIT_INDEX_FILE"] = str(index)
+
+    def __call__(self, *args: str, input: Optional[str] = None, check: bool = True) -> str:
+        result = subprocess.run(["git", *args], input=input, capture_output=True, text=True,
+                                env=self.env, check=False)
+        if check and result.returncode != 0:
+            raise SyncError(f"git {args[0]} failed: {result.stderr.strip()}")
+        return result.stdout
+
+
+def _local_files(source_root: Path, paths: Iterable[str]) -> Dict[str, Path]:
+    files = {}
+    for rel in paths:
+        base = source_root / rel
+        if base.is_file():
+            files[rel] = base
+            continue
+        for root, _, names in os.walk(base):
+            for name in names:
+                full = Path(root) / name
+                files[full.relative_to(source_root).as_posix()] = full
+    return files
+
+
+def _remote_entries(git: _Git, tip: Optional[str], paths: List[str]) -> Dict[str, Tuple[str, str]]:
+    if tip is None:
+        return {}
+    entries = {}
+    out = git("ls-tree", "-r", "-z", "--full-tree", tip, "--", *paths)
+    for record in filter(None, out.split("\0")):
+        meta, path = record.split("\t", 1)
+        mode, kind, sha = meta.split()
+        if kind == "blob":
+            entries[path] = (mode, sha)
+    return entries
+
+
+def _under(path: str, prefixes: Iterable[str]) -> bool:
+    return any(path == prefix or path.startswith(prefix.rstrip("/") + "/") for prefix in prefixes)
+
+
+def _blob_ids(git: _Git, files: List[Path], write: bool) -> List[str]:
+    if not files:
+        return []
+    args = ["hash-object", "--no-filters", "--stdin-paths"] + (["-w"] if write else [])
+    return git(*args, input="".join(f"{f}\n" for f in files)).split()
+
+
+class PagesSync:
+    """Shallow, checkout-free view of one branch of the pages repository."""
+
+    def __init__(self, repo: str, branch: str = "gh-pages", workdir=None):
+        self.url = remote_url(repo)
+        self.branch = branch
+        self._tmp = None
+        if workdir is None:
+            self._tmp = tempfile.TemporaryDirectory(prefix="pages-sync-")
+            workdir = self._tmp.name
+        self.gitdir = Path(workdir) / "pages.git"
+        self.git = _Git(self.gitdir, Path(workdir) / "index")
+        self.git("init", "-q", "--bare", str(self.gitdir))
+        self.git("remote", "add", "origin", self.url)
+        if not self.git("config", "--get", "user.email", check=False).strip():
+            self.git("config", "user.name", "setup-aptly")
+            self.git("config", "user.email", "setup-aptly@users.noreply.github.com")
+
+    def close(self) -> None:
+        if self._tmp is not None:
+            self._tmp.cleanup()
+
+    def __enter__(self) -> "PagesSync":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def fetch_tip(self) -> Optional[str]:
+        """Fetch the branch tip (depth 1, no blobs); None if the branch does not exist yet."""
+        heads = self.git("ls-remote", "--heads", "origin", self.branch)
+        if not any(line.endswith(f"\trefs/heads/{self.branch}") for line in heads.splitlines()):
+            return None
+        self.git("fetch", "-q", "--depth", "1", "--filter=blob:none", "origin",
+                 f"+refs/heads/{self.branch}:refs/remotes/origin/{self.branch}")
+        return self.git("rev-parse", f"refs/remotes/origin/{self.branch}").strip()
+
+    def entries(self, tip: Optional[str], paths: List[str]) -> Dict[str, Tuple[str, str]]:
+        """(mode, blob id) of the files under `paths` at `tip`, without fetching any blob."""
+        return _remote_entries(self.git, tip, paths)
+
+    def read_blob(self, sha: str) -> bytes:
+        """Content of one blob, fetched on demand from the remote (partial clone)."""
+        result = subprocess.run(["git", "cat-file", "blob", sha], capture_output=True,
+                                env=self.git.env, check=False)
+        if result.returncode != 0:
+            raise SyncError(f"git cat-file failed: {result.stderr.decode(errors='replace').strip()}")
+        return result.stdout
+
+    def prefetch(self, shas: Iterable[str]) -> None:
+        """Fetch blobs in one request instead of one lazy fetch per blob; best effort."""
+        shas = sorted(set(shas))
+        if not shas:
+            return
+        result = subprocess.run(["git", "-c", "fetch.negotiationAlgorithm=noop", "fetch", "-q", "--no-tags",
+                                 "--no-write-fetch-head", "--filter=blob:none", "origin", *shas],
+                                capture_output=True, text=True, env=self.git.env, check=False)
+        if result.returncode != 0:
+            logger.debug("Blob prefetch failed, reading blobs one by one: %s", result.stderr.strip())
+
+    def seed(self, tip: Optional[str], dest_root, paths: List[str]) -> int:
+        """
+        Bring the files under `paths` at `tip` into `dest_root`, replacing local copies that differ.
+
+        Files that exist only locally are kept. Returns the number of files written.
+        """
+        dest_root = Path(dest_root)
+        remote = _remote_entries(self.git, tip, paths)
+        present = [rel for rel in sorted(remote) if (dest_root / rel).is_file()]
+        local_ids = dict(zip(present, _blob_ids(self.git, [dest_root / rel for rel in present], write=False)))
+        stale = [rel for rel, (_, sha) in sorted(remote.items()) if local_ids.get(rel) != sha]
+        self.prefetch(remote[rel][1] for rel in stale)
+        for rel in stale:
+            mode, sha = remote[rel]
+            path = dest_root / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if path.exists():
+                path.unlink()
+            path.write_bytes(self.read_blob(sha))
+            path.chmod(0o755 if mode == "100755" else 0o644)
+        return len(stale)
+
+    def _build_commit(self, tip: Optional[str], source_root: Path, paths: List[str],
+                      message: str, prune: Optional[List[str]] = None) -> Tuple[Optional[str], SyncResult]:
+        local = _local_files(source_root, paths)
+        remote = _remote_entries(self.git, tip, paths)
+
+        names = sorted(local)
+        # Pool files linked into several channels share an inode: hash each inode once
+        by_inode: Dict[Tuple[int, int], List[str]] = {}
+        for n in names:
+            st = local[n].stat()
+            by_inode.setdefault((st.st_dev, st.st_ino), []).append(n)
+        inodes = list(by_inode.values())
+        ids = _blob_ids(self.git, [local[group[0]] for group in inodes], write=False)
+        local_ids = {n: sha for group, sha in zip(inodes, ids) for n in group}
+        changed = [n for n in names if remote.get(n, (None, None))[1] != local_ids[n]
+                   or remote[n][0] != self._mode(local[n])]
+        deleted = sorted(n for n in set(remote) - set(local) if _under(n, paths if prune is None else prune))
+        if not changed and not deleted:
+            return None, SyncResult(None)
+
+        # Only the changed blobs enter the object store, each distinct content once
+        first_by_id = {}
+        for n in changed:
+            first_by_id.setdefault(local_ids[n], n)
+        _blob_ids(self.git, [local[n] for n in first_by_id.values()], write=True)
+        index_info = [f"{self._mode(local[n])} {local_ids[n]}\t{n}" for n in changed]
+        index_info += [f"{EMPTY_MODE_SHA}\t{n}" for n in deleted]
+
+        if tip is None:
+            self.git("read-tree", "--empty")
+        else:
+            self.git("read-tree", tip)
+        self.git("update-index", "--index-info", input="\n".join(index_info) + "\n")
+        # Unchanged blobs were never fetched; they stay promised by the remote
+        tree = self.git("write-tree", "--missing-ok").strip()
+        parents = ["-p", tip] if tip else []
+        commit = self.git("commit-tree", tree, *parents, "-m", message).strip()
+        return commit, SyncResult(commit, len(changed), len(deleted),
+                                  sum(local[n].stat().st_size for n in first_by_id.values()))
+
+    @staticmethod
+    def _mode(path: Path) -> str:
+        return "100755" if os.access(path, os.X_OK) else "100644"
+
+    def sync(self, source_root, paths: List[str], message: str, retries: int = 3,
+             prune: Optional[List[str]] = None,
+             prepare: Optional[Callable[[Optional[str]], List[str]]] = None) -> SyncResult:
+        """
+        Make `paths` in the branch mirror `source_root` and push one commit.
+
+        Files missing from `source_root` are deleted only under `prune`
+        (default: all of `paths`). A push rejected because the branch moved
+        is retried on top of the new tip by recomputing the diff, which
+        stays cheap for small change sets.
+
+        With `prepare`, every attempt first calls it with the fetched tip to
+        (re)build `source_root` from that tip; the paths it returns are
+        mirrored too. A retried push then repeats the whole change on the new
+        tip instead of overwriting what was pushed in between.
+        """
+        source_root = Path(source_root)
+        for attempt in range(1, retries + 1):
+            tip = self.fetch_tip()
+            attempt_paths = paths + prepare(tip) if prepare is not None else paths
+            commit, result = self._build_commit(tip, source_root, attempt_paths, message, prune)
+            if commit is None:
+                logger.info("Pages repository already up to date")
+                return result
+            push = subprocess.run(["git", "push", "-q", "origin", f"{commit}:refs/heads/{self.branch}"],
+                                  capture_output=True, text=True, env=self.git.env, check=False)
+            if push.returncode == 0:
+                logger.info("Pushed %s: %d files written (%d bytes), %d deleted",
+                            commit[:12], result.written, result.bytes_written, result.deleted)
+                return result
+            logger.warning("Push attempt %d/%d rejected: %s", attempt, retries, push.stderr.strip())
+        raise SyncError(f"Could not push to {self.branch} after {retries} attempts")
+
+
+def sync_tree(source_root, repo: str, paths: List[str], branch: str = "gh-pages",
+              message: str = "Update APT repository", retries: int = 3,
+              prune: Optional[List[str]] = None) -> SyncResult:
+    with PagesSync(repo, branch) as pages:
+        return pages.sync(source_root, paths, message, retries, prune)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync published paths to the pages repository")
+    parser.add_argument("--source", required=True, help="Local published tree (repository root layout)")
+    parser.add_argument("--pages-repo", required=True)
+    parser.add_argument("--branch", default="gh-pages")
+    parser.add_argument("--path", action="append", dest="paths", default=None,
+                        help="Repository path to mirror (repeatable), e.g. testing/dists/noble")
+    parser.add_argument("--channel", default=None, help="With --distro/--component, derive --path values")
+    parser.add_argument("--distro", default=None)
+    parser.add_argument("--component", action="append", default=[])
+    parser.add_argument("--message", "-m", default="Update APT repository")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    paths = args.paths or []
+    if args.channel and args.distro:
+        paths += touched_paths(args.channel, args.distro, args.component)
+    if not paths:
+        parser.error("give --path or --channel/--distro/--component")
+
+    try:
+        result = sync_tree(args.source, args.pages_repo, paths, args.branch, args.message)
+    except SyncError as e:
+        logging.error("%s", e)
+        sys.exit(1)
+    print(result.commit or "unchanged")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Packages pdiffs: ed-style deltas between successive index revisions.
+
+When a Packages index changes, the previous revision is diffed against the
+new one and the ed script is stored, gzip-compressed, under
+`Packages.diff/<timestamp>.gz`. `Packages.diff/Index` lists the SHA256 of
+the current index, of every earlier revision the patches start from and of
+the patches themselves, so `apt update` downloads only the patches between
+the revision it has and the current one instead of the whole index. Only
+the last N patches are kept.
+
+The diff is computed over whole stanzas (unique, and far fewer than lines)
+and then expressed as line-numbered ed commands, last change first.
+"""
+
+import argparse
+import difflib
+import gzip
+import hashlib
+import logging
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DIFF_SUFFIX = ".diff"
+INDEX_NAME = "Index"
+DEFAULT_KEEP = 14
+# Index fields: (field, entry kind)
+HISTORY, PATCHES, DOWNLOAD = "SHA256-History", "SHA256-Patches", "SHA256-Download"
+
+
+class PdiffError(RuntimeError):
+    """Raised when a patch cannot be produced or applied."""
+
+
+@dataclass
+class DiffIndex:
+    """Contents of a `Packages.diff/Index` file."""
+
+    current: Optional[Tuple[str, int]] = None
+    # patch name -> (sha256, size) of the revision it applies to, the patch, the .gz
+    history: Dict[str, Tuple[str, int]] = field(default_factory=dict)
+    patches: Dict[str, Tuple[str, int]] = field(default_factory=dict)
+    download: Dict[str, Tuple[str, int]] = field(default_factory=dict)
+
+    @property
+    def names(self) -> List[str]:
+        return sorted(self.history)
+
+    @classmethod
+    def parse(cls, text: str) -> "DiffIndex":
+        index = cls()
+        section = None
+        tables = {HISTORY: index.history, PATCHES: index.patches, DOWNLOAD: index.download}
+        for line in text.splitlines():
+            if line.startswith(" ") and section in tables:
+                sha256, size, name = line.split()
+                tables[section][name[:-3] if section == DOWNLOAD else name] = (sha256, int(size))
+            elif ":" in line:
+                section, _, value = line.partition(":")
+                if section == "SHA256-Current" and value.strip():
+                    sha256, size = value.split()
+                    index.current = (sha256, int(size))
+        return index
+
+    def render(self) -> str:
+        lines = [f"SHA256-Current: {self.current[0]} {self.current[1]}"]
+        for section, table, suffix in ((HISTORY, self.history, ""), (PATCHES, self.patches, ""),
+                                       (DOWNLOAD, self.download, ".gz")):
+            lines.append(f"{section}:")
+            lines.extend(f" {table[name][0]} {table[name][1]:>10} {name}{suffix}" for name in self.names)
+        return "\n".join(lines) + "\n"
+
+    def drop(self, name: str) -> None:
+        for table in (self.history, self.patches, self.download):
+            table.pop(name, None)
+
+
+def _stanzas(text: str) -> List[List[str]]:
+    """Packages text as stanzas of lines, each stanza keeping its blank separator line."""
+    stanzas, current = [], []
+    for line in text.splitlines():
+        current.append(line)
+        if not line:
+            stanzas.append(current)
+            current = []
+    if current:
+        stanzas.append(current)
+    return stanzas
+
+
+def ed_diff(old: str, new: str) -> str:
+    """ed script turning `old` into `new`, as written by `diff --ed`."""
+    a, b = _stanzas(old), _stanzas(new)
+    starts = [0]
+    for stanza in a:
+        starts.append(starts[-1] + len(stanza))
+    matcher = difflib.SequenceMatcher(None, ["\n".join(s) for s in a], ["\n".join(s) for s in b],
+                                      autojunk=False)
+    commands = []
+    for tag, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+        if tag == "equal":
+            continue
+        first, last = starts[i1] + 1, starts[i2]
+        lines = [line for stanza in b[j1:j2] for line in stanza]
+        if any(line == "." for line in lines):
+            raise PdiffError("Index contains a line ed cannot represent")
+        span = f"{first},{last}" if last > first else f"{first}"
+        if tag == "delete":
+            commands.append(f"{span}d")
+        else:
+            commands.append(f"{span}c" if tag == "replace" else f"{starts[i1]}a")
+            commands.extend(lines)
+            commands.append(".")
+    return "".join(f"{command}\n" for command in commands)
+
+
+def apply_ed(old: str, script: str) -> str:
+    """Apply a `diff --ed` script (a, c and d commands only)."""
+    lines = old.splitlines()
+    commands = script.splitlines()
+    position = 0
+    while position < len(commands):
+        command = commands[position]
+        position += 1
+        op, span = command[-1], command[:-1]
+        first, _, last = span.partition(",")
+        first = int(first)
+        last = int(last) if last else first
+        text = []
+        if op in "ac":
+            while commands[position] != ".":
+                text.append(commands[position])
+                position += 1
+            position += 1
+        if op == "a":
+            lines[first:first] = text
+        elif op == "c":
+            lines[first - 1:last] = text
+        elif op == "d":
+            del lines[first - 1:last]
+        else:
+            raise PdiffError(f"Unsupported ed command {command!r}")
+    return "".join(f"{line}\n" for line in lines)
+
+
+def _digest(data: bytes) -> Tuple[str, int]:
+    return hashlib.sha256(data).hexdigest(), len(data)
+
+
+def _patch_name(diff_dir: Path, now: float) -> str:
+    # dak's naming; one second later on a collision so names stay ordered
+    stamp = int(now)
+    while True:
+        name = time.strftime("%Y-%m-%d-%H%M.%S", time.gmtime(stamp))
+        if not (diff_dir / f"{name}.gz").exists():
+            return name
+        stamp += 1
+
+
+def update_pdiffs(index_path, old: bytes, new: bytes, keep: int = DEFAULT_KEEP,
+                  now: Optional[float] = None) -> List[str]:
+    """
+    Record the change of an index from `old` to `new` in `<index>.diff/`.
+
+    A history that does not end at `old` (the index was rewritten without
+    pdiffs) is discarded, since its patches no longer lead to the current
+    index. Returns the patches now listed, oldest first.
+    """
+    index_path = Path(index_path)
+    diff_dir = index_path.with_name(index_path.name + DIFF_SUFFIX)
+    index_file = diff_dir / INDEX_NAME
+    diff_index = DiffIndex.parse(index_file.read_text()) if index_file.exists() else DiffIndex()
+    old_digest, new_digest = _digest(old), _digest(new)
+    if old_digest == new_digest:
+        return diff_index.names
+    if diff_index.current is not None and diff_index.current != old_digest:
+        logger.info("%s changed outside the pdiff history, starting a new one", index_path.name)
+        for name in diff_index.names:
+            diff_index.drop(name)
+            (diff_dir / f"{name}.gz").unlink(missing_ok=True)
+
+    script = ed_diff(old.decode("utf-8"), new.decode("utf-8")).encode("utf-8")
+    compressed = gzip.compress(script, compresslevel=9, mtime=0)
+    diff_dir.mkdir(parents=True, exist_ok=True)
+    name = _patch_name(diff_dir, time.time() if now is None else now)
+    (diff_dir / f"{name}.gz").write_bytes(compressed)
+    diff_index.history[name] = old_digest
+    diff_index.patches[name] = _digest(script)
+    diff_index.download[name] = _digest(compressed)
+
+    for expired in diff_index.names[:-keep] if keep > 0 else diff_index.names:
+        diff_index.drop(expired)
+        (diff_dir / f"{expired}.gz").unlink(missing_ok=True)
+    diff_index.current = new_digest
+    tmp = index_file.with_name(INDEX_NAME + ".tmp")
+    tmp.write_text(diff_index.render())
+    tmp.replace(index_file)
+    logger.debug("pdiff %s: %d bytes, %d patches kept", name, len(compressed), len(diff_index.names))
+    return diff_index.names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record an index change as an ed pdiff")
+    parser.add_argument("index", help="Packages file (already holding the new content)")
+    parser.add_argument("--old", required=True, help="Previous revision of the index")
+    parser.add_argument("--keep", type=int, default=DEFAULT_KEEP, help="Number of patches to keep")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    try:
+        names = update_pdiffs(args.index, Path(args.old).read_bytes(), Path(args.index).read_bytes(),
+                              args.keep)
+    except (OSError, UnicodeDecodeError, PdiffError) as e:
+        logging.error("%s", e)
+        sys.exit(1)
+    for name in names:
+        print(name)
+
+
+if __name__ == "__main__":
+    main()
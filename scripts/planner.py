@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Publish planner: diff local packages against the published Packages indexes.
+
+The currently published `<channel>/dists/<distro>/<component>/binary-*/Packages`
+(or `.gz`/`.xz`) files are read, from a pages checkout or straight from the
+pages repository (only those blobs are fetched), into an index keyed by
+package and architecture. Every local package is then classified as:
+
+    new        the package/architecture is not published
+    upgrade    newer (in dpkg order) than every published version
+    downgrade  not published, but older than the latest published version
+    identical  the same version is published with the same SHA256
+    conflict   the same version is published with different content
+
+Conflicts carry the next free Debian revision, which auto-bump would use.
+
+A plan whose packages are all identical is empty: there is nothing to publish.
+Conflicts are reported, and left to the publisher (fail, or auto-bump).
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import lzma
+import sys
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from batch import Target
+from debscan import DebInfo
+from indexes import parse_packages
+from pages_sync import PagesSync, SyncError
+from preflight import load_records, preflight
+from versions import VersionIndex, compare_versions
+
+logger = logging.getLogger(__name__)
+
+ACTIONS = ("new", "upgrade", "downgrade", "identical", "conflict")
+CHANGES = ("new", "upgrade", "downgrade")
+# Preferred index variant first: the cheapest to read
+INDEX_NAMES = ("Packages", "Packages.gz", "Packages.xz")
+
+PublishedIndex = Dict[Tuple[str, str], Dict[str, Dict[str, str]]]
+
+
+@dataclass(frozen=True)
+class PlanEntry:
+    """What publishing one local package would do."""
+
+    action: str
+    name: str
+    version: str
+    architecture: str
+    path: str
+    published: Tuple[str, ...] = ()
+    bump: str = ""
+
+
+@dataclass
+class Plan:
+    """Classified local packages for one target."""
+
+    target: Target
+    entries: List[PlanEntry] = field(default_factory=list)
+
+    def of(self, action: str) -> List[PlanEntry]:
+        return [e for e in self.entries if e.action == action]
+
+    @property
+    def changes(self) -> List[PlanEntry]:
+        return [e for e in self.entries if e.action in CHANGES]
+
+    @property
+    def empty(self) -> bool:
+        """True when every local package is already published as is."""
+        return all(e.action == "identical" for e in self.entries)
+
+    def counts(self) -> Dict[str, int]:
+        return {action: len(self.of(action)) for action in ACTIONS}
+
+    def to_dict(self) -> dict:
+        return {"target": self.target.key, "counts": self.counts(),
+                "entries": [asdict(e) for e in self.entries]}
+
+
+def decode_index(name: str, data: bytes) -> str:
+    """Text of a Packages index, decompressed according to its file name."""
+    if name.endswith(".gz"):
+        data = gzip.decompress(data)
+    elif name.endswith(".xz"):
+        data = lzma.decompress(data)
+    return data.decode("utf-8")
+
+
+def pick_indexes(names: Iterable[str]) -> List[str]:
+    """One index file per binary-<arch> directory, the cheapest variant available."""
+    by_dir: Dict[str, str] = {}
+    for name in sorted(names, key=lambda n: INDEX_NAMES.index(n.rsplit("/", 1)[1])):
+        by_dir.setdefault(name.rsplit("/", 1)[0], name)
+    return sorted(by_dir.values())
+
+
+def index_stanzas(stanzas: Iterable[Dict[str, str]], index: Optional[PublishedIndex] = None) -> PublishedIndex:
+    """Add Packages stanzas to an index: (name, arch) -> version -> stanza."""
+    index = {} if index is None else index
+    for stanza in stanzas:
+        key = (stanza["Package"], stanza.get("Architecture", ""))
+        index.setdefault(key, {})[stanza["Version"]] = stanza
+    return index
+
+
+def _component_dir(target: Target) -> str:
+    return f"{target.channel}/dists/{target.distro}/{target.component}"
+
+
+def published_from_checkout(root, target: Target) -> PublishedIndex:
+    """Read a target's published indexes from a pages checkout or published tree."""
+    root = Path(root)
+    base = root / _component_dir(target)
+    names = [p.relative_to(root).as_posix() for name in INDEX_NAMES
+             for p in base.glob(f"binary-*/{name}")]
+    index: PublishedIndex = {}
+    for rel in pick_indexes(names):
+        index_stanzas(parse_packages(decode_index(rel, (root / rel).read_bytes())), index)
+    return index
+
+
+def published_from_repo(pages: PagesSync, tip: Optional[str], target: Target) -> PublishedIndex:
+    """Read a target's published indexes from the pages repository, fetching only their blobs."""
+    index: PublishedIndex = {}
+    if tip is None:
+        return index
+    entries = pages.entries(tip, [_component_dir(target)])
+    names = [n for n in entries if n.rsplit("/", 1)[-1] in INDEX_NAMES
+             and n.rsplit("/", 2)[-2].startswith("binary-")]
+    for rel in pick_indexes(names):
+        index_stanzas(parse_packages(decode_index(rel, pages.read_blob(entries[rel][1]))), index)
+    return index
+
+
+def plan_target(target: Target, packages: Iterable[DebInfo], published: PublishedIndex) -> Plan:
+    plan = Plan(target)
+    index = VersionIndex.from_published(published)
+    for pkg in packages:
+        arch_versions = published.get((pkg.name, pkg.architecture), {})
+        versions = tuple(v for v in index.versions(pkg.name) if v in arch_versions)
+        same = [v for v in arch_versions if compare_versions(v, pkg.version) == 0]
+        bump = ""
+        if same:
+            action = "identical" if arch_versions[same[0]].get("SHA256") == pkg.sha256 else "conflict"
+            if action == "conflict":
+                bump = index.next_revision(pkg.name, pkg.version)
+        elif not arch_versions:
+            action = "new"
+        elif compare_versions(pkg.version, versions[-1]) > 0:
+            action = "upgrade"
+        else:
+            action = "downgrade"
+        plan.entries.append(PlanEntry(action, pkg.name, pkg.version, pkg.architecture, pkg.path,
+                                      versions, bump))
+    return plan
+
+
+def log_plan(plan: Plan) -> None:
+    counts = plan.counts()
+    logger.info("Plan for %s: %s", plan.target.key, ", ".join(f"{counts[a]} {a}" for a in ACTIONS))
+    for entry in plan.entries:
+        if entry.action == "conflict":
+            logger.warning("  conflict  %s %s (%s): published with different content, next revision %s",
+                           entry.name, entry.version, entry.architecture, entry.bump)
+        elif entry.action != "identical":
+            logger.info("  %-9s %s %s (%s)", entry.action, entry.name, entry.version, entry.architecture)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan a publish against the published Packages indexes")
+    parser.add_argument("--component", required=True)
+    parser.add_argument("--distro", default="noble")
+    parser.add_argument("--channel", default="stable")
+    parser.add_argument("--debs", required=True)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--pages-repo", help="Pages repository to read the published indexes from")
+    source.add_argument("--pages-checkout", help="Local checkout (or published tree) of the pages branch")
+    parser.add_argument("--branch", default="gh-pages")
+    parser.add_argument("--jobs", type=int, default=None)
+    parser.add_argument("--records", default=None, help="Package records saved by preflight.py --records")
+    parser.add_argument("--json", action="store_true", help="Print the plan as JSON instead of the number of packages to publish")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    target = Target(args.component, args.distro, args.channel, args.debs)
+    records = load_records(args.records) if args.records else None
+    checked = preflight(Path(args.debs).glob("*.deb"), args.jobs, records)
+    if not checked.ok:
+        for path, problems in sorted(checked.failures.items()):
+            logging.error("%s: %s", Path(path).name, "; ".join(problems))
+        sys.exit(1)
+
+    try:
+        if args.pages_checkout:
+            published = published_from_checkout(args.pages_checkout, target)
+        else:
+            with PagesSync(args.pages_repo, args.branch) as pages:
+                published = published_from_repo(pages, pages.fetch_tip(), target)
+    except (SyncError, OSError, ValueError) as e:
+        logging.error("Cannot read the published indexes: %s", e)
+        sys.exit(1)
+
+    plan = plan_target(target, checked.packages, published)
+    log_plan(plan)
+    if args.json:
+        print(json.dumps(plan.to_dict(), indent=2))
+    else:
+        print(len(plan.entries) - len(plan.of("identical")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Content-addressed package store shared by all channels.
+
+Every .deb is stored once under its SHA256 (`<store>/<aa>/<sha256>`), and
+channel pools (`public/<channel>/pool/...`) are materialized from the store
+with hardlinks, or reflinks where the filesystem supports them, falling back
+to copies only across filesystems. Promoting packages from one channel to
+another only links pool entries and rewrites the destination index, then
+patches (and optionally re-signs) the destination Release and updates the
+channel's reference counts.
+"""
+
+import argparse
+import errno
+import logging
+import os
+import shutil
+import sys
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from debscan import DebInfo
+from indexes import (
+    BY_HASH_STATE,
+    DEFAULT_BY_HASH_WINDOW,
+    IndexWriteError,
+    merge_packages,
+    parse_packages,
+    render_packages,
+    write_indexes,
+)
+from release import parse_release, patch_release, release_components, write_release
+from signing import GpgSession, SigningError
+
+logger = logging.getLogger(__name__)
+
+LINK_MODES = ("auto", "hardlink", "reflink", "copy")
+_ATTEMPTS = {
+    "auto": ("hardlink", "reflink", "copy"),
+    # Independent copy, without copying data where the filesystem can clone
+    "clone": ("reflink", "copy"),
+}
+# Linux FICLONE ioctl: share the source's extents copy-on-write (btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+
+class PoolError(RuntimeError):
+    """Raised when a package cannot be stored or materialized."""
+
+
+def default_store(aptly_root) -> Path:
+    return Path(aptly_root).expanduser() / "content"
+
+
+def reflink(source, dest) -> None:
+    """Clone source into dest without copying data; raises OSError where unsupported."""
+    try:
+        import fcntl
+    except ImportError as e:  # Windows
+        raise OSError(errno.EOPNOTSUPP, "reflinks are not supported on this platform") from e
+    with open(source, "rb") as src, open(dest, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.unlink(dest)
+            raise
+
+
+def link_file(source, dest, mode: str = "auto") -> str:
+    """
+    Make dest a hardlink, reflink or copy of source; returns the method used.
+
+    `auto` tries a hardlink, then a reflink, then copies.
+    """
+    if mode not in LINK_MODES and mode not in _ATTEMPTS:
+        raise PoolError(f"Unknown link mode {mode!r}")
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(f".{dest.name}.tmp")
+    if tmp.exists():
+        tmp.unlink()
+
+    error = None
+    for method in _ATTEMPTS.get(mode, (mode,)):
+        try:
+            if method == "hardlink":
+                os.link(source, tmp)
+            elif method == "reflink":
+                reflink(source, tmp)
+            else:
+                shutil.copy2(source, tmp)
+        except OSError as e:
+            error = e
+            continue
+        os.replace(tmp, dest)
+        return method
+    raise PoolError(f"Cannot link {source} to {dest}: {error}")
+
+
+@dataclass
+class MaterializeResult:
+    """How many pool entries were linked, already present, or copied."""
+
+    methods: Counter = field(default_factory=Counter)
+    present: int = 0
+
+    @property
+    def linked(self) -> int:
+        return sum(self.methods.values())
+
+
+class ContentStore:
+    """SHA256-addressed storage for package files."""
+
+    def __init__(self, root, link_mode: str = "auto"):
+        self.root = Path(root).expanduser()
+        self.link_mode = link_mode
+
+    def path(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256
+
+    def __contains__(self, sha256: str) -> bool:
+        return self.path(sha256).exists()
+
+    def add(self, pkg: DebInfo) -> Path:
+        """Store a scanned package (cloned when possible) unless it is already stored."""
+        stored = self.path(pkg.sha256)
+        if stored.exists():
+            if stored.stat().st_size != pkg.size:
+                raise PoolError(f"Corrupt store entry {stored}: size differs from {pkg.path}")
+            return stored
+        # Never hardlink the caller's file: rebuilding it in place would corrupt the store
+        link_file(pkg.path, stored, "copy" if self.link_mode == "copy" else "clone")
+        # Pool entries share this inode, so it must not be modified through any of them
+        os.chmod(stored, 0o444)
+        return stored
+
+    def materialize(self, entries: Dict[str, str], root) -> MaterializeResult:
+        """
+        Link store entries into a tree: `entries` maps relative paths to SHA256.
+
+        Destinations that already are the stored file (same inode) are left alone.
+        """
+        root = Path(root)
+        result = MaterializeResult()
+        for rel, sha256 in sorted(entries.items()):
+            stored = self.path(sha256)
+            if not stored.exists():
+                raise PoolError(f"{sha256} is not in the store (needed for {rel})")
+            dest = root / rel
+            if dest.exists() and os.path.samefile(dest, stored):
+                result.present += 1
+                continue
+            result.methods[link_file(stored, dest, self.link_mode)] += 1
+        return result
+
+
+def store_packages(store: ContentStore, component: str, packages: Iterable[DebInfo],
+                   pool_path) -> Dict[str, str]:
+    """Add packages to the store and return their pool entries (relative path -> SHA256)."""
+    entries = {}
+    for pkg in packages:
+        store.add(pkg)
+        entries[pool_path(component, pkg)] = pkg.sha256
+    return entries
+
+
+def _promote_release(source_dists: Path, dest_dists: Path, component: str, files: List[str]) -> Path:
+    """Patch the destination Release for the rewritten indexes, or write one modelled on the source's."""
+    listed = release_components(dest_dists)
+    if listed is None:
+        source = dict(parse_release((source_dists / "Release").read_text())) \
+            if (source_dists / "Release").exists() else {}
+        fields = {"Acquire-By-Hash": "yes"} if (dest_dists / BY_HASH_STATE).exists() else None
+        return write_release(dest_dists, dest_dists.name, origin=" ".join(source.get("Origin", [])),
+                             label=" ".join(source.get("Label", [])), fields=fields)
+    fields = {"Components": " ".join(listed + [component])} if component not in listed else None
+    return patch_release(dest_dists, files, fields=fields)
+
+
+def promote(public, store: ContentStore, source_channel: str, dest_channel: str, distro: str,
+            component: str, names: Optional[List[str]] = None,
+            session: Optional[GpgSession] = None) -> List[Dict[str, str]]:
+    """
+    Copy package entries from one channel's indexes to another's.
+
+    Only metadata moves: pool files are linked from the store, the
+    destination Packages indexes are merged and rewritten and their Release
+    entries patched. The Release is re-signed with `session`; without one,
+    its now stale signatures are removed. The destination's reference index
+    is reconciled. Returns the promoted stanzas.
+    """
+    # retention imports this module for the content store
+    from retention import REFS_NAME, RefIndex
+
+    public = Path(public)
+    source_dists = public / source_channel / "dists" / distro
+    dest_dists = public / dest_channel / "dists" / distro
+    promoted = []
+    indexes = {}
+    entries = {}
+    for packages_file in sorted(source_dists.glob(f"{component}/binary-*/Packages")):
+        rel = packages_file.relative_to(source_dists).as_posix()
+        stanzas = [s for s in parse_packages(packages_file.read_text())
+                   if names is None or s["Package"] in names]
+        if not stanzas:
+            continue
+        for stanza in stanzas:
+            if stanza["SHA256"] not in store:
+                # Published before the store existed: adopt the source channel's pool file
+                source_file = public / source_channel / stanza["Filename"]
+                store.add(DebInfo(str(source_file), stanza["Package"], stanza["Version"],
+                                  stanza.get("Architecture", ""), int(stanza["Size"]), stanza["SHA256"]))
+            entries[stanza["Filename"]] = stanza["SHA256"]
+        existing = dest_dists / rel
+        current = parse_packages(existing.read_text()) if existing.exists() else []
+        indexes[rel] = render_packages(merge_packages(current, stanzas))
+        promoted.extend(stanzas)
+
+    if not promoted:
+        return []
+    result = store.materialize(entries, public / dest_channel)
+    try:
+        by_hash = DEFAULT_BY_HASH_WINDOW if (dest_dists / BY_HASH_STATE).exists() else None
+        written = write_indexes(dest_dists, indexes, by_hash=by_hash)
+    except IndexWriteError as e:
+        raise PoolError(str(e)) from e
+    release = _promote_release(source_dists, dest_dists, component, written.files)
+    if session is not None:
+        try:
+            session.sign_all([release])
+        except SigningError as e:
+            raise PoolError(f"Cannot sign {release}: {e}") from e
+    else:
+        for name in ("InRelease", "Release.gpg"):
+            release.with_name(name).unlink(missing_ok=True)
+
+    refs = RefIndex.load(public / dest_channel / REFS_NAME)
+    refs.reconcile(public / dest_channel)
+    refs.save()
+    logger.info("Promoted %d packages from %s to %s (%d linked, %d already present)",
+                len(promoted), source_channel, dest_channel, result.linked, result.present)
+    return promoted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Promote packages between channels through the content store")
+    parser.add_argument("--aptly-root", default=os.environ.get("APTLY_ROOT", "~/.aptly"))
+    parser.add_argument("--from", dest="source", required=True, help="Source channel, e.g. testing")
+    parser.add_argument("--to", dest="dest", required=True, help="Destination channel, e.g. stable")
+    parser.add_argument("--distro", default="noble")
+    parser.add_argument("--component", required=True)
+    parser.add_argument("--package", action="append", default=None, help="Only promote these packages")
+    parser.add_argument("--link-mode", choices=LINK_MODES, default="auto")
+    parser.add_argument("--sign", action="store_true", help="Re-sign the destination Release")
+    parser.add_argument("--keyid", default=None)
+    parser.add_argument("--passphrase-env", default="GPG_PASSPHRASE")
+    args = parser.parse_args()
+    if args.sign and not args.keyid:
+        parser.error("--sign requires --keyid")
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    aptly_root = Path(args.aptly_root).expanduser()
+    store = ContentStore(default_store(aptly_root), args.link_mode)
+    session = None
+    try:
+        if args.sign:
+            session = GpgSession(args.keyid, os.environ.get(args.passphrase_env) or None).start()
+        promoted = promote(aptly_root / "public", store, args.source, args.dest, args.distro,
+                           args.component, args.package, session)
+    except (PoolError, SigningError, OSError, KeyError) as e:
+        logging.error("%s", e)
+        sys.exit(1)
+    finally:
+        if session is not None:
+            session.close()
+    if not promoted:
+        logging.error("No matching packages in %s/%s/%s", args.source, args.distro, args.component)
+        sys.exit(1)
+    for stanza in promoted:
+        print(f"{stanza['Package']}\t{stanza['Version']}\t{stanza.get('Architecture', '')}")
+
+
+if __name__ == "__main__":
+    main()
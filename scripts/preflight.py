@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Single-pass preflight validation of .deb files.
+
+Each package is memory-mapped and walked once: the ar magic and member
+layout (debian-binary, control.tar.*, data.tar.*) are checked against the
+file size, the control file is parsed and checked for required fields and
+for agreement with the file name, and SHA256, MD5 and size are computed
+over fixed-size windows of the mapping, so memory use does not grow with
+the package. The records carry the digests, so later stages (ingest cache,
+pool, indexes) never hash the packages again; `--records` saves them as
+JSON for the later steps of a workflow (planner, ingest cache, batch
+staging), which reuse the record of every file whose name, size and
+modification time match.
+"""
+
+import argparse
+import dataclasses
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from debscan import (
+    AR_HEADER_END,
+    AR_HEADER_SIZE,
+    AR_MAGIC,
+    DebFormatError,
+    DebInfo,
+    control_from_tar,
+    scan_debs,
+)
+
+logger = logging.getLogger(__name__)
+
+WINDOW = 1 << 20
+MAX_CONTROL_SIZE = 16 << 20
+REQUIRED_FIELDS = ("Package", "Version", "Architecture", "Maintainer", "Description")
+# Saved records by file name, with the size and mtime (ns) their file had when saved
+Records = Dict[str, Tuple[DebInfo, int, int]]
+
+PACKAGE_NAME = re.compile(r"^[a-z0-9][a-z0-9.+-]+$")
+VERSION = re.compile(r"^(\d+:)?[0-9][A-Za-z0-9.+~-]*$")
+
+
+@dataclass
+class PreflightResult:
+    """Valid package records, and the problems found in every other file."""
+
+    packages: List[DebInfo] = field(default_factory=list)
+    failures: Dict[str, List[str]] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return not self.failures
+
+
+def expected_filename(control: Dict[str, str]) -> str:
+    """Canonical `<name>_<version without epoch>_<arch>.deb` file name."""
+    version = control["Version"].split(":", 1)[-1]
+    return f"{control['Package']}_{version}_{control['Architecture']}.deb"
+
+
+def _members(buf, size: int) -> List[Tuple[str, int, int]]:
+    """(name, data offset, data size) of every ar member, checked against the file size."""
+    if buf[:len(AR_MAGIC)] != AR_MAGIC:
+        raise DebFormatError("Missing ar archive magic")
+    members = []
+    offset = len(AR_MAGIC)
+    while offset < size:
+        header = buf[offset:offset + AR_HEADER_SIZE]
+        if len(header) != AR_HEADER_SIZE or header[58:60] != AR_HEADER_END:
+            raise DebFormatError(f"Truncated ar header at offset {offset}")
+        name = header[:16].decode("ascii", errors="replace").strip().rstrip("/")
+        try:
+            length = int(header[48:58].decode("ascii").strip())
+        except ValueError as e:
+            raise DebFormatError(f"Invalid ar member size for {name!r}") from e
+        start = offset + AR_HEADER_SIZE
+        if start + length > size:
+            raise DebFormatError(f"Member {name!r} is truncated ({size - start} of {length} bytes)")
+        members.append((name, start, length))
+        offset = start + length + (length % 2)
+    return members
+
+
+def _check_layout(members: List[Tuple[str, int, int]], buf) -> Tuple[str, int, int]:
+    """Validate member order; returns the control member."""
+    names = [name for name, _, _ in members]
+    if not names or names[0] != "debian-binary":
+        raise DebFormatError(f"First member is {names[0] if names else None!r}, expected 'debian-binary'")
+    _, start, length = members[0]
+    if not buf[start:start + length].startswith(b"2."):
+        raise DebFormatError("Unsupported debian-binary format version")
+    if len(names) < 3 or not names[1].startswith("control.tar") or not names[2].startswith("data.tar"):
+        raise DebFormatError(f"Expected control.tar.* then data.tar.* members, found {names[1:]}")
+    for name in names[3:]:
+        if not name.startswith("_"):
+            raise DebFormatError(f"Unexpected member {name!r} after data.tar")
+    if members[1][2] > MAX_CONTROL_SIZE:
+        raise DebFormatError(f"{names[1]} is larger than {MAX_CONTROL_SIZE} bytes")
+    return members[1]
+
+
+def _digests(mapped: mmap.mmap, size: int) -> Tuple[str, str]:
+    sha256, md5 = hashlib.sha256(), hashlib.md5()
+    # Zero-copy windows; each is released before the next page range is touched
+    with memoryview(mapped) as view:
+        for offset in range(0, size, WINDOW):
+            with view[offset:offset + WINDOW] as window:
+                sha256.update(window)
+                md5.update(window)
+    return sha256.hexdigest(), md5.hexdigest()
+
+
+def check_deb(path) -> DebInfo:
+    """Validate one package in a single pass over its mapping; raises DebFormatError."""
+    path = str(path)
+    size = os.path.getsize(path)
+    if size == 0:
+        raise DebFormatError("Empty file")
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if hasattr(mapped, "madvise"):
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+        members = _members(mapped, size)
+        name, start, length = _check_layout(members, mapped)
+        control = control_from_tar(name, mapped[start:start + length])
+        sha256, md5 = _digests(mapped, size)
+
+    missing = [key for key in REQUIRED_FIELDS if not control.get(key)]
+    if missing:
+        raise DebFormatError(f"Control file lacks {', '.join(missing)}")
+    if not PACKAGE_NAME.match(control["Package"]):
+        raise DebFormatError(f"Invalid package name {control['Package']!r}")
+    if not VERSION.match(control["Version"]):
+        raise DebFormatError(f"Invalid version {control['Version']!r}")
+    expected = expected_filename(control)
+    if os.path.basename(path) != expected:
+        raise DebFormatError(f"File name does not match control metadata (expected {expected})")
+
+    return DebInfo(path=path, name=control["Package"], version=control["Version"],
+                   architecture=control["Architecture"], size=size, sha256=sha256,
+                   control=control, md5=md5)
+
+
+def _worker(path: str) -> Tuple[str, Optional[DebInfo], Optional[str]]:
+    try:
+        return path, check_deb(path), None
+    except (DebFormatError, OSError, ValueError) as e:
+        return path, None, str(e)
+
+
+def save_records(packages: Iterable[DebInfo], path) -> None:
+    """Write package records, with the current mtime of their files, as JSON for `load_records`."""
+    entries = [dict(pkg.to_dict(), mtime_ns=os.stat(pkg.path).st_mtime_ns) for pkg in packages]
+    Path(path).write_text(json.dumps(entries, indent=1))
+
+
+def load_records(path) -> Records:
+    """Records saved by `save_records`, keyed by file name; unreadable files yield none."""
+    try:
+        records = {}
+        for entry in json.loads(Path(path).read_text()):
+            mtime_ns = entry.pop("mtime_ns")
+            records[os.path.basename(entry["path"])] = (DebInfo(**entry), entry["size"], mtime_ns)
+        return records
+    except (OSError, ValueError, TypeError, KeyError) as e:
+        logger.warning("Ignoring unreadable preflight records %s: %s", path, e)
+        return {}
+
+
+def _reuse(path: str, records: Records) -> Optional[DebInfo]:
+    """The saved record of `path` if its file is unchanged (hardlinks and copy2 copies qualify)."""
+    record = records.get(os.path.basename(path))
+    if record is None:
+        return None
+    info, size, mtime_ns = record
+    st = os.stat(path)
+    if (st.st_size, st.st_mtime_ns) != (size, mtime_ns):
+        return None
+    return dataclasses.replace(info, path=path)
+
+
+def scan_known(paths: Iterable, records: Optional[Records] = None,
+               jobs: Optional[int] = None) -> List[DebInfo]:
+    """`scan_debs`, reusing the record of every file with a matching entry in `records`."""
+    paths = sorted(str(p) for p in paths)
+    known = {p: _reuse(p, records) for p in paths} if records else {}
+    scanned = {pkg.path: pkg for pkg in scan_debs([p for p in paths if known.get(p) is None], jobs=jobs)}
+    return [known.get(p) or scanned[p] for p in paths]
+
+
+def preflight(paths: Iterable, jobs: Optional[int] = None,
+              records: Optional[Records] = None) -> PreflightResult:
+    """
+    Validate packages in parallel; records are returned in path order.
+
+    Files with a matching entry in `records` (same name, size and mtime, e.g.
+    the same package hardlinked into a staging directory) are not read again.
+    """
+    paths = sorted(str(p) for p in paths)
+    result = PreflightResult()
+    if not paths:
+        return result
+    known = {p: _reuse(p, records) for p in paths} if records else {}
+    todo = [p for p in paths if known.get(p) is None]
+    checked = {}
+    if todo:
+        jobs = max(1, min(jobs or os.cpu_count() or 1, len(todo)))
+        if jobs == 1:
+            checked = {p: _worker(p) for p in todo}
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                chunksize = max(1, len(todo) // (jobs * 4))
+                checked = {r[0]: r for r in pool.map(_worker, todo, chunksize=chunksize)}
+    if records:
+        logger.info("Reused %d of %d preflight records", len(paths) - len(todo), len(paths))
+
+    for path in paths:
+        path, info, error = checked[path] if path in checked else (path, known[path], None)
+        if info is not None:
+            result.packages.append(info)
+        else:
+            result.failures.setdefault(path, []).append(error)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate .deb files before publishing")
+    parser.add_argument("debs", nargs="+", help=".deb files or directories containing them")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--records", default=None, help="Save the valid packages' records to this JSON file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    paths = []
+    for entry in args.debs:
+        entry = Path(entry)
+        paths.extend(entry.glob("*.deb") if entry.is_dir() else [entry])
+
+    result = preflight(paths, args.jobs)
+    if args.records:
+        save_records(result.packages, args.records)
+    for pkg in result.packages:
+        print(f"{pkg.name}\t{pkg.version}\t{pkg.architecture}\t{pkg.size}\t{pkg.sha256}\t{pkg.md5}")
+    for path, problems in sorted(result.failures.items()):
+        for problem in problems:
+            logging.error("%s: %s", path, problem)
+    if not result.ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Cached publisher environment.
+
+Creating the feelpp-aptly-publisher virtualenv on every publish costs tens
+of seconds before any real work starts. Instead the environment is built
+once (`uv venv --relocatable`) and cached under a key derived from what it
+contains: the resolved PyPI version of the publisher, or the hash of the
+apt repository's `pyproject.toml` (and `uv.lock`) when it is installed from
+source, plus the platform and Python version.
+
+After a build, a manifest (`publisher-env.json`) records the key and the
+SHA256 of every file in the environment. A restored environment is used
+only if its manifest matches the expected key, every file is intact and the
+publisher entry point runs; otherwise it is removed and rebuilt.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.error import URLError
+from urllib.request import urlopen
+
+logger = logging.getLogger(__name__)
+
+PACKAGE = "feelpp-aptly-publisher"
+ENTRY_POINT = "feelpp-apt-publish"
+DEFAULT_INDEX = "https://pypi.org/pypi"
+MANIFEST_NAME = "publisher-env.json"
+MANIFEST_VERSION = 1
+KEY_PREFIX = "publisher-env-"
+SOURCE_FILES = ("pyproject.toml", "uv.lock")
+CHUNK_SIZE = 1 << 20
+TIMEOUT = 30
+
+
+class EnvError(RuntimeError):
+    """Raised when the publisher version cannot be resolved or an environment cannot be stamped."""
+
+
+@dataclass(frozen=True)
+class EnvSpec:
+    """What the environment is built from and the cache key it is stored under."""
+
+    key: str
+    requirement: str = ""
+    editable: str = ""
+
+
+def _platform_tag() -> str:
+    return f"{platform.system().lower()}-{platform.machine()}-py{sys.version_info[0]}.{sys.version_info[1]}"
+
+
+def resolve_version(package: str = PACKAGE, index_url: str = DEFAULT_INDEX) -> str:
+    """Latest released version of `package` from a PyPI JSON API (or a file:// copy of it)."""
+    url = f"{index_url.rstrip('/')}/{package}/json"
+    try:
+        with urlopen(url, timeout=TIMEOUT) as resp:
+            return json.load(resp)["info"]["version"]
+    except (URLError, OSError, ValueError, KeyError) as e:
+        raise EnvError(f"Cannot resolve the {package} version from {url}: {e}") from e
+
+
+def env_spec(apt_repo_path=None, version: Optional[str] = None, index_url: str = DEFAULT_INDEX) -> EnvSpec:
+    """
+    Spec of the publisher environment.
+
+    A source checkout with a `pyproject.toml` is installed in editable mode
+    and keyed on its project files and location; otherwise the released
+    package is pinned to `version` (resolved from the index when not given).
+    """
+    if apt_repo_path is not None and (Path(apt_repo_path) / "pyproject.toml").is_file():
+        source = Path(apt_repo_path).resolve()
+        digest = hashlib.sha256(str(source).encode())
+        for name in SOURCE_FILES:
+            if (source / name).is_file():
+                digest.update(f"\0{name}\0".encode())
+                digest.update((source / name).read_bytes())
+        return EnvSpec(f"{KEY_PREFIX}{_platform_tag()}-src-{digest.hexdigest()[:16]}", editable=str(source))
+    version = version or resolve_version(PACKAGE, index_url)
+    return EnvSpec(f"{KEY_PREFIX}{_platform_tag()}-{version}", requirement=f"{PACKAGE}=={version}")
+
+
+def _sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def env_files(env_dir) -> Dict[str, str]:
+    """SHA256 of every file in the environment (symlinks by target), bytecode caches excluded."""
+    env_dir = Path(env_dir)
+    files = {}
+    for root, dirs, names in os.walk(env_dir):
+        dirs[:] = [d for d in dirs if d != "__pycache__"]
+        for name in names:
+            path = Path(root) / name
+            rel = path.relative_to(env_dir).as_posix()
+            if rel == MANIFEST_NAME:
+                continue
+            if path.is_symlink():
+                files[rel] = "->" + os.readlink(path)
+            else:
+                files[rel] = _sha256_file(path)
+    return files
+
+
+def stamp(env_dir, key: str) -> Path:
+    """Record the key and file digests of a freshly built environment."""
+    env_dir = Path(env_dir)
+    if not env_dir.is_dir():
+        raise EnvError(f"No environment at {env_dir}")
+    manifest = env_dir / MANIFEST_NAME
+    tmp = manifest.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"version": MANIFEST_VERSION, "key": key, "files": env_files(env_dir)},
+                              indent=1, sort_keys=True) + "\n")
+    os.replace(tmp, manifest)
+    return manifest
+
+
+def verify(env_dir, key: str, entry_point: str = ENTRY_POINT) -> Tuple[bool, List[str]]:
+    """
+    Check a restored environment.
+
+    Returns (valid, reasons); reasons name a key mismatch, missing, modified
+    or unexpected files, or an entry point that does not run.
+    """
+    env_dir = Path(env_dir)
+    try:
+        data = json.loads((env_dir / MANIFEST_NAME).read_text())
+    except (OSError, ValueError):
+        return False, ["no environment manifest"]
+    if data.get("version") != MANIFEST_VERSION:
+        return False, ["manifest from another version"]
+    if data.get("key") != key:
+        return False, [f"built for {data.get('key')}"]
+    expected, actual = data.get("files", {}), env_files(env_dir)
+    reasons = [f"{rel} {'missing' if rel not in actual else 'unexpected' if rel not in expected else 'modified'}"
+               for rel in sorted(set(expected) | set(actual)) if expected.get(rel) != actual.get(rel)]
+    if reasons:
+        return False, reasons
+    try:
+        subprocess.run([str(env_dir / "bin" / entry_point), "--help"], capture_output=True, check=True,
+                       timeout=TIMEOUT)
+    except (OSError, subprocess.SubprocessError) as e:
+        return False, [f"{entry_point} does not run: {e}"]
+    return True, []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache the publisher virtualenv between runs")
+    sub = parser.add_subparsers(dest="command", required=True)
+    key = sub.add_parser("key", help="Print key=, requirement= and editable= lines for the environment")
+    key.add_argument("--apt-repo-path", default=None, help="Source checkout installed when it has a pyproject.toml")
+    key.add_argument("--version", default=None, help="Publisher version (default: latest on the index)")
+    key.add_argument("--index-url", default=DEFAULT_INDEX, help="PyPI JSON API base URL")
+    for name, help_text in (("check", "Verify a restored environment, removing it if invalid (prints hit or miss)"),
+                            ("stamp", "Record the key and file digests of a built environment")):
+        command = sub.add_parser(name, help=help_text)
+        command.add_argument("--env", required=True, help="Environment directory")
+        command.add_argument("--key", required=True)
+        if name == "check":
+            command.add_argument("--entry-point", default=ENTRY_POINT)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    try:
+        if args.command == "key":
+            spec = env_spec(args.apt_repo_path, args.version, args.index_url)
+            print(f"key={spec.key}")
+            print(f"requirement={spec.requirement}")
+            print(f"editable={spec.editable}")
+        elif args.command == "check":
+            valid, reasons = verify(args.env, args.key, args.entry_point)
+            if valid:
+                logging.info("Publisher environment matches %s", args.key)
+            else:
+                if Path(args.env).exists():
+                    logging.info("Publisher environment is unusable (%s), rebuilding it",
+                                 "; ".join(reasons[:5]))
+                shutil.rmtree(args.env, ignore_errors=True)
+            print("hit" if valid else "miss")
+        else:
+            print(stamp(args.env, args.key))
+    except EnvError as e:
+        logging.error("%s", e)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Release file checksums.
+
+A distribution's `Release` lists the size and MD5/SHA1/SHA256 of every
+index below `dists/<distro>`. When only some indexes are rewritten (one
+component, say), their entries are patched in place (and `Date` refreshed)
+instead of regenerating the whole file, so the other indexes are never read
+again. A distribution without a `Release` gets a complete one from
+`write_release`, which lists every index found below `dists/<distro>`.
+"""
+
+import argparse
+import hashlib
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Release field name -> hashlib algorithm
+CHECKSUM_FIELDS = (("MD5Sum", "md5"), ("SHA1", "sha1"), ("SHA256", "sha256"))
+_ALGORITHMS = dict(CHECKSUM_FIELDS)
+CHUNK_SIZE = 1 << 20
+
+Fields = List[Tuple[str, List[str]]]
+# Never listed in Release: the signatures, and by-hash copies of listed files
+UNLISTED = ("Release", "InRelease", "Release.gpg", "Release.tmp", "by-hash.json")
+
+
+def release_date(now: Optional[float] = None) -> str:
+    return time.strftime("%a, %d %b %Y %H:%M:%S UTC", time.gmtime(now))
+
+
+def parse_release(text: str) -> Fields:
+    """(field, lines) pairs in file order; multi-line values keep their continuation lines."""
+    fields: Fields = []
+    for line in text.splitlines():
+        if line.startswith(" ") and fields:
+            fields[-1][1].append(line)
+        elif ":" in line:
+            key, _, value = line.partition(":")
+            fields.append((key, [value.strip()] if value.strip() else []))
+    return fields
+
+
+def render_release(fields: Fields) -> str:
+    out = []
+    for key, lines in fields:
+        if lines and not lines[0].startswith(" "):
+            out.append(f"{key}: {lines[0]}")
+            out.extend(lines[1:])
+        else:
+            out.append(f"{key}:")
+            out.extend(lines)
+    return "\n".join(out) + "\n"
+
+
+def file_checksums(path) -> Tuple[int, Dict[str, str]]:
+    """Size and every Release digest of one file, in one read."""
+    digests = {algo: hashlib.new(algo) for _, algo in CHECKSUM_FIELDS}
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            size += len(chunk)
+            for digest in digests.values():
+                digest.update(chunk)
+    return size, {algo: digest.hexdigest() for algo, digest in digests.items()}
+
+
+def release_components(dists_dir) -> Optional[List[str]]:
+    """Components listed in a distribution's Release, or None when it has no Release file."""
+    release = Path(dists_dir) / "Release"
+    if not release.exists():
+        return None
+    for key, lines in parse_release(release.read_text()):
+        if key == "Components":
+            return " ".join(lines).split()
+    return []
+
+
+def index_files(dists_dir) -> List[str]:
+    """Every file a Release lists, relative to dists_dir; of a pdiff directory only its Index."""
+    dists_dir = Path(dists_dir)
+    files = []
+    for path in dists_dir.rglob("*"):
+        rel = path.relative_to(dists_dir)
+        if not path.is_file() or rel.as_posix() in UNLISTED or "by-hash" in rel.parts:
+            continue
+        if rel.parent.name.endswith(".diff") and rel.name != "Index":
+            continue
+        files.append(rel.as_posix())
+    return sorted(files)
+
+
+def write_release(dists_dir, suite: str, codename: Optional[str] = None, origin: str = "",
+                  label: str = "", components: Optional[Iterable[str]] = None,
+                  architectures: Optional[Iterable[str]] = None, now: Optional[float] = None,
+                  fields: Optional[Dict[str, str]] = None) -> Path:
+    """
+    Write a complete Release for a distribution.
+
+    Components and architectures default to the `<component>/binary-<arch>`
+    directories present; every index file is listed with its checksums.
+    """
+    dists_dir = Path(dists_dir)
+    binaries = [p.relative_to(dists_dir) for p in dists_dir.glob("*/binary-*") if p.is_dir()]
+    if components is None:
+        components = sorted({p.parts[0] for p in binaries})
+    if architectures is None:
+        architectures = sorted({p.name[len("binary-"):] for p in binaries})
+    header = {"Origin": origin, "Label": label, "Suite": suite, "Codename": codename or suite,
+              "Date": release_date(now), "Architectures": " ".join(architectures),
+              "Components": " ".join(components)}
+    header.update(fields or {})
+    release = dists_dir / "Release"
+    release.parent.mkdir(parents=True, exist_ok=True)
+    release.write_text(render_release([(key, [value]) for key, value in header.items() if value]))
+    patch_release(dists_dir, index_files(dists_dir), now)
+    return release
+
+
+def patch_release(dists_dir, paths: Iterable[str], now: Optional[float] = None,
+                  fields: Optional[Dict[str, str]] = None) -> Optional[Path]:
+    """
+    Refresh the checksum entries of `paths` (relative to dists_dir) in its Release.
+
+    Files that exist are updated or added, missing ones are dropped; `fields`
+    (e.g. Acquire-By-Hash) are set before the checksum lists. Returns the
+    Release path, or None when the distribution has no Release file.
+    """
+    dists_dir = Path(dists_dir)
+    release = dists_dir / "Release"
+    if not release.exists():
+        return None
+    paths = sorted(set(paths))
+    sums = {rel: file_checksums(dists_dir / rel) for rel in paths if (dists_dir / rel).is_file()}
+
+    parsed = parse_release(release.read_text())
+    extra = dict(fields or {})
+    parsed = [(key, [extra.pop(key)] if key in extra else lines) for key, lines in parsed]
+    # New header fields go before the first checksum list
+    first_sum = next((i for i, (key, _) in enumerate(parsed) if key in _ALGORITHMS), len(parsed))
+    parsed[first_sum:first_sum] = [(key, [value]) for key, value in extra.items()]
+    present = {key for key, _ in parsed}
+    for key, _ in CHECKSUM_FIELDS:
+        if key not in present:
+            parsed.append((key, []))
+    patched: Fields = []
+    for key, lines in parsed:
+        algo = _ALGORITHMS.get(key)
+        if key == "Date":
+            lines = [release_date(now)]
+        elif algo is not None:
+            entries = {}
+            for line in lines:
+                parts = line.split()
+                if len(parts) == 3:
+                    entries[parts[2]] = (parts[0], parts[1])
+            for rel in paths:
+                entries.pop(rel, None)
+                if rel in sums:
+                    size, digests = sums[rel]
+                    entries[rel] = (digests[algo], str(size))
+            width = max((len(size) for _, size in entries.values()), default=0)
+            lines = [f" {digest} {size:>{width}} {rel}" for rel, (digest, size) in sorted(entries.items())]
+        patched.append((key, lines))
+
+    tmp = release.with_name("Release.tmp")
+    tmp.write_text(render_release(patched))
+    tmp.replace(release)
+    logger.info("Patched %d entries in %s", len(paths), release)
+    return release
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Patch the checksums of rewritten indexes in a Release file")
+    parser.add_argument("dists_dir", help="dists/<distro> directory containing Release")
+    parser.add_argument("paths", nargs="+", help="Index paths relative to dists_dir")
+    parser.add_argument("--component", action="append", default=[],
+                        help="Add this component to Components if it is not listed (repeatable)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    try:
+        components = release_components(args.dists_dir) or []
+        missing = [c for c in args.component if c not in components]
+        fields = {"Components": " ".join(components + missing)} if missing else None
+        release = patch_release(args.dists_dir, args.paths, fields=fields)
+    except OSError as e:
+        logging.error("%s", e)
+        sys.exit(1)
+    if release is None:
+        logging.error("No Release file in %s", args.dists_dir)
+        sys.exit(1)
+    print(release)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Retention policy and garbage collection for a publication channel.
+
+Short-lived channels such as `pr` receive a publish for every build and
+would otherwise grow forever. A reference-count index (`<channel>/refs.json`)
+maps every pool file to the number of published Packages entries that
+reference it, with the time it was first published; each index's digest is
+recorded too, so only indexes that changed since the last pass are re-read.
+
+A GC pass drops the entries that fall outside the retention policy (keep
+the newest N versions per package and architecture, and/or a maximum age),
+rewrites those indexes, patches their Release checksums, and deletes every
+pool file whose count reached zero in a single sweep, without re-reading
+the other distributions' indexes.
+
+Against the pages repository (`gc --pages-repo`), only the channel's
+`dists/` and `refs.json` are fetched: the pool is never checked out, and
+the swept files are removed from the branch by path in the pushed commit.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from indexes import (
+    BY_HASH_STATE,
+    DEFAULT_BY_HASH_WINDOW,
+    DEFAULT_FORMATS,
+    IndexWriteError,
+    parse_packages,
+    render_packages,
+    write_indexes,
+)
+from pages_sync import PagesSync, SyncError
+from pool import ContentStore, default_store
+from release import patch_release
+from signing import GpgSession, SigningError
+from versions import version_key
+
+logger = logging.getLogger(__name__)
+
+REFS_NAME = "refs.json"
+REFS_VERSION = 1
+DAY = 86400
+
+
+class RetentionError(RuntimeError):
+    """Raised when a channel cannot be collected."""
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """Which versions of each package/architecture survive a GC pass."""
+
+    keep: Optional[int] = None
+    max_age_days: Optional[float] = None
+
+    def __post_init__(self):
+        if self.keep is not None and self.keep < 1:
+            raise RetentionError("keep must be at least 1")
+        if self.max_age_days is not None and self.max_age_days < 0:
+            raise RetentionError("max_age_days must not be negative")
+
+    def expired(self, rank: int, published: float, now: float) -> bool:
+        """Whether the `rank`-th newest version (0-based), first published at `published`, goes."""
+        if self.keep is not None and rank >= self.keep:
+            return True
+        return self.max_age_days is not None and now - published > self.max_age_days * DAY
+
+
+@dataclass
+class GcResult:
+    """Entries dropped from the indexes and pool files deleted by one pass."""
+
+    removed: List[Dict[str, str]] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    bytes_freed: int = 0
+    indexes: List[str] = field(default_factory=list)
+    releases: List[str] = field(default_factory=list)
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class RefIndex:
+    """Reference counts from a channel's Packages indexes to its pool files."""
+
+    def __init__(self, path, files: Optional[Dict[str, dict]] = None,
+                 indexes: Optional[Dict[str, dict]] = None):
+        self.path = Path(path)
+        # pool path -> {"sha256", "size", "refs", "published"}
+        self.files: Dict[str, dict] = files or {}
+        # index path (relative to the channel) -> {"sha256", "files"}
+        self.indexes: Dict[str, dict] = indexes or {}
+
+    @classmethod
+    def load(cls, path) -> "RefIndex":
+        path = Path(path)
+        if not path.exists():
+            return cls(path)
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable reference index %s: %s", path, e)
+            return cls(path)
+        if data.get("version") != REFS_VERSION:
+            logger.info("Reference index format changed, rebuilding")
+            return cls(path)
+        return cls(path, data.get("files", {}), data.get("indexes", {}))
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps({"version": REFS_VERSION, "files": self.files, "indexes": self.indexes},
+                                  indent=1, sort_keys=True))
+        os.replace(tmp, self.path)
+
+    def refs(self, pool_path: str) -> int:
+        return self.files.get(pool_path, {}).get("refs", 0)
+
+    def set_index(self, index_rel: str, stanzas: Iterable[Dict[str, str]], digest: str,
+                  now: float) -> None:
+        """Record the entries of one index, adjusting the counts of the files it adds or drops."""
+        stanzas = list(stanzas)
+        old = self.indexes.get(index_rel, {}).get("files", [])
+        new = sorted({s["Filename"] for s in stanzas})
+        for filename in old:
+            self.files[filename]["refs"] -= 1
+        by_name = {s["Filename"]: s for s in stanzas}
+        for filename in new:
+            entry = self.files.setdefault(filename, {"sha256": by_name[filename].get("SHA256", ""),
+                                                     "size": int(by_name[filename].get("Size", 0)),
+                                                     "refs": 0, "published": now})
+            entry["refs"] += 1
+        self.indexes[index_rel] = {"sha256": digest, "files": new}
+
+    def drop_index(self, index_rel: str) -> None:
+        for filename in self.indexes.pop(index_rel, {}).get("files", []):
+            self.files[filename]["refs"] -= 1
+
+    def unreferenced(self) -> List[str]:
+        return sorted(name for name, entry in self.files.items() if entry["refs"] <= 0)
+
+    def forget(self, pool_paths: Iterable[str]) -> None:
+        for name in pool_paths:
+            self.files.pop(name, None)
+
+    def reconcile(self, channel_root, now: Optional[float] = None) -> List[str]:
+        """
+        Bring the counts up to date with the Packages indexes on disk.
+
+        Only indexes whose digest differs from the recorded one are parsed.
+        Returns the indexes that were (re)read.
+        """
+        channel_root = Path(channel_root)
+        now = time.time() if now is None else now
+        found = {p.relative_to(channel_root).as_posix(): p
+                 for p in channel_root.glob("dists/*/*/binary-*/Packages")}
+        changed = []
+        for rel in sorted(set(self.indexes) - set(found)):
+            self.drop_index(rel)
+            changed.append(rel)
+        for rel, path in sorted(found.items()):
+            data = path.read_bytes()
+            digest = _digest(data)
+            if self.indexes.get(rel, {}).get("sha256") != digest:
+                self.set_index(rel, parse_packages(data.decode("utf-8")), digest, now)
+                changed.append(rel)
+        return changed
+
+
+def select_expired(stanzas: List[Dict[str, str]], refs: RefIndex, policy: RetentionPolicy,
+                   now: float) -> List[Dict[str, str]]:
+    """Entries of one index that the policy drops; newest is by first publication, then dpkg version."""
+    def published(stanza):
+        return refs.files.get(stanza["Filename"], {}).get("published", now)
+
+    groups: Dict[tuple, List[Dict[str, str]]] = {}
+    for stanza in stanzas:
+        groups.setdefault((stanza["Package"], stanza.get("Architecture", "")), []).append(stanza)
+    expired = []
+    for group in groups.values():
+        group.sort(key=lambda s: (published(s), version_key(s["Version"])), reverse=True)
+        expired.extend(s for rank, s in enumerate(group) if policy.expired(rank, published(s), now))
+    return expired
+
+
+def collect(channel_root, policy: RetentionPolicy, formats: Iterable[str] = DEFAULT_FORMATS,
+            now: Optional[float] = None, session: Optional[GpgSession] = None,
+            dry_run: bool = False, store: Optional[ContentStore] = None) -> GcResult:
+    """
+    Apply the retention policy to every index of a channel and sweep unreferenced pool files.
+
+    With a content store, store entries left without any hardlinked pool file
+    are deleted along with the last pool file.
+    """
+    channel_root = Path(channel_root)
+    now = time.time() if now is None else now
+    refs = RefIndex.load(channel_root / REFS_NAME)
+    refs.reconcile(channel_root, now)
+    result = GcResult()
+
+    rewritten: Dict[Path, List[str]] = {}
+    for rel in sorted(refs.indexes):
+        path = channel_root / rel
+        stanzas = parse_packages(path.read_text())
+        expired = select_expired(stanzas, refs, policy, now)
+        if not expired:
+            continue
+        result.removed.extend(expired)
+        result.indexes.append(rel)
+        if dry_run:
+            continue
+        gone = {id(s) for s in expired}
+        kept = [s for s in stanzas if id(s) not in gone]
+        content = render_packages(kept)
+        # rel is dists/<distro>/<component>/binary-<arch>/Packages
+        distro_rel = Path(rel).parents[2]
+        dists = channel_root / distro_rel
+        try:
+            # Keep serving by-hash copies where the distribution already publishes them
+            by_hash = DEFAULT_BY_HASH_WINDOW if (dists / BY_HASH_STATE).exists() else None
+            written = write_indexes(dists, {Path(rel).relative_to(distro_rel).as_posix(): content}, formats,
+                                    by_hash=by_hash)
+        except IndexWriteError as e:
+            raise RetentionError(str(e)) from e
+        rewritten.setdefault(dists, []).extend(written.files)
+        refs.set_index(rel, kept, _digest(content), now)
+
+    if dry_run:
+        # What the sweep would delete: entries whose every reference expires
+        drops: Dict[str, int] = {}
+        for stanza in result.removed:
+            drops[stanza["Filename"]] = drops.get(stanza["Filename"], 0) + 1
+        result.deleted = sorted(f for f, n in drops.items() if refs.refs(f) <= n)
+        result.bytes_freed = sum(refs.files[f]["size"] for f in result.deleted)
+        return result
+
+    # One sweep: every file whose count dropped to zero, with no further index reads
+    for name in refs.unreferenced():
+        path = channel_root / name
+        if path.exists():
+            result.bytes_freed += path.stat().st_size
+            path.unlink()
+        else:
+            # Pool not checked out (pages repository): count the recorded size
+            result.bytes_freed += refs.files[name]["size"]
+        result.deleted.append(name)
+        stored = store.path(refs.files[name]["sha256"]) if store is not None else None
+        if stored is not None and stored.exists() and stored.stat().st_nlink == 1:
+            stored.unlink()
+    refs.forget(result.deleted)
+
+    for dists, paths in sorted(rewritten.items()):
+        release = patch_release(dists, paths, now)
+        if release is not None:
+            result.releases.append(str(release))
+    if session is not None and result.releases:
+        try:
+            session.sign_all(result.releases)
+        except SigningError as e:
+            raise RetentionError(str(e)) from e
+    refs.save()
+
+    logger.info("GC %s: %d entries removed from %d indexes, %d pool files deleted (%d bytes)",
+                channel_root.name, len(result.removed), len(result.indexes), len(result.deleted),
+                result.bytes_freed)
+    return result
+
+
+def collect_pages(repo: str, channel: str, policy: RetentionPolicy, branch: str = "gh-pages",
+                  formats: Iterable[str] = DEFAULT_FORMATS, session: Optional[GpgSession] = None,
+                  dry_run: bool = False, retries: int = 3, workdir=None) -> GcResult:
+    """
+    `collect` on a channel of the pages repository, pushed as one commit.
+
+    Each attempt seeds `<channel>/dists` and `<channel>/refs.json` at the
+    branch tip into a scratch tree and runs the pass there; the commit
+    mirrors those paths and deletes the swept pool files. A push rejected
+    because the branch moved repeats the pass on the new tip.
+    """
+    meta = [f"{channel}/dists", f"{channel}/{REFS_NAME}"]
+    outcome: Dict[str, GcResult] = {}
+    with PagesSync(repo, branch, workdir) as pages, tempfile.TemporaryDirectory(prefix="gc-") as tmp:
+        root = Path(tmp) / "tree"
+
+        def prepare(tip: Optional[str]) -> List[str]:
+            if tip is None:
+                raise RetentionError(f"Branch {branch} does not exist in {repo}")
+            shutil.rmtree(root, ignore_errors=True)
+            pages.seed(tip, root, meta)
+            if not (root / channel / "dists").is_dir():
+                raise RetentionError(f"No published distributions under {channel} in {branch}")
+            outcome["result"] = collect(root / channel, policy, formats, session=session, dry_run=dry_run)
+            return [f"{channel}/{name}" for name in outcome["result"].deleted]
+
+        try:
+            if dry_run:
+                prepare(pages.fetch_tip())
+            else:
+                pages.sync(root, meta, f"GC {channel} channel", retries, prepare=prepare)
+        except SyncError as e:
+            raise RetentionError(str(e)) from e
+    return outcome["result"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply a retention policy to a channel and delete unreferenced pool files")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    gc = sub.add_parser("gc", help="Drop expired entries and sweep the pool")
+    source = gc.add_mutually_exclusive_group(required=True)
+    source.add_argument("--root", help="Published tree (pages checkout or aptly public/)")
+    source.add_argument("--pages-repo", help="Collect a branch of the pages repository and push the result")
+    gc.add_argument("--branch", default="gh-pages", help="Pages branch (with --pages-repo)")
+    gc.add_argument("--channel", default="pr")
+    gc.add_argument("--keep", type=int, default=None, help="Versions to keep per package and architecture")
+    gc.add_argument("--max-age-days", type=float, default=None, help="Drop versions first published longer ago")
+    gc.add_argument("--index-formats", default=",".join(DEFAULT_FORMATS))
+    gc.add_argument("--sign", action="store_true", help="Re-sign the patched Release files")
+    gc.add_argument("--keyid", default=None)
+    gc.add_argument("--passphrase-env", default="GPG_PASSPHRASE")
+    gc.add_argument("--dry-run", action="store_true", help="Report what would be removed")
+    gc.add_argument("--aptly-root", default=None,
+                    help="Also prune content store entries no pool links to any more")
+
+    refs = sub.add_parser("refs", help="Rebuild the reference index from the Packages indexes")
+    refs.add_argument("--root", required=True)
+    refs.add_argument("--channel", default="pr")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    channel_root = Path(args.root) / args.channel if args.root else None
+    if channel_root is not None and not (channel_root / "dists").is_dir():
+        logging.error("No published distributions under %s", channel_root)
+        sys.exit(1)
+
+    if args.command == "refs":
+        index = RefIndex.load(channel_root / REFS_NAME)
+        changed = index.reconcile(channel_root)
+        index.save()
+        print(f"{len(changed)} indexes read, {len(index.files)} pool files referenced")
+        return
+
+    if args.keep is None and args.max_age_days is None:
+        parser.error("give --keep and/or --max-age-days")
+    if args.sign and not args.keyid:
+        parser.error("--sign requires --keyid")
+    if args.pages_repo and args.aptly_root:
+        parser.error("--aptly-root cannot be used with --pages-repo")
+
+    session = None
+    try:
+        policy = RetentionPolicy(args.keep, args.max_age_days)
+        if args.sign and not args.dry_run:
+            session = GpgSession(args.keyid, os.environ.get(args.passphrase_env) or None).start()
+        formats = [f for f in args.index_formats.split(",") if f]
+        if args.pages_repo:
+            result = collect_pages(args.pages_repo, args.channel, policy, args.branch, formats,
+                                   session=session, dry_run=args.dry_run)
+        else:
+            store = ContentStore(default_store(args.aptly_root)) if args.aptly_root else None
+            result = collect(channel_root, policy, formats, session=session, dry_run=args.dry_run,
+                             store=store)
+    except (RetentionError, SigningError, OSError, KeyError, ValueError) as e:
+        logging.error("%s", e)
+        sys.exit(1)
+    finally:
+        if session is not None:
+            session.close()
+
+    for stanza in result.removed:
+        logging.info("  %s %s %s (%s)", "would remove" if args.dry_run else "removed",
+                     stanza["Package"], stanza["Version"], stanza.get("Architecture", ""))
+    print(f"removed={len(result.removed)}")
+    print(f"deleted-files={len(result.deleted)}")
+    print(f"bytes-freed={result.bytes_freed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Batched Release signing with a warm gpg-agent.
+
+A GpgSession launches (or reuses) one gpg-agent per run and presets the
+signing key's passphrase once, so every later gpg invocation signs without
+an unlock. Presets are allowed on the launched agent's command line; an
+agent that was already running and refuses them gets the passphrase on
+every call instead. All Release files of a batch are then signed concurrently,
+producing InRelease and Release.gpg next to each one, with per-file timing.
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SigningError(RuntimeError):
+    """Raised when gpg cannot start, unlock the key or sign a file."""
+
+
+@dataclass(frozen=True)
+class SignResult:
+    """Signatures written for one Release file and how long they took."""
+
+    release: str
+    inrelease: str
+    detached: str
+    seconds: float
+
+
+class GpgSession:
+    """
+    One gpg-agent session for a publish run.
+
+    Use as a context manager; the preset passphrase is forgotten on exit.
+    """
+
+    def __init__(self, keyid: str, passphrase: Optional[str] = None,
+                 gnupghome=None, jobs: Optional[int] = None):
+        self.keyid = keyid
+        self.passphrase = passphrase
+        self.jobs = jobs or min(8, (os.cpu_count() or 1) * 2)
+        self.env = dict(os.environ)
+        if gnupghome:
+            self.env["GNUPGHOME"] = str(gnupghome)
+        self._keygrips: List[str] = []
+        self._loopback = False
+
+    def _run(self, cmd: List[str], input: Optional[bytes] = None) -> subprocess.CompletedProcess:
+        result = subprocess.run(cmd, input=input, capture_output=True, env=self.env, check=False)
+        if result.returncode != 0:
+            raise SigningError(f"{' '.join(cmd[:2])} failed: {result.stderr.decode(errors='replace').strip()}")
+        return result
+
+    def _homedir(self) -> Path:
+        out = self._run(["gpgconf", "--list-dirs", "homedir"]).stdout.decode().strip()
+        return Path(out)
+
+    def _preset_tool(self) -> Optional[str]:
+        libexec = self._run(["gpgconf", "--list-dirs", "libexecdir"]).stdout.decode().strip()
+        tool = Path(libexec) / "gpg-preset-passphrase"
+        return str(tool) if tool.exists() else shutil.which("gpg-preset-passphrase")
+
+    def _list_keygrips(self) -> List[str]:
+        out = self._run(["gpg", "--batch", "--with-colons", "--with-keygrip",
+                         "--list-secret-keys", self.keyid]).stdout.decode()
+        return [line.split(":")[9] for line in out.splitlines() if line.startswith("grp:")]
+
+    def _launch_agent(self) -> bool:
+        """
+        Start the session's gpg-agent, allowing passphrase presets on its command line only.
+
+        Returns False when an agent already serves the home directory; it is
+        used as is, and the user's gpg-agent.conf is never modified.
+        """
+        cmd = ["gpg-agent", "--homedir", str(self._homedir()), "--daemon"]
+        if self.passphrase:
+            cmd.append("--allow-preset-passphrase")
+        # The daemon inherits its parent's streams, so none may be a pipe
+        result = subprocess.run(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL, env=self.env, check=False)
+        return result.returncode == 0
+
+    def _preset(self) -> bool:
+        """Preset the passphrase of every keygrip; False when the agent refuses presets."""
+        tool = self._preset_tool()
+        if tool is None:
+            logger.warning("gpg-preset-passphrase not found, passing the passphrase on each call")
+            return False
+        try:
+            for keygrip in self._keygrips:
+                self._run([tool, "--preset", keygrip], input=self.passphrase.encode())
+        except SigningError as e:
+            logger.warning("The running gpg-agent does not accept a preset passphrase (%s), "
+                           "passing the passphrase on each call", e)
+            return False
+        return True
+
+    def start(self) -> "GpgSession":
+        """Launch the agent and unlock the key once."""
+        start = time.perf_counter()
+        if not self._launch_agent():
+            logger.debug("Using the gpg-agent already running")
+        self._keygrips = self._list_keygrips()
+        if not self._keygrips:
+            raise SigningError(f"No secret key found for {self.keyid}")
+
+        if self.passphrase:
+            self._loopback = not self._preset()
+        logger.info("gpg-agent ready for key %s in %.3fs", self.keyid, time.perf_counter() - start)
+        return self
+
+    def close(self) -> None:
+        """Forget the preset passphrase."""
+        if not self.passphrase or self._loopback:
+            return
+        tool = self._preset_tool()
+        for keygrip in self._keygrips:
+            subprocess.run([tool, "--forget", keygrip], capture_output=True, env=self.env, check=False)
+
+    def __enter__(self) -> "GpgSession":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _gpg(self, *args: str) -> None:
+        cmd = ["gpg", "--batch", "--yes", "--local-user", self.keyid, "--digest-algo", "SHA256"]
+        stdin = None
+        if self._loopback:
+            cmd += ["--pinentry-mode", "loopback", "--passphrase-fd", "0"]
+            stdin = self.passphrase.encode()
+        self._run(cmd + list(args), input=stdin)
+
+    def sign(self, release) -> SignResult:
+        """Write InRelease and Release.gpg for one Release file."""
+        release = Path(release)
+        inrelease = release.with_name("InRelease")
+        detached = release.with_name(release.name + ".gpg")
+        start = time.perf_counter()
+        self._gpg("--clearsign", "--output", str(inrelease), str(release))
+        self._gpg("--armor", "--detach-sign", "--output", str(detached), str(release))
+        return SignResult(str(release), str(inrelease), str(detached), time.perf_counter() - start)
+
+    def sign_all(self, releases: Iterable) -> List[SignResult]:
+        """Sign Release files concurrently, returning results in input order."""
+        releases = list(releases)
+        if not releases:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.jobs, len(releases))) as pool:
+            results = list(pool.map(self.sign, releases))
+        for result in results:
+            logger.info("Signed %s in %.3fs", result.release, result.seconds)
+        return results
+
+
+def latency_summary(results: Iterable[SignResult]) -> Dict[str, float]:
+    seconds = sorted(r.seconds for r in results)
+    if not seconds:
+        return {"files": 0}
+    return {
+        "files": len(seconds),
+        "min": round(seconds[0], 4),
+        "max": round(seconds[-1], 4),
+        "mean": round(sum(seconds) / len(seconds), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sign Release files with one warm gpg-agent session")
+    parser.add_argument("command", choices=["warm", "sign"],
+                        help="warm: start the agent and preset the passphrase; sign: also sign files")
+    parser.add_argument("releases", nargs="*", help="Release files to sign")
+    parser.add_argument("--keyid", required=True)
+    parser.add_argument("--passphrase-env", default="GPG_PASSPHRASE",
+                        help="Environment variable holding the passphrase")
+    parser.add_argument("--gnupghome", default=None)
+    parser.add_argument("--jobs", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    session = GpgSession(args.keyid, os.environ.get(args.passphrase_env) or None,
+                         args.gnupghome, args.jobs)
+    try:
+        if args.command == "warm":
+            # Keep the passphrase preset for the publisher that runs next
+            session.start()
+            return
+        with session:
+            results = session.sign_all(args.releases)
+    except SigningError as e:
+        logging.error("%s", e)
+        sys.exit(1)
+
+    summary = latency_summary(results)
+    logging.info("Signed %d Release files (mean %.3fs, max %.3fs)",
+                 summary["files"], summary.get("mean", 0), summary.get("max", 0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Per-phase timing spans and the structured performance report.
+
+In-process code wraps each pipeline phase in `PhaseTimer.phase()`; shell
+steps wrap commands with `timing.py run --phase NAME -- CMD...`. Both record
+wall time, CPU time (including reaped child processes), bytes read/written
+and packages processed into the same JSON report, which `timing.py summary`
+turns into GITHUB_OUTPUT values and a step-summary table.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPORT_VERSION = 1
+
+
+def _proc_io() -> Dict[str, int]:
+    """Bytes read/written by this process so far (Linux); zeros elsewhere."""
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(":", 1) for line in f)
+        return {"read": int(fields["rchar"]), "written": int(fields["wchar"])}
+    except (OSError, KeyError, ValueError):
+        return {"read": 0, "written": 0}
+
+
+def _cpu_seconds() -> float:
+    if resource is None:
+        return time.process_time()
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+@dataclass
+class PhaseSpan:
+    """
+    Measurements for one phase.
+
+    The phase body sets `packages`, and may set `bytes_read`/`bytes_written`
+    itself when it knows them exactly or does its I/O in worker processes;
+    otherwise they are measured from this process's I/O counters.
+    """
+
+    name: str
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    packages: int = 0
+
+
+class PhaseTimer:
+    """Collects PhaseSpans in execution order."""
+
+    def __init__(self):
+        self.phases: List[PhaseSpan] = []
+
+    @contextmanager
+    def phase(self, name: str, packages: int = 0) -> Iterator[PhaseSpan]:
+        span = PhaseSpan(name, packages=packages)
+        io_before = _proc_io()
+        cpu_before = _cpu_seconds()
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            io_after = _proc_io()
+            span.wall_seconds = time.perf_counter() - start
+            span.cpu_seconds = _cpu_seconds() - cpu_before
+            if not span.bytes_read:
+                span.bytes_read = io_after["read"] - io_before["read"]
+            if not span.bytes_written:
+                span.bytes_written = io_after["written"] - io_before["written"]
+            self.phases.append(span)
+
+    def add(self, span: PhaseSpan) -> None:
+        self.phases.append(span)
+
+    def report(self) -> dict:
+        return build_report([asdict(p) for p in self.phases])
+
+
+def build_report(phases: List[dict]) -> dict:
+    phases = [{**p, "wall_seconds": round(p["wall_seconds"], 4),
+               "cpu_seconds": round(p["cpu_seconds"], 4)} for p in phases]
+    total = {key: sum(p[key] for p in phases)
+             for key in ("wall_seconds", "cpu_seconds", "bytes_read", "bytes_written")}
+    total["wall_seconds"] = round(total["wall_seconds"], 4)
+    total["cpu_seconds"] = round(total["cpu_seconds"], 4)
+    total["packages"] = max((p["packages"] for p in phases), default=0)
+    return {"version": REPORT_VERSION, "phases": phases, "total": total}
+
+
+def load_report(path) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return build_report([])
+
+
+def write_report(report: dict, path) -> None:
+    Path(path).write_text(json.dumps(report, indent=2) + "\n")
+
+
+def append_phase(path, span: PhaseSpan) -> dict:
+    """Add a phase to a report file, creating it if needed."""
+    report = build_report(load_report(path)["phases"] + [asdict(span)])
+    write_report(report, path)
+    return report
+
+
+def _slug(name: str) -> str:
+    return "".join(c if c.isalnum() else "-" for c in name).strip("-").lower()
+
+
+def github_outputs(report: dict) -> Dict[str, str]:
+    """Flat key/value pairs for GITHUB_OUTPUT."""
+    outputs = {"publish-seconds": f"{report['total']['wall_seconds']:.3f}"}
+    for phase in report["phases"]:
+        outputs[f"phase-{_slug(phase['name'])}-seconds"] = f"{phase['wall_seconds']:.3f}"
+    return outputs
+
+
+def markdown_summary(report: dict) -> str:
+    lines = [
+        "### Publish performance",
+        "",
+        "| Phase | Wall (s) | CPU (s) | Read (MiB) | Written (MiB) | Packages |",
+        "|-------|---------:|--------:|-----------:|--------------:|---------:|",
+    ]
+    for p in report["phases"] + [dict(report["total"], name="**total**")]:
+        lines.append(f"| {p['name']} | {p['wall_seconds']:.3f} | {p['cpu_seconds']:.3f} | "
+                     f"{p['bytes_read'] / 2**20:.2f} | {p['bytes_written'] / 2**20:.2f} | {p['packages']} |")
+    return "\n".join(lines) + "\n"
+
+
+def run_command(name: str, cmd: List[str], packages: int = 0) -> Tuple[PhaseSpan, int]:
+    """Run a command as one phase, measured through its own rusage (POSIX)."""
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd)
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+    span = PhaseSpan(
+        name,
+        wall_seconds=time.perf_counter() - start,
+        cpu_seconds=usage.ru_utime + usage.ru_stime,
+        # Block I/O in 512-byte units; page-cache hits are not counted
+        bytes_read=usage.ru_inblock * 512,
+        bytes_written=usage.ru_oublock * 512,
+        packages=packages,
+    )
+    return span, proc.returncode
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and report publish phase timings")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Run a command as one measured phase")
+    run.add_argument("--report", required=True)
+    run.add_argument("--phase", required=True)
+    run.add_argument("--packages", type=int, default=0)
+    run.add_argument("cmd", nargs=argparse.REMAINDER)
+
+    summary = sub.add_parser("summary", help="Emit a report as GITHUB_OUTPUT values and step summary")
+    summary.add_argument("--report", required=True)
+    summary.add_argument("--github-output", action="store_true", help="Append to $GITHUB_OUTPUT")
+    summary.add_argument("--step-summary", action="store_true", help="Append to $GITHUB_STEP_SUMMARY")
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        cmd = args.cmd[1:] if args.cmd[:1] == ["--"] else args.cmd
+        if not cmd:
+            parser.error("no command given")
+        span, returncode = run_command(args.phase, cmd, args.packages)
+        append_phase(args.report, span)
+        sys.exit(returncode)
+
+    report = load_report(args.report)
+    if args.github_output and os.environ.get("GITHUB_OUTPUT"):
+        with open(os.environ["GITHUB_OUTPUT"], "a") as f:
+            for key, value in github_outputs(report).items():
+                f.write(f"{key}={value}\n")
+    if args.step_summary and os.environ.get("GITHUB_STEP_SUMMARY"):
+        with open(os.environ["GITHUB_STEP_SUMMARY"], "a") as f:
+            f.write(markdown_summary(report))
+    print(markdown_summary(report), end="")
+
+
+if __name__ == "__main__":
+    main()
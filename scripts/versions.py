@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+dpkg version ordering and a per-package version index.
+
+Versions are ordered exactly like `dpkg --compare-versions`: epoch first,
+then upstream version and Debian revision, each compared by alternating
+non-digit runs (where `~` sorts before everything, even the end of the
+string, and letters sort before other characters) and numeric runs. Each
+version string is turned once into a cached sort key, so sorting thousands
+of versions costs one parse per distinct string.
+
+`VersionIndex` holds the sorted versions of every published package, built
+once from the Packages indexes, so "is this version published" and "what
+is the next free Debian revision" (auto-bump) are lookups.
+"""
+
+import argparse
+import bisect
+import logging
+import re
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+VALID_VERSION = re.compile(r"^(\d+:)?[0-9][A-Za-z0-9.+~-]*$")
+_RUNS = re.compile(r"(\D*)(\d*)")
+_TRAILING_NUMBER = re.compile(r"(\d+)$")
+# A run pair (non-digit characters, number); equal to the end of the string
+_END = ((0,), 0)
+
+VersionKey = Tuple[int, tuple, tuple]
+
+
+class VersionError(ValueError):
+    """Raised for strings that are not Debian versions."""
+
+
+@dataclass(frozen=True)
+class Version:
+    """A parsed Debian version: [epoch:]upstream[-revision]."""
+
+    epoch: int
+    upstream: str
+    revision: str = ""
+
+    def __str__(self) -> str:
+        epoch = f"{self.epoch}:" if self.epoch else ""
+        revision = f"-{self.revision}" if self.revision else ""
+        return f"{epoch}{self.upstream}{revision}"
+
+
+@lru_cache(maxsize=65536)
+def parse_version(version: str) -> Version:
+    version = version.strip()
+    if not VALID_VERSION.match(version):
+        raise VersionError(f"Invalid version {version!r}")
+    epoch = 0
+    if ":" in version:
+        head, version = version.split(":", 1)
+        epoch = int(head)
+    upstream, revision = version, ""
+    if "-" in version:
+        upstream, revision = version.rsplit("-", 1)
+        if not revision:
+            raise VersionError(f"Empty Debian revision in {version!r}")
+    return Version(epoch, upstream, revision)
+
+
+def _char_order(char: str) -> int:
+    if char == "~":
+        return -1
+    if char.isalpha():
+        return ord(char)
+    return ord(char) + 256
+
+
+def _part_key(part: str) -> tuple:
+    """Key of an upstream version or revision, comparing like dpkg's verrevcmp."""
+    runs = []
+    for text, digits in _RUNS.findall(part):
+        if not text and not digits:
+            continue
+        # The 0 terminator makes a shorter run sort after a `~` and before anything else
+        runs.append((tuple(_char_order(c) for c in text) + (0,), int(digits or 0)))
+    # Only the first run can have no characters, so only it can equal _END:
+    # keeping it makes "" and "0" (as in "1.0" == "1.0-0") the same key
+    return tuple(runs or [_END]) + (_END,)
+
+
+@lru_cache(maxsize=65536)
+def version_key(version: str) -> VersionKey:
+    """Sort key ordering versions like dpkg."""
+    parsed = parse_version(version)
+    return parsed.epoch, _part_key(parsed.upstream), _part_key(parsed.revision)
+
+
+def compare_versions(a: str, b: str) -> int:
+    """-1, 0 or 1, as `dpkg --compare-versions a lt|eq|gt b`."""
+    ka, kb = version_key(a), version_key(b)
+    return (ka > kb) - (ka < kb)
+
+
+def bump_revision(version: str) -> str:
+    """Next Debian revision: 1.0-1 -> 1.0-2, 1.0-1ubuntu -> 1.0-1ubuntu1, 1.0 -> 1.0-1."""
+    parsed = parse_version(version)
+    if not parsed.revision:
+        revision = "1"
+    else:
+        match = _TRAILING_NUMBER.search(parsed.revision)
+        if match:
+            revision = parsed.revision[:match.start()] + str(int(match.group(1)) + 1)
+        else:
+            revision = parsed.revision + "1"
+    return str(Version(parsed.epoch, parsed.upstream, revision))
+
+
+class VersionIndex:
+    """Sorted published versions per package name (optionally per architecture)."""
+
+    def __init__(self):
+        self._versions: Dict[str, List[Tuple[VersionKey, str]]] = {}
+        self._arches: Dict[Tuple[str, str], set] = {}
+
+    @classmethod
+    def from_stanzas(cls, stanzas: Iterable[Dict[str, str]]) -> "VersionIndex":
+        index = cls()
+        for stanza in stanzas:
+            index.add(stanza["Package"], stanza["Version"], stanza.get("Architecture", ""))
+        return index
+
+    @classmethod
+    def from_published(cls, published: Dict[Tuple[str, str], Dict[str, dict]]) -> "VersionIndex":
+        """From a planner index: (name, architecture) -> version -> stanza."""
+        index = cls()
+        for (name, arch), versions in published.items():
+            for version in versions:
+                index.add(name, version, arch)
+        return index
+
+    def add(self, name: str, version: str, architecture: str = "") -> None:
+        entries = self._versions.setdefault(name, [])
+        entry = (version_key(version), version)
+        position = bisect.bisect_left(entries, entry)
+        if position == len(entries) or entries[position] != entry:
+            entries.insert(position, entry)
+        self._arches.setdefault((name, version), set()).add(architecture)
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._versions.values())
+
+    def versions(self, name: str) -> List[str]:
+        """Published versions of a package, oldest first."""
+        return [version for _, version in self._versions.get(name, [])]
+
+    def latest(self, name: str) -> Optional[str]:
+        entries = self._versions.get(name)
+        return entries[-1][1] if entries else None
+
+    def exists(self, name: str, version: str, architecture: Optional[str] = None) -> bool:
+        """Whether a version equal (in dpkg terms) to `version` is published."""
+        entries = self._versions.get(name, [])
+        key = version_key(version)
+        position = bisect.bisect_left(entries, (key,))
+        if position == len(entries) or entries[position][0] != key:
+            return False
+        if architecture is None:
+            return True
+        arches = self._arches.get((name, entries[position][1]), set())
+        return architecture in arches or "all" in arches
+
+    def next_revision(self, name: str, version: str) -> str:
+        """`version` if it is free, else the next Debian revision above every published one of it."""
+        if not self.exists(name, version):
+            return version
+        parsed = parse_version(version)
+        same = [v for v in self.versions(name)
+                if (parse_version(v).epoch, parse_version(v).upstream) == (parsed.epoch, parsed.upstream)]
+        candidate = bump_revision(same[-1])
+        while self.exists(name, candidate):
+            candidate = bump_revision(candidate)
+        return candidate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare and sort Debian versions like dpkg")
+    sub = parser.add_subparsers(dest="command", required=True)
+    compare = sub.add_parser("compare", help="Print -1, 0 or 1 like dpkg --compare-versions")
+    compare.add_argument("a")
+    compare.add_argument("b")
+    sort = sub.add_parser("sort", help="Sort versions read from the arguments or stdin")
+    sort.add_argument("versions", nargs="*")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    try:
+        if args.command == "compare":
+            print(compare_versions(args.a, args.b))
+        else:
+            versions = args.versions or [line.strip() for line in sys.stdin if line.strip()]
+            for version in sorted(versions, key=version_key):
+                print(version)
+    except VersionError as e:
+        logging.error("%s", e)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
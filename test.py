@@ -217,30 +217,27 @@ def test_mock_publish_script():
         return True
     
     with tempfile.TemporaryDirectory() as tmpdir:
-        # Create a mock .deb file
-        mock_deb = Path(tmpdir) / "mock-package.deb"
-        mock_deb.write_text("mock deb content")
+        # Create a mock .deb package; preflight rejects files that are not real packages
+        if create_mock_deb_package(Path(tmpdir)) is None:
+            logger.warning("⚠️  dpkg-deb not available, skipping mock publish test")
+            return True
         
+        # Run the pipeline in-process through its Python API
+        sys.path.insert(0, str(mock_script.parent))
+        from aptly_publish import PublishConfig, PublishError, publish
+
         try:
-            result = run_command([
-                "python3", str(mock_script),
-                "--component", "test-component",
-                "--debs", tmpdir,
-                "--pages-repo", "https://example.com/repo.git",
-                "--verbose"
-            ], capture_output=True)
-            
-            if "Mock publish completed" in result.stdout:
-                logger.info("✅ Mock publish script works correctly")
-                return True
-            else:
-                logger.error("❌ Mock script output unexpected")
-                return False
-                
-        except subprocess.CalledProcessError as e:
+            result = publish(PublishConfig.single("test-component", tmpdir, "https://example.com/repo.git"))
+        except PublishError as e:
             logger.error(f"❌ Mock script test failed: {e}")
             return False
 
+        if result.report.get("phases"):
+            logger.info("✅ Mock publish script works correctly")
+            return True
+        logger.error("❌ Mock script output unexpected")
+        return False
+
 def main():
     """Run all tests and report results."""
     logger.info("🧪 Testing setup-aptly action...")
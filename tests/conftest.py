@@ -0,0 +1,45 @@
+"""
+Shared pytest configuration: makes the modules in scripts/ importable,
+mirroring how they import each other when run as scripts, and provides a
+throwaway GnuPG home with a passphrase-protected signing key for the
+signing tests.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+SCRIPTS_DIR = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+PASSPHRASE = "test-passphrase"
+
+
+def generate_key(gnupghome: Path) -> str:
+    """Create a throwaway passphrase-protected signing key and return its fingerprint."""
+    env = {**os.environ, "GNUPGHOME": str(gnupghome)}
+    subprocess.run([
+        "gpg", "--batch", "--pinentry-mode", "loopback", "--passphrase", PASSPHRASE,
+        "--quick-generate-key", "Test User <test@example.com>", "ed25519", "sign", "never",
+    ], env=env, check=True, capture_output=True)
+    out = subprocess.run(["gpg", "--batch", "--with-colons", "--list-secret-keys"],
+                         env=env, check=True, capture_output=True, text=True).stdout
+    # Restart the agent so nothing stays unlocked from key generation
+    subprocess.run(["gpgconf", "--kill", "gpg-agent"], env=env, check=True)
+    return next(line.split(":")[9] for line in out.splitlines() if line.startswith("fpr:"))
+
+
+@pytest.fixture
+def gnupghome():
+    # Short path: gpg-agent sockets live in GNUPGHOME and have a length limit
+    home = Path(tempfile.mkdtemp(prefix="gpg-", dir="/tmp"))
+    home.chmod(0o700)
+    yield home
+    subprocess.run(["gpgconf", "--kill", "gpg-agent"], env={**os.environ, "GNUPGHOME": str(home)},
+                   capture_output=True)
+    shutil.rmtree(home, ignore_errors=True)
@@ -0,0 +1,121 @@
+import json
+import subprocess
+import tempfile
+from pathlib import Path
+
+import pytest
+from batch import Target, group_packages, load_manifest
+from debscan import scan_debs
+
+from tests.test_utils import create_mock_deb_package
+
+
+def test_load_manifest_applies_defaults():
+    """Test that YAML manifests merge defaults into every target."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        manifest = Path(tmpdir) / "targets.yml"
+        manifest.write_text(
+            "defaults:\n"
+            "  channel: testing\n"
+            "  debs: out\n"
+            "targets:\n"
+            "  - component: base\n"
+            "  - component: feelpp\n"
+            "    distro: jammy\n"
+            "    architectures: arm64\n"
+        )
+
+        targets = load_manifest(manifest)
+
+        assert targets == [
+            Target("base", "noble", "testing", "out"),
+            Target("feelpp", "jammy", "testing", "out", ("arm64",)),
+        ]
+
+def test_load_manifest_rejects_invalid_targets():
+    """Test that missing fields and duplicate targets are reported."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        manifest = Path(tmpdir) / "targets.json"
+
+        manifest.write_text(json.dumps([{"component": "base"}]))
+        with pytest.raises(ValueError, match="lacks 'debs'"):
+            load_manifest(manifest)
+
+        manifest.write_text(json.dumps([{"component": "base", "debs": "a"},
+                                        {"component": "base", "debs": "b"}]))
+        with pytest.raises(ValueError, match="duplicate target stable/noble/base"):
+            load_manifest(manifest)
+
+def test_group_packages_by_architecture():
+    """Test that packages split per Architecture and arch:all joins every group."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        debs = Path(tmpdir)
+        create_mock_deb_package(debs, "tool", "1.0.0", "amd64")
+        create_mock_deb_package(debs, "tool", "1.0.0", "arm64")
+        create_mock_deb_package(debs, "tool-data", "1.0.0", "all")
+        packages = scan_debs(debs.glob("*.deb"), jobs=1)
+
+        groups = group_packages([Target("base", debs=str(debs))], {str(debs): packages})
+
+        assert [g.repo_name for g in groups] == ["stable-noble-base-amd64", "stable-noble-base-arm64"]
+        for group in groups:
+            assert sorted(p.architecture for p in group.packages) == sorted(["all", group.architecture])
+
+        only_arm = group_packages([Target("base", debs=str(debs), architectures=("arm64",))],
+                                  {str(debs): packages})
+        assert [g.architecture for g in only_arm] == ["arm64"]
+
+def test_mock_publish_manifest_batch():
+    """Test that the mock script publishes every manifest target in one run."""
+    script_path = Path(__file__).parent.parent / "scripts" / "aptly_publish.py"
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        create_mock_deb_package(tmpdir_path / "base", "mmg", "5.7.0")
+        create_mock_deb_package(tmpdir_path / "feelpp", "feelpp-tools", "1.0.0", "arm64")
+        manifest = tmpdir_path / "targets.json"
+        manifest.write_text(json.dumps([
+            {"component": "base", "distro": "noble", "debs": str(tmpdir_path / "base")},
+            {"component": "feelpp", "distro": "jammy", "debs": str(tmpdir_path / "feelpp")},
+        ]))
+
+        result = subprocess.run([
+            "python3", str(script_path),
+            "--manifest", str(manifest),
+            "--pages-repo", "https://example.com/repo.git",
+        ], capture_output=True, text=True)
+
+        assert result.returncode == 0
+        assert "Found 2 .deb files" in result.stderr
+        assert "Creating aptly repository stable-noble-base-amd64" in result.stderr
+        assert "Creating aptly repository stable-jammy-feelpp-arm64" in result.stderr
+        assert "Publishing 2 snapshot(s)" in result.stderr
+        assert result.stderr.count("Syncing to pages repository") == 1
+        assert "Mock publish completed for feelpp (jammy/stable)" in result.stdout
+
+def test_batch_cli_lists_and_stages_architectures():
+    """Test that listed targets carry their architectures and staging keeps only those packages."""
+    script_path = Path(__file__).parent.parent / "scripts" / "batch.py"
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        debs = tmpdir_path / "debs"
+        create_mock_deb_package(debs, "tool", "1.0.0", "amd64")
+        create_mock_deb_package(debs, "tool", "1.0.0", "arm64")
+        create_mock_deb_package(debs, "tool-data", "1.0.0", "all")
+        manifest = tmpdir_path / "targets.json"
+        manifest.write_text(json.dumps([{"component": "base", "debs": "out"},
+                                        {"component": "feelpp", "debs": str(debs),
+                                         "architectures": ["arm64"]}]))
+
+        listed = subprocess.run(["python3", str(script_path), "--manifest", str(manifest)],
+                                capture_output=True, text=True, check=True)
+        assert listed.stdout.splitlines() == ["base\tnoble\tstable\tout\t",
+                                              f"feelpp\tnoble\tstable\t{debs}\tarm64"]
+
+        stage = tmpdir_path / "stage"
+        staged = subprocess.run(["python3", str(script_path), "--debs", str(debs),
+                                 "--architectures", "arm64", "--stage", str(stage)],
+                                capture_output=True, text=True, check=True)
+        assert staged.stdout.strip() == "2"
+        assert sorted(p.name for p in stage.iterdir()) == ["tool-data_1.0.0_all.deb", "tool_1.0.0_arm64.deb"]
@@ -0,0 +1,48 @@
+import copy
+import tempfile
+from pathlib import Path
+
+from benchmark import build_deb, compare, generate_repository, run_benchmark
+from debscan import read_deb
+
+
+def test_build_deb_is_readable():
+    """Test that synthetic packages are well-formed .deb archives."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        deb = build_deb(Path(tmpdir), "synthetic", "2.0-1", "arm64", payload_size=1000,
+                        fields={"Depends": "libc6"})
+
+        info = read_deb(deb)
+
+        assert (info.name, info.version, info.architecture) == ("synthetic", "2.0-1", "arm64")
+        assert info.control["Depends"] == "libc6"
+        assert deb.name == "synthetic_2.0-1_arm64.deb"
+
+def test_generate_repository_version_history():
+    """Test that later revisions only bump the changed packages."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        generate_repository(Path(tmpdir), 5, payload_size=10)
+        debs = generate_repository(Path(tmpdir), 5, payload_size=10, revision=2, changed=2)
+
+        versions = sorted(read_deb(d).version for d in debs)
+        assert versions == ["1.0.0-1"] * 3 + ["1.0.0-2"] * 2
+        assert len(list(Path(tmpdir).glob("*.deb"))) == 5
+
+def test_run_benchmark_records_phases():
+    """Test an end-to-end run at a tiny scale and regression comparison."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        results = run_benchmark([3], payload_size=10, rounds=2, churn=0.5, jobs=1, workdir=tmpdir)
+
+        case = results["cases"][0]
+        assert case["packages"] == 3
+        assert [(p["phase"], p["round"]) for p in case["phases"]] == [
+            ("generate", 1), ("publish", 1), ("generate", 2), ("publish", 2)]
+        publish = case["phases"][1]
+        assert publish["wall_seconds"] > 0
+        assert publish["peak_rss_bytes"] > 0
+        assert publish["bytes_written"] > 0
+
+        assert compare(results, results) == []
+        slower = copy.deepcopy(results)
+        slower["cases"][0]["phases"][1]["wall_seconds"] *= 2
+        assert len(compare(results, slower)) == 1
@@ -0,0 +1,92 @@
+import gzip
+import subprocess
+import tempfile
+from pathlib import Path
+
+from catalog import Catalog, refresh_from_checkout, refresh_from_repo
+from pages_sync import PagesSync, sync_tree
+
+
+def write_index(root: Path, channel: str, distro: str, versions, gz: bool = False) -> str:
+    """Write a feelpp component index holding (package, version) pairs; returns its path."""
+    rel = f"{channel}/dists/{distro}/feelpp/binary-amd64/Packages"
+    content = "".join(f"Package: {name}\nVersion: {version}\nArchitecture: amd64\nSize: 100\n\n"
+                      for name, version in versions).encode()
+    path = root / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if gz:
+        rel += ".gz"
+        (root / rel).write_bytes(gzip.compress(content))
+    else:
+        path.write_bytes(content)
+    return rel
+
+
+def test_catalog_queries_across_channels_and_distros():
+    """Test lookups, filters and patterns over every published index."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        write_index(root, "stable", "noble", [("feelpp-tools", "1.0-1"), ("feelpp-doc", "1.0-1")])
+        write_index(root, "testing", "noble", [("feelpp-tools", "1.1~rc1-1"), ("feelpp-tools", "1.0-1")])
+        write_index(root, "testing", "jammy", [("feelpp-tools", "1.1~rc1-1")], gz=True)
+
+        catalog = Catalog()
+        changed, dropped = refresh_from_checkout(catalog, root)
+        assert len(changed) == 3 and dropped == []
+        assert len(catalog) == 5
+        assert catalog.names() == ["feelpp-doc", "feelpp-tools"]
+
+        entries = catalog.query(["feelpp-tools"], distros=["noble"])
+        assert [(e.channel, e.version) for e in entries] == [
+            ("stable", "1.0-1"), ("testing", "1.0-1"), ("testing", "1.1~rc1-1")]
+        assert [e.target for e in catalog.query(["feelpp-tools"], channels=["testing"], distros=["jammy"])] == [
+            "testing/jammy/feelpp"]
+        assert {e.name for e in catalog.query(["feelpp-*"], channels=["stable"])} == {"feelpp-doc", "feelpp-tools"}
+        assert catalog.query(["missing"]) == [] and catalog.query(distros=["focal"]) == []
+        assert catalog.query(["feelpp-doc"])[0].size == 100
+
+def test_catalog_refreshes_only_changed_indexes():
+    """Test that a saved catalog re-reads changed indexes and drops removed ones."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir) / "pages"
+        cache = Path(tmpdir) / "catalog.json"
+        write_index(root, "stable", "noble", [("feelpp-tools", "1.0-1")])
+        jammy = write_index(root, "stable", "jammy", [("feelpp-tools", "1.0-1")])
+        catalog = Catalog()
+        refresh_from_checkout(catalog, root)
+        catalog.save(cache)
+
+        noble = write_index(root, "stable", "noble", [("feelpp-tools", "1.1-1")])
+        (root / jammy).unlink()
+        loaded = Catalog.load(cache)
+        assert loaded.indexes == catalog.indexes
+        changed, dropped = refresh_from_checkout(loaded, root)
+        assert (changed, dropped) == ([noble], [jammy])
+        assert [(e.distro, e.version) for e in loaded.query(["feelpp-tools"])] == [("noble", "1.1-1")]
+
+        loaded.save(cache)
+        assert Catalog.load(cache).strings.strings.count("1.0-1") == 0
+        assert refresh_from_checkout(Catalog.load(cache), root) == ([], [])
+        cache.write_text("not json")
+        assert len(Catalog.load(cache)) == 0
+
+def test_catalog_refreshes_from_pages_repo():
+    """Test that unchanged index blobs are not read again from the pages repository."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        pages = tmpdir_path / "pages.git"
+        subprocess.run(["git", "init", "-q", "--bare", str(pages)], check=True)
+        subprocess.run(["git", "config", "uploadpack.allowFilter", "true"], cwd=pages, check=True)
+        public = tmpdir_path / "public"
+        rels = [write_index(public, "stable", "noble", [("feelpp-tools", "1.0-1")]),
+                write_index(public, "pr", "noble", [("feelpp-tools", "1.1-1")])]
+        sync_tree(public, str(pages), rels)
+
+        catalog = Catalog()
+        with PagesSync(str(pages)) as sync:
+            assert refresh_from_repo(catalog, sync, None) == ([], [])
+            tip = sync.fetch_tip()
+            assert refresh_from_repo(catalog, sync, tip) == (sorted(rels), [])
+            assert refresh_from_repo(catalog, sync, tip) == ([], [])
+            assert refresh_from_repo(catalog, sync, tip, ["stable"]) == ([], [rels[1]])
+        assert [e.channel for e in catalog.query(["feelpp-tools"])] == ["stable"]
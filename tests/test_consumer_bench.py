@@ -0,0 +1,43 @@
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+from benchmark import compare
+from consumer_bench import ThrottledServer, run_consumer_benchmark
+
+
+def test_throttled_server_applies_latency_and_bandwidth():
+    """Test that responses are delayed and paced, and that bytes and requests are counted."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        (Path(tmpdir) / "Packages").write_bytes(b"x" * 40960)
+        with ThrottledServer(tmpdir, latency=0.05, bandwidth=200 * 1024) as server:
+            start = time.perf_counter()
+            with urlopen(server.url + "Packages") as resp:
+                assert len(resp.read()) == 40960
+            assert time.perf_counter() - start >= 0.2
+            with pytest.raises(HTTPError):
+                urlopen(server.url + "missing")
+            assert (server.requests, server.bytes_sent) == (2, 40960)
+            server.reset()
+            assert (server.requests, server.bytes_sent) == (0, 0)
+
+@pytest.mark.skipif(shutil.which("apt-get") is None, reason="apt-get not available")
+def test_consumer_benchmark_runs_apt_against_published_tree():
+    """Test cold and warm updates and install resolution with an isolated apt configuration."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        results = run_consumer_benchmark([5], ["gz", "none"], payload_size=10, jobs=1, workdir=tmpdir)
+
+        assert [(c["packages"], c["format"]) for c in results["cases"]] == [(5, "gz"), (5, "none")]
+        for case in results["cases"]:
+            cold, warm, install = case["phases"]
+            assert (cold["phase"], warm["phase"], install["phase"]) == ("update", "update-warm", "install")
+            assert cold["bytes_transferred"] > case["index_bytes"] and cold["requests"] > 0
+            assert warm["bytes_transferred"] < cold["bytes_transferred"]
+            assert install["wall_seconds"] > 0
+        gz, plain = results["cases"]
+        assert gz["index_bytes"] < plain["index_bytes"]
+        assert compare(results, results) == []
@@ -0,0 +1,142 @@
+import subprocess
+import tempfile
+import threading
+from pathlib import Path
+
+from batch import Target, load_manifest
+from coordinator import Coordinator, PublishRequest, make_server, merge_targets, submit
+
+from tests.test_utils import create_mock_deb_package
+
+
+def make_debs(root: Path, name: str, *packages: str) -> Path:
+    debs = root / name
+    debs.mkdir()
+    for package in packages:
+        create_mock_deb_package(debs, package, "1.0.0")
+    return debs
+
+
+def test_merge_targets_stages_shared_targets():
+    """Test that requests for one target from several directories become one staged target."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        a = make_debs(tmpdir_path, "a", "pkg-a")
+        b = make_debs(tmpdir_path, "b", "pkg-b")
+        c = make_debs(tmpdir_path, "c", "pkg-c")
+        requests = [
+            PublishRequest("1", Target("base", debs=str(a))),
+            PublishRequest("2", Target("base", debs=str(b))),
+            PublishRequest("3", Target("feelpp", channel="testing", debs=str(c))),
+        ]
+
+        merged = merge_targets(requests, tmpdir_path / "stage")
+
+        assert [t.key for t in merged] == ["stable/noble/base", "testing/noble/feelpp"]
+        assert sorted(p.name for p in Path(merged[0].debs).glob("*.deb")) == [
+            "pkg-a_1.0.0_amd64.deb", "pkg-b_1.0.0_amd64.deb"]
+        assert merged[1].debs == str(c)
+
+def test_requests_within_window_share_one_publish():
+    """Test that concurrent requests are published by a single run and all complete."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        a = make_debs(tmpdir_path, "a", "pkg-a")
+        b = make_debs(tmpdir_path, "b", "pkg-b")
+        runs = []
+
+        def runner(cmd):
+            runs.append([t.key for t in load_manifest(cmd[cmd.index("--manifest") + 1])])
+            return subprocess.CompletedProcess(cmd, 0, "published\n", "")
+
+        with Coordinator(["--pages-repo", "repo"], window=0.5, workdir=tmpdir_path / "work",
+                         runner=runner) as coordinator:
+            requests = [coordinator.submit(Target("base", debs=str(a))),
+                        coordinator.submit(Target("feelpp", debs=str(b))),
+                        coordinator.submit(Target("base", debs=str(b)))]
+            for request in requests:
+                assert request.done.wait(10)
+
+        assert runs == [["stable/noble/base", "stable/noble/feelpp"]]
+        assert {(r.state, r.batch, r.returncode) for r in requests} == {("done", 1, 0)}
+
+def test_http_submit_with_mock_publisher():
+    """Test the HTTP API end to end with the mock aptly_publish.py."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        a = make_debs(tmpdir_path, "a", "pkg-a")
+        b = make_debs(tmpdir_path, "b", "pkg-b")
+
+        coordinator = Coordinator(["--pages-repo", "https://example.com/repo.git"], window=0.5)
+        server = make_server(coordinator, "127.0.0.1:0")
+        url = "http://127.0.0.1:%d" % server.server_address[1]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        results = {}
+        try:
+            with coordinator:
+                clients = [threading.Thread(target=lambda name=name, debs=debs: results.update(
+                    {name: submit(url, Target(name, debs=str(debs)), poll=1)}))
+                    for name, debs in (("base", a), ("feelpp", b))]
+                for client in clients:
+                    client.start()
+                for client in clients:
+                    client.join(30)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        assert {r["state"] for r in results.values()} == {"done"}
+        assert results["base"]["batch"] == results["feelpp"]["batch"]
+        assert "Mock publish completed for base (noble/stable)" in results["feelpp"]["output"]
+        assert "Mock publish completed for feelpp (noble/stable)" in results["base"]["output"]
+
+def test_failed_batch_reports_each_request_outcome():
+    """Test that one failing target only fails its own requests, with manifest and per-target publishers."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        good = make_debs(tmpdir_path, "good", "pkg-a")
+        bad = make_debs(tmpdir_path, "bad", "pkg-b")
+        runs = []
+
+        def manifest_runner(cmd):
+            keys = [t.key for t in load_manifest(cmd[cmd.index("--manifest") + 1])]
+            runs.append(keys)
+            return subprocess.CompletedProcess(cmd, 1 if "stable/noble/bad" in keys else 0, "", "")
+
+        def target_runner(cmd):
+            runs.append(cmd)
+            return subprocess.CompletedProcess(cmd, 1 if "bad" in cmd else 0, "", "")
+
+        for runner, command, expected in (
+                (manifest_runner, None, [["stable/noble/good", "stable/noble/bad"],
+                                         ["stable/noble/good"], ["stable/noble/bad"]]),
+                (target_runner, ["feelpp-apt-publish", "publish"],
+                 [["feelpp-apt-publish", "publish", "--component", name, "--distro", "noble",
+                   "--channel", "stable", "--debs", str(debs), "--verbose"]
+                  for name, debs in (("good", good), ("bad", bad))])):
+            runs.clear()
+            coordinator = Coordinator(["--verbose"], workdir=tmpdir_path / "work", command=command,
+                                      runner=runner)
+            requests = [PublishRequest("1", Target("good", debs=str(good))),
+                        PublishRequest("2", Target("bad", debs=str(bad)))]
+            assert coordinator.run_batch(requests) == 1
+            assert runs == expected
+            assert [(r.state, r.returncode) for r in requests] == [("done", 0), ("failed", 1)]
+
+def test_finished_requests_expire_after_keep():
+    """Test that finished requests are forgotten once they are older than keep, pending ones never."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        a = make_debs(tmpdir_path, "a", "pkg-a")
+        coordinator = Coordinator([], workdir=tmpdir_path / "work", keep=60,
+                                  runner=lambda cmd: subprocess.CompletedProcess(cmd, 0, "", ""))
+        old = coordinator.submit(Target("base", debs=str(a)))
+        recent = coordinator.submit(Target("feelpp", debs=str(a)))
+        pending = coordinator.submit(Target("extra", debs=str(a)))
+        coordinator.run_batch([old, recent])
+        old.finished -= 120
+
+        assert coordinator.get(old.id) is None
+        assert coordinator.get(recent.id) is recent
+        assert coordinator.get(pending.id) is pending
+        assert set(coordinator.requests) == {recent.id, pending.id}
@@ -0,0 +1,94 @@
+import json
+import subprocess
+import tempfile
+from pathlib import Path
+
+from db_cache import check, invalidate, published_state, state_key, write_stamp
+from pages_sync import sync_tree
+
+from tests.test_utils import create_mock_deb_package
+
+
+def publish(pages: Path, source: Path, rel: str, content: str) -> None:
+    path = source / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+    sync_tree(source, str(pages), [rel])
+
+def make_pages(tmpdir_path: Path) -> Path:
+    pages = tmpdir_path / "pages.git"
+    subprocess.run(["git", "init", "-q", "--bare", str(pages)], check=True)
+    subprocess.run(["git", "config", "uploadpack.allowFilter", "true"], cwd=pages, check=True)
+    return pages
+
+
+def test_published_state_tracks_release_files():
+    """Test that the key covers every Release file and nothing else."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        pages = make_pages(tmpdir_path)
+        source = tmpdir_path / "public"
+        assert published_state(str(pages)) == {}
+
+        publish(pages, source, "stable/dists/noble/Release", "Codename: noble\n")
+        publish(pages, source, "testing/dists/jammy/Release", "Codename: jammy\n")
+        state = published_state(str(pages))
+        assert set(state) == {"stable/dists/noble/Release", "testing/dists/jammy/Release"}
+        assert set(published_state(str(pages), channels=["stable"])) == {"stable/dists/noble/Release"}
+
+        key = state_key(state)
+        publish(pages, source, "stable/pool/base/m/mmg/mmg_1.0_amd64.deb", "deb")
+        assert state_key(published_state(str(pages))) == key
+        publish(pages, source, "stable/dists/noble/Release", "Codename: noble\nVersion: 2\n")
+        assert state_key(published_state(str(pages))) != key
+
+def test_check_and_invalidate():
+    """Test that only a root stamped with the current state is reused."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir) / "aptly"
+        state = {"stable/dists/noble/Release": "a" * 40}
+        assert check(root, state) == (False, ["no aptly database"])
+
+        (root / "db").mkdir(parents=True)
+        (root / "pool").mkdir()
+        assert check(root, state) == (False, ["no published-state stamp"])
+
+        write_stamp(root, state)
+        assert check(root, state) == (True, [])
+        valid, reasons = check(root, {"stable/dists/noble/Release": "b" * 40})
+        assert not valid and reasons == ["stable/dists/noble/Release changed"]
+
+        invalidate(root)
+        assert not (root / "db").exists() and (root / "pool").exists()
+
+def test_mock_publish_recovers_only_on_mismatch():
+    """Test that the mock publish skips recovery when the aptly root is current."""
+    script_path = Path(__file__).parent.parent / "scripts" / "aptly_publish.py"
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        pages = make_pages(tmpdir_path)
+        publish(pages, tmpdir_path / "public", "stable/dists/noble/Release", "Codename: noble\n")
+        debs = tmpdir_path / "debs"
+        debs.mkdir()
+        create_mock_deb_package(debs, "pkg-a", "1.0.0")
+        report = tmpdir_path / "report.json"
+
+        def run():
+            result = subprocess.run([
+                "python3", str(script_path),
+                "--component", "base",
+                "--debs", str(debs),
+                "--pages-repo", str(pages),
+                "--aptly-root", str(tmpdir_path / "aptly"),
+                "--db-cache",
+                "--report", str(report),
+            ], capture_output=True, text=True)
+            assert result.returncode == 0, result.stderr
+            return [p["name"] for p in json.loads(report.read_text())["phases"]]
+
+        assert "recover" in run()
+        assert "recover" not in run()
+
+        publish(pages, tmpdir_path / "public", "stable/dists/noble/Release", "Codename: noble\nVersion: 2\n")
+        assert "recover" in run()
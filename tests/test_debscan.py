@@ -0,0 +1,115 @@
+import hashlib
+import subprocess
+import tempfile
+from pathlib import Path
+
+import pytest
+from debscan import (
+    DebFormatError,
+    data_files,
+    parse_control,
+    read_deb,
+    scan_debs,
+    set_control_field,
+)
+
+from tests.test_utils import create_mock_deb_package
+
+
+def test_read_deb_metadata():
+    """Test that a real package yields its control fields and file digest."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        deb = create_mock_deb_package(Path(tmpdir), "scan-me", "2.1.0")
+
+        info = read_deb(deb)
+
+        assert info.name == "scan-me"
+        assert info.version == "2.1.0"
+        assert info.architecture == "amd64"
+        assert info.size == deb.stat().st_size
+        assert info.sha256 == hashlib.sha256(deb.read_bytes()).hexdigest()
+        assert info.control["Section"] == "utils"
+        assert info.filename == deb.name
+
+def test_scan_debs_parallel_keeps_path_order():
+    """Test that a pooled scan returns one record per package, sorted by path."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        for name in ("pkg-c", "pkg-a", "pkg-b"):
+            create_mock_deb_package(tmpdir_path, name, "1.0.0")
+
+        records = scan_debs(tmpdir_path.glob("*.deb"), jobs=2)
+
+        assert [r.name for r in records] == ["pkg-a", "pkg-b", "pkg-c"]
+
+def test_scan_debs_rejects_non_packages():
+    """Test strict and lenient handling of files that are not .deb archives."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        create_mock_deb_package(tmpdir_path, "good", "1.0.0")
+        bogus = tmpdir_path / "bogus_1.0_amd64.deb"
+        bogus.write_text("mock deb content")
+
+        with pytest.raises(DebFormatError, match="ar archive magic"):
+            scan_debs([bogus], jobs=1)
+
+        records = scan_debs(tmpdir_path.glob("*.deb"), jobs=1, strict=False)
+        assert [r.name for r in records] == ["good"]
+
+def test_parse_control_continuation_lines():
+    """Test that multi-line fields keep their continuation lines."""
+    fields = parse_control("Package: foo\nDescription: short\n long text\n .\n more\n")
+
+    assert fields["Package"] == "foo"
+    assert fields["Description"] == "short\n long text\n .\n more"
+
+@pytest.mark.parametrize("compression", ["xz", "gzip", "zstd"])
+def test_data_files_streams_member_and_keeps_dot_files(compression):
+    """Test that data.tar listing works for each compressor and keeps leading dots in names."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        root = tmpdir_path / "pkg"
+        (root / "DEBIAN").mkdir(parents=True)
+        (root / "DEBIAN" / "control").write_text(
+            "Package: dots\nVersion: 1.0\nArchitecture: all\n"
+            "Maintainer: Test <test@example.com>\nDescription: dot files\n")
+        (root / "etc" / "skel").mkdir(parents=True)
+        (root / "etc" / "skel" / ".profile").write_text("umask 022\n")
+        (root / ".hidden").write_text("x\n")
+        deb = tmpdir_path / "dots_1.0_all.deb"
+        subprocess.run(["dpkg-deb", f"-Z{compression}", "--build", str(root), str(deb)],
+                       capture_output=True, check=True)
+
+        assert sorted(data_files(deb)) == [".hidden", "etc/skel/.profile"]
+
+@pytest.mark.parametrize("compression", ["xz", "gzip", "zstd", "none"])
+def test_set_control_field_rebuilds_only_the_control_member(compression):
+    """Test that a rewritten Version is what dpkg reads, in each compression, with the data untouched."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        root = tmpdir_path / "pkg"
+        (root / "DEBIAN").mkdir(parents=True)
+        (root / "DEBIAN" / "control").write_text(
+            "Package: bump\nVersion: 1.0\nArchitecture: all\n"
+            "Maintainer: Test <test@example.com>\nDescription: bumped\n long text\n")
+        (root / "usr" / "share" / "bump").mkdir(parents=True)
+        (root / "usr" / "share" / "bump" / "payload").write_bytes(b"x" * 5001)
+        deb = tmpdir_path / "bump_1.0_all.deb"
+        subprocess.run(["dpkg-deb", f"-Z{compression}", "--build", str(root), str(deb)],
+                       capture_output=True, check=True)
+
+        bumped = set_control_field(deb, tmpdir_path / "bump_1.0-1_all.deb", "Version", "1.0-1")
+
+        fields = subprocess.run(["dpkg-deb", "--field", str(bumped)], capture_output=True, text=True,
+                                check=True).stdout
+        assert parse_control(fields) == dict(parse_control((root / "DEBIAN" / "control").read_text()),
+                                             Version="1.0-1")
+        contents = subprocess.run(["dpkg-deb", "--fsys-tarfile", str(bumped)], capture_output=True,
+                                  check=True).stdout
+        assert contents == subprocess.run(["dpkg-deb", "--fsys-tarfile", str(deb)], capture_output=True,
+                                          check=True).stdout
+        assert read_deb(bumped).version == "1.0-1"
+
+        with pytest.raises(DebFormatError):
+            set_control_field(deb, tmpdir_path / "bad.deb", "Homepage", "https://example.com")
+        assert not (tmpdir_path / "bad.deb").exists()
@@ -0,0 +1,146 @@
+import gzip
+import hashlib
+import lzma
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+from debscan import scan_debs
+from indexes import (
+    IndexWriteError,
+    link_by_hash,
+    merge_packages,
+    packages_stanza,
+    parse_packages,
+    pool_path,
+    render_packages,
+    write_indexes,
+)
+from release import parse_release, patch_release
+
+from tests.test_utils import create_mock_deb_package
+
+
+def test_packages_index_roundtrip():
+    """Test stanza rendering, pool paths and replacement of re-added packages."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        create_mock_deb_package(tmpdir_path, "libfoo", "1.0.0")
+        create_mock_deb_package(tmpdir_path, "mmg", "1.0.0")
+        packages = scan_debs(tmpdir_path.glob("*.deb"), jobs=1)
+
+        stanzas = [packages_stanza(pkg, pool_path("base", pkg)) for pkg in packages]
+        assert [s["Filename"] for s in stanzas] == [
+            "pool/base/libf/libfoo/libfoo_1.0.0_amd64.deb", "pool/base/m/mmg/mmg_1.0.0_amd64.deb"]
+
+        parsed = parse_packages(render_packages(stanzas).decode())
+        assert parsed == stanzas
+        rebuilt = dict(stanzas[1], SHA256="0" * 64)
+        merged = merge_packages(parsed, [rebuilt])
+        assert len(merged) == 2 and rebuilt in merged
+
+def test_write_indexes_compresses_and_skips_unchanged():
+    """Test parallel compression, skipping unchanged indexes and dropping stale variants."""
+    if not shutil.which("zstd"):
+        pytest.skip("zstd not available")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        dists = Path(tmpdir) / "dists" / "noble"
+        indexes = {
+            "base/binary-amd64/Packages": b"Package: a\nVersion: 1\n\n" * 100,
+            "base/binary-arm64/Packages": b"Package: b\nVersion: 1\n\n" * 100,
+        }
+
+        first = write_indexes(dists, indexes, ["gz", "xz", "zst"], jobs=2)
+        assert first.written == sorted(indexes) and not first.skipped
+        amd64 = dists / "base/binary-amd64/Packages"
+        assert amd64.read_bytes() == indexes["base/binary-amd64/Packages"]
+        assert gzip.decompress((dists / "base/binary-amd64/Packages.gz").read_bytes()) == amd64.read_bytes()
+        assert lzma.decompress((dists / "base/binary-amd64/Packages.xz").read_bytes()) == amd64.read_bytes()
+        zst = subprocess.run(["zstd", "-dc", str(amd64) + ".zst"], capture_output=True, check=True)
+        assert zst.stdout == amd64.read_bytes()
+        assert len(first.files) == 8
+
+        indexes["base/binary-arm64/Packages"] += b"Package: c\nVersion: 1\n\n"
+        mtime = amd64.with_suffix(".xz").stat().st_mtime_ns
+        second = write_indexes(dists, indexes, ["gz", "xz"], jobs=2)
+        assert second.written == ["base/binary-arm64/Packages"]
+        assert second.skipped == ["base/binary-amd64/Packages"]
+        assert amd64.with_suffix(".xz").stat().st_mtime_ns == mtime
+        assert not list(dists.rglob("*.zst"))
+
+def test_failing_compressor_raises_index_write_error(monkeypatch):
+    """Test that a compressor exiting non-zero surfaces as IndexWriteError and leaves no temp file."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        fake_bin = tmpdir_path / "bin"
+        fake_bin.mkdir()
+        fake_xz = fake_bin / "xz"
+        fake_xz.write_text("#!/bin/sh\necho 'out of memory' >&2\nexit 1\n")
+        fake_xz.chmod(0o755)
+        monkeypatch.setenv("PATH", f"{fake_bin}:{os.environ['PATH']}")
+        dists = tmpdir_path / "dists" / "noble"
+
+        with pytest.raises(IndexWriteError, match="xz failed .*out of memory"):
+            write_indexes(dists, {"base/binary-amd64/Packages": b"Package: a\n\n"}, ["xz"], jobs=1)
+        assert not list(dists.rglob("*.tmp"))
+
+def test_by_hash_keeps_superseded_indexes_for_a_window():
+    """Test by-hash links, the grace window for old digests and Acquire-By-Hash in Release."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        dists = Path(tmpdir)
+        amd64, arm64 = "main/binary-amd64/Packages", "main/binary-arm64/Packages"
+        (dists / "Release").write_text("Codename: noble\nDate: old\nSHA256:\n")
+        first = write_indexes(dists, {amd64: b"Package: a\n\n", arm64: b"Package: a\n\n"}, ["gz"], by_hash=60)
+        second = write_indexes(dists, {amd64: b"Package: b\n\n"}, ["gz"], by_hash=60)
+
+        by_hash = dists / "main/binary-amd64/by-hash/SHA256"
+        old = {sha for name, (_, sha) in first.files.items() if name.startswith("main/binary-amd64")}
+        new = {sha for name, (_, sha) in second.files.items()}
+        assert {p.name for p in by_hash.iterdir()} == old | new
+        assert (by_hash / hashlib.sha256(b"Package: b\n\n").hexdigest()).read_bytes() == b"Package: b\n\n"
+        assert (by_hash / hashlib.sha256(b"Package: a\n\n").hexdigest()).read_bytes() == b"Package: a\n\n"
+
+        # Past the window only the current digests remain; the untouched arm64 index keeps its own
+        link_by_hash(dists, second.files, 60, now=time.time() + 61)
+        assert {p.name for p in by_hash.iterdir()} == new
+        assert len(list((dists / "main/binary-arm64/by-hash/SHA256").iterdir())) == 2
+
+        patch_release(dists, second.files, fields={"Acquire-By-Hash": "yes"})
+        release = parse_release((dists / "Release").read_text())
+        assert [key for key, _ in release][:4] == ["Codename", "Date", "Acquire-By-Hash", "SHA256"]
+        assert len(dict(release)["SHA256"]) == 2
+
+def test_mock_publish_writes_indexes():
+    """Test that the mock publish merges new packages into the on-disk indexes."""
+    script_path = Path(__file__).parent.parent / "scripts" / "aptly_publish.py"
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        aptly_root = tmpdir_path / "aptly"
+
+        def publish(name):
+            debs = tmpdir_path / name
+            debs.mkdir()
+            create_mock_deb_package(debs, name, "1.0.0")
+            result = subprocess.run([
+                "python3", str(script_path),
+                "--component", "base",
+                "--debs", str(debs),
+                "--pages-repo", "https://example.com/repo.git",
+                "--aptly-root", str(aptly_root),
+                "--contents",
+            ], capture_output=True, text=True)
+            assert result.returncode == 0, result.stderr
+
+        publish("pkg-a")
+        publish("pkg-b")
+
+        dists = aptly_root / "public" / "stable" / "dists" / "noble" / "base"
+        packages = parse_packages(lzma.decompress((dists / "binary-amd64" / "Packages.xz").read_bytes()).decode())
+        assert [p["Package"] for p in packages] == ["pkg-a", "pkg-b"]
+        contents = gzip.decompress((dists / "Contents-amd64.gz").read_bytes()).decode()
+        assert "usr/bin/pkg-a" in contents and "utils/pkg-b" in contents
@@ -0,0 +1,95 @@
+import dataclasses
+import json
+import subprocess
+import tempfile
+from pathlib import Path
+
+from debscan import scan_debs
+from ingest_cache import IngestCache, default_manifest_path, stage_packages
+
+from tests.test_utils import create_mock_deb_package
+
+
+def test_default_manifest_path_is_next_to_aptly_root():
+    """Test that the manifest lives beside, not inside, the aptly root."""
+    assert default_manifest_path("/srv/aptly") == Path("/srv/aptly-ingest.json")
+
+def test_partition_and_record_roundtrip():
+    """Test that recorded packages are skipped and rebuilt ones are not."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        debs = tmpdir_path / "debs"
+        debs.mkdir()
+        create_mock_deb_package(debs, "pkg-a", "1.0.0")
+        create_mock_deb_package(debs, "pkg-b", "1.0.0")
+        packages = scan_debs(debs.glob("*.deb"), jobs=1)
+
+        cache = IngestCache.load(tmpdir_path / "ingest.json")
+        new, unchanged = cache.partition("stable/noble/base", packages)
+        assert len(new) == 2 and not unchanged
+
+        cache.record("stable/noble/base", packages)
+        cache.save()
+
+        reloaded = IngestCache.load(tmpdir_path / "ingest.json")
+        new, unchanged = reloaded.partition("stable/noble/base", packages)
+        assert not new and len(unchanged) == 2
+
+        # Other targets are tracked independently
+        new, _ = reloaded.partition("testing/noble/base", packages)
+        assert len(new) == 2
+
+        # Rebuilding the same name/version with different content replaces the entry
+        rebuilt = dataclasses.replace(packages[0], sha256="0" * 64)
+        reloaded.record("stable/noble/base", [rebuilt])
+        entries = reloaded.targets["stable/noble/base"]
+        assert "0" * 64 in entries
+        assert packages[0].sha256 not in entries
+
+def test_load_ignores_corrupt_manifest():
+    """Test that a corrupt manifest degrades to an empty cache."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        manifest = Path(tmpdir) / "ingest.json"
+        manifest.write_text("{not json")
+
+        assert IngestCache.load(manifest).targets == {}
+
+def test_stage_packages_links_files():
+    """Test that staged packages share the original content."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        deb = create_mock_deb_package(tmpdir_path, "pkg-a", "1.0.0")
+        packages = scan_debs([deb], jobs=1)
+
+        staged = stage_packages(packages, tmpdir_path / "stage")
+
+        assert [p.name for p in staged] == [deb.name]
+        assert staged[0].read_bytes() == deb.read_bytes()
+
+def test_mock_publish_skips_ingested_packages():
+    """Test that a second publish with the same debs adds nothing."""
+    script_path = Path(__file__).parent.parent / "scripts" / "aptly_publish.py"
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        debs = tmpdir_path / "debs"
+        debs.mkdir()
+        create_mock_deb_package(debs, "pkg-a", "1.0.0")
+        cmd = [
+            "python3", str(script_path),
+            "--component", "base",
+            "--debs", str(debs),
+            "--pages-repo", "https://example.com/repo.git",
+            "--aptly-root", str(tmpdir_path / "aptly"),
+        ]
+
+        first = subprocess.run(cmd, capture_output=True, text=True)
+        assert first.returncode == 0
+        assert "Ingest cache: 1 new or changed, 0 unchanged" in first.stderr
+
+        manifest = json.loads((tmpdir_path / "aptly-ingest.json").read_text())
+        assert list(manifest["targets"]) == ["stable/noble/base"]
+
+        second = subprocess.run(cmd, capture_output=True, text=True)
+        assert second.returncode == 0
+        assert "Ingest cache: 0 new or changed, 1 unchanged" in second.stderr
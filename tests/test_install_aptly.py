@@ -0,0 +1,129 @@
+import hashlib
+import io
+import tempfile
+import threading
+import zipfile
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+from install_aptly import InstallError, archive_name, install
+
+FAKE_BINARY = b"#!/bin/sh\necho 'aptly version: 1.6.2'\n"
+
+
+def make_release_zip(version="1.6.2", os_name="linux", arch="amd64") -> bytes:
+    """Build a zip laid out like an aptly release archive."""
+    buf = io.BytesIO()
+    prefix = f"aptly_{version}_{os_name}_{arch}"
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(f"{prefix}/aptly", FAKE_BINARY)
+        zf.writestr(f"{prefix}/man/aptly.1", "man page " * 1000)
+        zf.writestr(f"{prefix}/LICENSE", "MIT")
+    return buf.getvalue()
+
+@contextmanager
+def serve(files):
+    """Serve {url path: bytes} over local HTTP with Range support."""
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests_seen.append((self.path, self.headers.get("Range")))
+            data = files.get(self.path)
+            if data is None:
+                self.send_error(404)
+                return
+            start = 0
+            if self.headers.get("Range"):
+                start = int(self.headers["Range"].split("=")[1].rstrip("-"))
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Length", str(len(data) - start))
+            self.end_headers()
+            self.wfile.write(data[start:])
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}", requests_seen
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_install_from_local_http_mirror():
+    """Test a verified install from a local HTTP mirror."""
+    archive = make_release_zip()
+    with tempfile.TemporaryDirectory() as tmpdir, \
+            serve({"/v1.6.2/aptly_1.6.2_linux_amd64.zip": archive}) as (base_url, _):
+        binary = install("1.6.2", "linux", "amd64", Path(tmpdir) / "bin", base_url=base_url,
+                         sha256=hashlib.sha256(archive).hexdigest())
+
+        assert binary == Path(tmpdir) / "bin" / "aptly"
+        assert binary.read_bytes() == FAKE_BINARY
+        assert binary.stat().st_mode & 0o111
+        assert sorted(p.name for p in binary.parent.iterdir()) == ["aptly"]
+
+def test_install_resumes_partial_download():
+    """Test that an existing .part file is completed with a Range request."""
+    archive = make_release_zip()
+    with tempfile.TemporaryDirectory() as tmpdir, \
+            serve({"/v1.6.2/aptly_1.6.2_linux_amd64.zip": archive}) as (base_url, seen):
+        download_dir = Path(tmpdir) / "dl"
+        download_dir.mkdir()
+        half = len(archive) // 2
+        (download_dir / "aptly_1.6.2_linux_amd64.zip.part").write_bytes(archive[:half])
+
+        binary = install("1.6.2", "linux", "amd64", Path(tmpdir) / "bin", base_url=base_url,
+                         sha256=hashlib.sha256(archive).hexdigest(), download_dir=download_dir)
+
+        assert binary.read_bytes() == FAKE_BINARY
+        assert seen == [("/v1.6.2/aptly_1.6.2_linux_amd64.zip", f"bytes={half}-")]
+        assert not list(download_dir.iterdir())
+
+def test_install_rejects_checksum_mismatch():
+    """Test that a tampered archive is not installed."""
+    with tempfile.TemporaryDirectory() as tmpdir, \
+            serve({"/v1.6.2/aptly_1.6.2_linux_amd64.zip": make_release_zip()}) as (base_url, _):
+        with pytest.raises(InstallError, match="SHA256 mismatch"):
+            install("1.6.2", "linux", "amd64", Path(tmpdir) / "bin", base_url=base_url,
+                    sha256="0" * 64)
+
+        assert not (Path(tmpdir) / "bin" / "aptly").exists()
+
+def test_install_from_file_mirror():
+    """Test that file:// mirrors are read in place, and missing releases fail."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        mirror = Path(tmpdir) / "mirror" / "v1.6.2"
+        mirror.mkdir(parents=True)
+        (mirror / archive_name("1.6.2", "linux", "arm64")).write_bytes(make_release_zip(arch="arm64"))
+
+        binary = install("1.6.2", "linux", "aarch64", Path(tmpdir) / "bin",
+                         base_url=(Path(tmpdir) / "mirror").as_uri())
+        assert binary.read_bytes() == FAKE_BINARY
+
+        with pytest.raises(InstallError, match="Archive not found"):
+            install("999.999.999", "linux", "amd64", Path(tmpdir) / "bin",
+                    base_url=(Path(tmpdir) / "mirror").as_uri())
+
+def test_install_requires_a_known_checksum():
+    """Test that unpinned archives fail closed, and that a given digest installs them."""
+    archive = make_release_zip(version="0.0.1")
+    with tempfile.TemporaryDirectory() as tmpdir, \
+            serve({"/v0.0.1/aptly_0.0.1_linux_amd64.zip": archive}) as (base_url, _):
+        with pytest.raises(InstallError, match="No pinned SHA256 .* --sha256"):
+            install("0.0.1", "linux", "amd64", Path(tmpdir) / "bin", base_url=base_url,
+                    sha256="", require_checksum=True)
+        assert not (Path(tmpdir) / "bin" / "aptly").exists()
+
+        binary = install("0.0.1", "linux", "amd64", Path(tmpdir) / "bin", base_url=base_url,
+                         sha256=hashlib.sha256(archive).hexdigest(), require_checksum=True)
+        assert binary.read_bytes() == FAKE_BINARY
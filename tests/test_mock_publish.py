@@ -1,9 +1,19 @@
+import hashlib
 import pytest
+import shutil
 import subprocess
 import os
 import tempfile
 from pathlib import Path
 
+from aptly_publish import PublishConfig, PublishError, publish
+from benchmark import build_deb
+from debscan import data_files, read_deb
+from indexes import parse_packages
+from release import parse_release
+from tests.conftest import PASSPHRASE, generate_key
+from tests.test_utils import create_mock_deb_package
+
 def test_mock_aptly_publish_script():
     """Test that the mock aptly_publish.py script works correctly."""
     script_path = Path(__file__).parent.parent / "scripts" / "aptly_publish.py"
@@ -12,9 +22,8 @@ def test_mock_aptly_publish_script():
     with tempfile.TemporaryDirectory() as tmpdir:
         tmpdir_path = Path(tmpdir)
         
-        # Create a mock .deb file
-        mock_deb = tmpdir_path / "test-package_1.0.0_amd64.deb"
-        mock_deb.write_text("mock deb content")
+        # Create a mock .deb package
+        create_mock_deb_package(tmpdir_path, "test-package", "1.0.0")
         
         # Test the script with minimal args
         result = subprocess.run([
@@ -36,8 +45,7 @@ def test_mock_aptly_publish_with_signing():
     
     with tempfile.TemporaryDirectory() as tmpdir:
         tmpdir_path = Path(tmpdir)
-        mock_deb = tmpdir_path / "test-package_1.0.0_amd64.deb"
-        mock_deb.write_text("mock deb content")
+        create_mock_deb_package(tmpdir_path, "test-package", "1.0.0")
         
         # Test with signing
         result = subprocess.run([
@@ -87,4 +95,163 @@ def test_mock_aptly_publish_missing_keyid():
         ], capture_output=True, text=True)
         
         assert result.returncode == 1
-        assert "GPG key ID required for signing" in result.stderr
\ No newline at end of file
+        assert "GPG key ID required for signing" in result.stderr
+
+def test_mock_aptly_publish_rejects_invalid_debs():
+    """Test that preflight stops the publish on files that are not valid packages."""
+    script_path = Path(__file__).parent.parent / "scripts" / "aptly_publish.py"
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        create_mock_deb_package(tmpdir_path, "test-package", "1.0.0")
+        (tmpdir_path / "mock-package_1.0.0_amd64.deb").write_text("mock deb content")
+        cmd = [
+            "python3", str(script_path),
+            "--component", "test-component",
+            "--debs", str(tmpdir_path),
+            "--pages-repo", "https://example.com/repo.git",
+        ]
+
+        rejected = subprocess.run(cmd, capture_output=True, text=True)
+        allowed = subprocess.run(cmd + ["--allow-invalid"], capture_output=True, text=True)
+
+        assert rejected.returncode == 1
+        assert "mock-package_1.0.0_amd64.deb: Missing ar archive magic" in rejected.stderr
+        assert "Preflight failed for 1 of 2 .deb files" in rejected.stderr
+        assert allowed.returncode == 0
+        assert "Preflight passed for 1 packages" in allowed.stderr
+
+def test_publish_api_in_process():
+    """Test the typed publish() API without spawning an interpreter."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        debs = tmpdir_path / "debs"
+        debs.mkdir()
+        create_mock_deb_package(debs, "pkg-a", "1.0.0")
+        (debs / "broken_1.0_amd64.deb").write_text("mock deb content")
+        config = PublishConfig.single("base", debs, "https://github.com/feelpp/apt.git",
+                                      channel="testing", aptly_root=str(tmpdir_path / "aptly"),
+                                      allow_invalid=True)
+
+        first = publish(config)
+        second = publish(config)
+
+        assert first.published and [p.name for p in first.added] == ["pkg-a"]
+        assert first.invalid == [str(debs / "broken_1.0_amd64.deb")]
+        assert first.urls == {"testing/noble/base": "https://feelpp.github.io/apt/testing/dists/noble/"}
+        assert "preflight" in [p["name"] for p in first.report["phases"]] and first.seconds > 0
+        assert not second.published and [p.name for p in second.skipped] == ["pkg-a"]
+
+def test_publish_api_errors():
+    """Test that configuration problems raise PublishError instead of exiting."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with pytest.raises(PublishError, match="GPG key ID required"):
+            publish(PublishConfig.single("base", tmpdir, "repo", sign=True))
+        with pytest.raises(PublishError, match="No .deb files found"):
+            publish(PublishConfig.single("base", tmpdir, "repo"))
+
+@pytest.mark.skipif(shutil.which("gpg") is None, reason="gpg not installed")
+def test_publish_writes_signed_tree_and_commits_it(gnupghome):
+    """Test that the mock lays out pool and dists with a verifiable Release and pushes them."""
+    keyid = generate_key(gnupghome)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        debs = tmpdir_path / "debs"
+        debs.mkdir()
+        create_mock_deb_package(debs, "pkg-a", "1.0.0")
+        pages = tmpdir_path / "pages.git"
+        subprocess.run(["git", "init", "-q", "--bare", str(pages)], check=True)
+        aptly_root = tmpdir_path / "aptly"
+
+        result = publish(PublishConfig.single("base", debs, str(pages), aptly_root=str(aptly_root), sign=True,
+                                              keyid=keyid, passphrase=PASSPHRASE, gnupghome=str(gnupghome)))
+
+        channel = aptly_root / "public" / "stable"
+        dists = channel / "dists" / "noble"
+        deb = channel / "pool/base/p/pkg-a/pkg-a_1.0.0_amd64.deb"
+        assert deb.read_bytes() == (debs / "pkg-a_1.0.0_amd64.deb").read_bytes()
+        release = dict(parse_release((dists / "Release").read_text()))
+        assert release["Suite"] == ["noble"] and release["Components"] == ["base"]
+        assert release["Architectures"] == ["amd64"]
+        listed = {line.split()[2]: line.split()[:2] for line in release["SHA256"]}
+        assert set(listed) == {"base/binary-amd64/Packages", "base/binary-amd64/Packages.gz",
+                               "base/binary-amd64/Packages.xz"}
+        for rel, (digest, size) in listed.items():
+            data = (dists / rel).read_bytes()
+            assert [hashlib.sha256(data).hexdigest(), str(len(data))] == [digest, size]
+        packages = (dists / "base/binary-amd64/Packages").read_text()
+        assert "Filename: pool/base/p/pkg-a/pkg-a_1.0.0_amd64.deb" in packages
+        env = {**os.environ, "GNUPGHOME": str(gnupghome)}
+        subprocess.run(["gpg", "--batch", "--verify", str(dists / "InRelease")], env=env, check=True,
+                       capture_output=True)
+        subprocess.run(["gpg", "--batch", "--verify", str(dists / "Release.gpg"), str(dists / "Release")],
+                       env=env, check=True, capture_output=True)
+
+        assert result.sync.changed and result.releases == [str(dists / "Release")]
+        tree = subprocess.run(["git", "--git-dir", str(pages), "ls-tree", "-r", "--name-only", "gh-pages"],
+                              check=True, capture_output=True, text=True).stdout.split()
+        assert {"stable/dists/noble/InRelease", "stable/pool/base/p/pkg-a/pkg-a_1.0.0_amd64.deb",
+                "stable/refs.json"} <= set(tree)
+
+def test_publish_from_fresh_roots_keeps_other_components():
+    """Test that publishing a second component from a fresh aptly root keeps the first one published."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        pages = tmpdir_path / "pages.git"
+        subprocess.run(["git", "init", "-q", "--bare", str(pages)], check=True)
+        subprocess.run(["git", "config", "uploadpack.allowFilter", "true"], cwd=pages, check=True)
+        for component, name in (("base", "mmg"), ("feelpp", "feelpp-tools")):
+            create_mock_deb_package(tmpdir_path / component, name, "1.0.0")
+            publish(PublishConfig.single(component, tmpdir_path / component, str(pages),
+                                         aptly_root=str(tmpdir_path / f"aptly-{component}")))
+
+        def show(rel):
+            return subprocess.run(["git", "--git-dir", str(pages), "show", f"gh-pages:{rel}"],
+                                  check=True, capture_output=True).stdout
+
+        tree = subprocess.run(["git", "--git-dir", str(pages), "ls-tree", "-r", "--name-only", "gh-pages"],
+                              check=True, capture_output=True, text=True).stdout.split()
+        for component, name in (("base", "mmg"), ("feelpp", "feelpp-tools")):
+            assert f"stable/pool/{component}/{name[0]}/{name}/{name}_1.0.0_amd64.deb" in tree
+            for suffix in ("", ".gz", ".xz"):
+                assert f"stable/dists/noble/{component}/binary-amd64/Packages{suffix}" in tree
+        release = dict(parse_release(show("stable/dists/noble/Release").decode()))
+        assert release["Components"] == ["base feelpp"]
+        listed = {line.split()[2]: line.split()[:2] for line in release["SHA256"]}
+        assert len(listed) == 6
+        for rel, (digest, size) in listed.items():
+            data = show(f"stable/dists/noble/{rel}")
+            assert [hashlib.sha256(data).hexdigest(), str(len(data))] == [digest, size]
+        assert b"mmg" in show("stable/refs.json") and b"feelpp-tools" in show("stable/refs.json")
+
+def test_auto_bump_publishes_conflicting_build_next_to_the_original():
+    """Test that a rebuilt version is republished as the bumped revision and both builds stay served."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        aptly_root = tmpdir_path / "aptly"
+        public = aptly_root / "public"
+        for build, size in (("first", 1024), ("rebuild", 2048)):
+            (tmpdir_path / build).mkdir()
+            build_deb(tmpdir_path / build, "mmg", "5.7.0", payload_size=size)
+        publish(PublishConfig.single("base", tmpdir_path / "first", "repo", aptly_root=str(aptly_root)))
+
+        result = publish(PublishConfig.single("base", tmpdir_path / "rebuild", "repo",
+                                              aptly_root=str(aptly_root), pages_checkout=str(public),
+                                              auto_bump=True))
+
+        assert [(p.name, p.version) for p in result.added] == [("mmg", "5.7.0-1")]
+        stanzas = parse_packages((public / "stable/dists/noble/base/binary-amd64/Packages").read_text())
+        assert [(s["Version"], s["Filename"]) for s in stanzas] == [
+            ("5.7.0", "pool/base/m/mmg/mmg_5.7.0_amd64.deb"),
+            ("5.7.0-1", "pool/base/m/mmg/mmg_5.7.0-1_amd64.deb")]
+        first, bumped = (public / "stable" / stanza["Filename"] for stanza in stanzas)
+        assert first.read_bytes() == (tmpdir_path / "first" / "mmg_5.7.0_amd64.deb").read_bytes()
+        # The bumped build carries the new Version in its own control data, with the rebuild's payload
+        rebuild = tmpdir_path / "rebuild" / "mmg_5.7.0_amd64.deb"
+        assert read_deb(bumped).control == dict(read_deb(rebuild).control, Version="5.7.0-1")
+        assert data_files(bumped) == data_files(rebuild)
+        for stanza, path in zip(stanzas, (first, bumped)):
+            data = path.read_bytes()
+            assert stanza["Size"] == str(len(data))
+            assert stanza["SHA256"] == hashlib.sha256(data).hexdigest()
+            assert stanza["MD5sum"] == hashlib.md5(data).hexdigest()
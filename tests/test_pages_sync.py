@@ -0,0 +1,84 @@
+import os
+import subprocess
+import tempfile
+from pathlib import Path
+
+from pages_sync import PagesSync, sync_tree, touched_paths
+
+
+def git(*args, cwd=None):
+    return subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True).stdout
+
+def make_bare_repo(path: Path) -> Path:
+    """Create a bare pages repository that serves partial clones, like GitHub."""
+    git("init", "-q", "--bare", str(path))
+    git("config", "uploadpack.allowFilter", "true", cwd=path)
+    return path
+
+def write(root: Path, rel: str, content: str) -> None:
+    path = root / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+def branch_files(repo: Path, branch: str = "gh-pages") -> dict:
+    listing = git("ls-tree", "-r", "--name-only", branch, cwd=repo).split()
+    return {name: git("show", f"{branch}:{name}", cwd=repo) for name in listing}
+
+
+def test_touched_paths():
+    """Test the repository paths derived from a publish target."""
+    assert touched_paths("testing", "noble", ["base", "feelpp"]) == [
+        "testing/dists/noble", "testing/pool/base", "testing/pool/feelpp"]
+
+def test_sync_creates_branch_and_pushes_only_changes():
+    """Test initial publish, an incremental update and a no-op sync."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        pages = make_bare_repo(tmpdir_path / "pages.git")
+        source = tmpdir_path / "public"
+        write(source, "stable/dists/noble/Release", "Codename: noble\n")
+        write(source, "stable/pool/base/m/mmg/mmg_1.0_amd64.deb", "deb v1")
+        paths = touched_paths("stable", "noble", ["base"])
+
+        first = sync_tree(source, str(pages), paths)
+        assert first.changed and first.written == 2 and first.deleted == 0
+        assert set(branch_files(pages)) == {"stable/dists/noble/Release",
+                                            "stable/pool/base/m/mmg/mmg_1.0_amd64.deb"}
+
+        # Files outside the touched paths are preserved untouched
+        other = tmpdir_path / "other"
+        write(other, "testing/dists/jammy/Release", "Codename: jammy\n")
+        sync_tree(other, str(pages), ["testing/dists/jammy"])
+
+        write(source, "stable/dists/noble/Release", "Codename: noble\nVersion: 2\n")
+        os.unlink(source / "stable/pool/base/m/mmg/mmg_1.0_amd64.deb")
+        write(source, "stable/pool/base/m/mmg/mmg_1.1_amd64.deb", "deb v2")
+
+        second = sync_tree(source, str(pages), paths, message="Publish mmg 1.1")
+        assert (second.written, second.deleted) == (2, 1)
+        files = branch_files(pages)
+        assert files["stable/dists/noble/Release"] == "Codename: noble\nVersion: 2\n"
+        assert "stable/pool/base/m/mmg/mmg_1.0_amd64.deb" not in files
+        assert "testing/dists/jammy/Release" in files
+        assert git("log", "-1", "--format=%s", "gh-pages", cwd=pages).strip() == "Publish mmg 1.1"
+        assert len(git("rev-list", "gh-pages", cwd=pages).split()) == 3
+
+        assert not sync_tree(source, str(pages), paths).changed
+
+def test_sync_fetches_no_blobs():
+    """Test that the sync never downloads existing file contents."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        pages = make_bare_repo(tmpdir_path / "pages.git")
+        source = tmpdir_path / "public"
+        write(source, "stable/pool/base/big.deb", "x" * 100000)
+        sync_tree(source, str(pages), ["stable/pool/base"])
+
+        write(source, "stable/dists/noble/Release", "Codename: noble\n")
+        with PagesSync(str(pages), workdir=tmpdir_path / "work") as sync:
+            sync.sync(source, ["stable/dists/noble"], "Add Release")
+            objects = git("cat-file", "--batch-check", "--batch-all-objects",
+                          cwd=tmpdir_path / "work" / "pages.git").split("\n")
+
+        blob_sizes = [int(line.split()[2]) for line in objects if " blob " in line]
+        assert blob_sizes == [len("Codename: noble\n")]
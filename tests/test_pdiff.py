@@ -0,0 +1,71 @@
+import gzip
+import hashlib
+import tempfile
+from pathlib import Path
+
+from indexes import write_indexes
+from pdiff import DiffIndex, apply_ed, ed_diff, update_pdiffs
+
+
+def packages(*versions) -> str:
+    return "".join(f"Package: pkg-{name}\nVersion: {version}\nArchitecture: amd64\n\n"
+                   for name, version in versions)
+
+
+def test_ed_diff_round_trips():
+    """Test that ed scripts rebuild the new index for inserts, deletes and replacements."""
+    base = packages(("a", "1"), ("b", "1"), ("c", "1"), ("d", "1"))
+    revisions = [
+        "",
+        packages(("0", "1"), ("a", "1"), ("b", "1"), ("c", "1"), ("d", "1")),
+        packages(("a", "1"), ("c", "1"), ("d", "1")),
+        packages(("a", "2"), ("b", "1"), ("c", "1"), ("d", "2"), ("e", "1")),
+        packages(("b", "1")),
+        base,
+    ]
+    for new in revisions:
+        script = ed_diff(base, new)
+        assert apply_ed(base, script) == new
+        assert apply_ed(new, ed_diff(new, base)) == base
+    assert ed_diff(base, base) == ""
+    assert ed_diff(base, packages(("a", "1"), ("b", "1"), ("c", "1"))) == "13,16d\n"
+
+def test_update_pdiffs_keeps_last_revisions():
+    """Test the Index chain, pruning to N patches and reset after an outside rewrite."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        index = Path(tmpdir) / "main/binary-amd64/Packages"
+        index.parent.mkdir(parents=True)
+        revisions = [packages(*[(chr(97 + i), "1") for i in range(n)]) for n in range(1, 6)]
+        for n, (old, new) in enumerate(zip(revisions, revisions[1:])):
+            names = update_pdiffs(index, old.encode(), new.encode(), keep=3, now=1700000000 + n)
+        diff_dir = index.with_name("Packages.diff")
+        assert len(names) == 3
+        assert sorted(p.name for p in diff_dir.glob("*.gz")) == [f"{name}.gz" for name in names]
+
+        diff_index = DiffIndex.parse((diff_dir / "Index").read_text())
+        assert diff_index.current == (hashlib.sha256(revisions[-1].encode()).hexdigest(),
+                                      len(revisions[-1]))
+        # A client holding the oldest listed revision patches its way to the current one
+        text = revisions[1]
+        assert diff_index.history[names[0]][0] == hashlib.sha256(text.encode()).hexdigest()
+        for name in names:
+            compressed = (diff_dir / f"{name}.gz").read_bytes()
+            assert diff_index.download[name][0] == hashlib.sha256(compressed).hexdigest()
+            script = gzip.decompress(compressed)
+            assert diff_index.patches[name] == (hashlib.sha256(script).hexdigest(), len(script))
+            text = apply_ed(text, script.decode())
+        assert text == revisions[-1]
+
+        assert update_pdiffs(index, revisions[0].encode(), revisions[2].encode(), keep=3) != names
+        assert len(list(diff_dir.glob("*.gz"))) == 1
+
+def test_write_indexes_adds_pdiff_index():
+    """Test that rewritten Packages get a pdiff listed with the index files."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        dists = Path(tmpdir)
+        rel = "main/binary-amd64/Packages"
+        first = write_indexes(dists, {rel: packages(("a", "1")).encode()}, ["gz"], pdiffs=5)
+        assert set(first.files) == {rel, f"{rel}.gz"}
+        second = write_indexes(dists, {rel: packages(("a", "1"), ("b", "1")).encode()}, ["gz"], pdiffs=5)
+        assert set(second.files) == {rel, f"{rel}.gz", f"{rel}.diff/Index"}
+        assert len(list((dists / f"{rel}.diff").glob("*.gz"))) == 1
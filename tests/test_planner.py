@@ -0,0 +1,123 @@
+import gzip
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+from batch import Target
+from benchmark import build_deb
+from indexes import packages_stanza, pool_path, render_packages
+from pages_sync import PagesSync, sync_tree
+from planner import plan_target, published_from_checkout, published_from_repo
+from preflight import preflight
+
+from tests.test_utils import create_mock_deb_package
+
+
+def publish_index(root: Path, packages, gz_only: bool = False) -> str:
+    """Write a published Packages index for stable/noble/base; returns its path."""
+    rel = "stable/dists/noble/base/binary-amd64/Packages"
+    path = root / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    content = render_packages(packages_stanza(pkg, pool_path("base", pkg)) for pkg in packages)
+    if gz_only:
+        rel += ".gz"
+        (root / rel).write_bytes(gzip.compress(content))
+    else:
+        path.write_bytes(content)
+    return rel
+
+
+def test_plan_classifies_local_packages():
+    """Test new, upgrade, identical and conflict classification from a checkout."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        old, local = tmpdir_path / "old", tmpdir_path / "local"
+        old.mkdir()
+        local.mkdir()
+        for name in ("pkg-a", "pkg-b", "pkg-c"):
+            create_mock_deb_package(old, name, "1.0.0")
+        create_mock_deb_package(old, "pkg-e", "1.0.0-2")
+        publish_index(tmpdir_path / "pages", preflight(old.glob("*.deb")).packages, gz_only=True)
+
+        shutil.copy(old / "pkg-a_1.0.0_amd64.deb", local)
+        create_mock_deb_package(local, "pkg-b", "1.1.0")
+        build_deb(local, "pkg-c", "1.0.0")
+        create_mock_deb_package(local, "pkg-d", "1.0.0")
+        create_mock_deb_package(local, "pkg-e", "1.0.0~rc1")
+
+        target = Target("base", "noble", "stable", str(local))
+        published = published_from_checkout(tmpdir_path / "pages", target)
+        assert set(published) == {(name, "amd64") for name in ("pkg-a", "pkg-b", "pkg-c", "pkg-e")}
+        plan = plan_target(target, preflight(local.glob("*.deb")).packages, published)
+
+        assert [(e.name, e.action) for e in plan.entries] == [
+            ("pkg-a", "identical"), ("pkg-b", "upgrade"), ("pkg-c", "conflict"), ("pkg-d", "new"),
+            ("pkg-e", "downgrade")]
+        assert plan.of("upgrade")[0].published == ("1.0.0",)
+        assert plan.of("conflict")[0].bump == "1.0.0-1"
+        assert [e.name for e in plan.changes] == ["pkg-b", "pkg-d", "pkg-e"]
+        assert not plan.empty
+        assert plan.to_dict()["counts"] == {"new": 1, "upgrade": 1, "downgrade": 1, "identical": 1,
+                                            "conflict": 1}
+        assert plan_target(target, [], published).empty
+
+def test_published_from_repo_reads_index_blobs():
+    """Test that the published index is read from the pages repository."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        pages = tmpdir_path / "pages.git"
+        subprocess.run(["git", "init", "-q", "--bare", str(pages)], check=True)
+        subprocess.run(["git", "config", "uploadpack.allowFilter", "true"], cwd=pages, check=True)
+        debs = tmpdir_path / "debs"
+        debs.mkdir()
+        create_mock_deb_package(debs, "pkg-a", "1.0.0")
+        packages = preflight(debs.glob("*.deb")).packages
+        rel = publish_index(tmpdir_path / "public", packages)
+        sync_tree(tmpdir_path / "public", str(pages), [rel])
+
+        target = Target("base", "noble", "stable", str(debs))
+        with PagesSync(str(pages)) as sync:
+            assert published_from_repo(sync, None, target) == {}
+            published = published_from_repo(sync, sync.fetch_tip(), target)
+        assert published[("pkg-a", "amd64")]["1.0.0"]["SHA256"] == packages[0].sha256
+        assert plan_target(target, packages, published).empty
+
+def test_mock_publish_dry_run_and_early_exit():
+    """Test that the mock publish plans against the checkout and stops when nothing changed."""
+    script_path = Path(__file__).parent.parent / "scripts" / "aptly_publish.py"
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        debs = tmpdir_path / "debs"
+        debs.mkdir()
+        create_mock_deb_package(debs, "pkg-a", "1.0.0")
+        create_mock_deb_package(debs, "pkg-b", "1.0.0")
+        checkout = tmpdir_path / "pages"
+        publish_index(checkout, [p for p in preflight(debs.glob("*.deb")).packages if p.name == "pkg-a"])
+
+        def run(*extra):
+            return subprocess.run([
+                "python3", str(script_path),
+                "--component", "base",
+                "--debs", str(debs),
+                "--pages-repo", "https://github.com/test/repo.git",
+                "--pages-checkout", str(checkout),
+                *extra,
+            ], capture_output=True, text=True)
+
+        dry = run("--dry-run")
+        assert dry.returncode == 0, dry.stderr
+        assert dry.stdout.splitlines() == ["identical\tpkg-a\t1.0.0\tamd64\tstable/noble/base",
+                                           "new\tpkg-b\t1.0.0\tamd64\tstable/noble/base"]
+        assert "Mock: Adding" not in dry.stderr
+
+        partial = run()
+        assert partial.returncode == 0, partial.stderr
+        assert "Mock: Adding 1 packages to repository" in partial.stderr
+
+        publish_index(checkout, preflight(debs.glob("*.deb")).packages)
+        noop = run()
+        assert noop.returncode == 0, noop.stderr
+        assert noop.stdout.strip() == "Nothing to publish"
+        assert "Mock: Adding" not in noop.stderr
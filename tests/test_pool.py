@@ -0,0 +1,131 @@
+import os
+import subprocess
+import tempfile
+from pathlib import Path
+
+from debscan import scan_debs
+from indexes import parse_packages, pool_path
+from pages_sync import sync_tree
+from pool import ContentStore, default_store, link_file, promote, store_packages
+from release import file_checksums, parse_release
+from retention import REFS_NAME, RefIndex
+
+from tests.test_utils import create_mock_deb_package
+
+SCRIPTS_DIR = Path(__file__).parent.parent / "scripts"
+
+
+def test_store_once_and_link_into_channels():
+    """Test that a package is stored once and every channel pool links to it."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        deb = create_mock_deb_package(tmpdir_path, "mmg", "1.0.0")
+        pkg = scan_debs([deb], jobs=1)[0]
+        store = ContentStore(tmpdir_path / "content")
+
+        entries = store_packages(store, "base", [pkg], pool_path)
+        stored = store.path(pkg.sha256)
+        assert stored.read_bytes() == deb.read_bytes()
+        assert not os.path.samefile(stored, deb)
+
+        public = tmpdir_path / "public"
+        first = store.materialize(entries, public / "testing")
+        second = store.materialize(entries, public / "stable")
+        again = store.materialize(entries, public / "stable")
+
+        assert first.methods == {"hardlink": 1} and second.linked == 1
+        assert (again.linked, again.present) == (0, 1)
+        rel = "pool/base/m/mmg/mmg_1.0.0_amd64.deb"
+        assert os.path.samefile(public / "testing" / rel, public / "stable" / rel)
+        assert os.stat(stored).st_nlink == 3
+
+def test_link_file_copy_mode():
+    """Test that copy mode yields an independent file."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        source = Path(tmpdir) / "a"
+        source.write_text("data")
+        assert link_file(source, Path(tmpdir) / "sub" / "b", "copy") == "copy"
+        assert not os.path.samefile(source, Path(tmpdir) / "sub" / "b")
+
+def test_promote_between_channels():
+    """Test that promotion links pool files and merges the destination index."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        aptly_root = tmpdir_path / "aptly"
+        debs = tmpdir_path / "debs"
+        debs.mkdir()
+        create_mock_deb_package(debs, "mmg", "1.0.0")
+        create_mock_deb_package(debs, "parmmg", "1.0.0")
+        subprocess.run(["python3", str(SCRIPTS_DIR / "aptly_publish.py"), "--component", "base",
+                        "--channel", "testing", "--debs", str(debs),
+                        "--pages-repo", "https://example.com/repo.git", "--aptly-root", str(aptly_root)],
+                       check=True, capture_output=True)
+
+        result = subprocess.run(["python3", str(SCRIPTS_DIR / "pool.py"), "--aptly-root", str(aptly_root),
+                                 "--from", "testing", "--to", "stable", "--component", "base",
+                                 "--package", "mmg"], capture_output=True, text=True)
+
+        assert result.returncode == 0, result.stderr
+        assert result.stdout == "mmg\t1.0.0\tamd64\n"
+        public = aptly_root / "public"
+        stable = parse_packages((public / "stable/dists/noble/base/binary-amd64/Packages").read_text())
+        assert [s["Package"] for s in stable] == ["mmg"]
+        rel = "pool/base/m/mmg/mmg_1.0.0_amd64.deb"
+        assert os.path.samefile(public / "testing" / rel, public / "stable" / rel)
+
+def test_promote_updates_release_signatures_and_refs():
+    """Test that promotion patches the destination Release, re-signs it and updates refs.json."""
+    class RecordingSession:
+        def __init__(self):
+            self.signed = []
+
+        def sign_all(self, releases):
+            self.signed.extend(str(r) for r in releases)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        aptly_root = tmpdir_path / "aptly"
+        for channel, package in (("testing", "mmg"), ("stable", "gmsh")):
+            debs = tmpdir_path / channel
+            create_mock_deb_package(debs, package, "1.0.0")
+            subprocess.run(["python3", str(SCRIPTS_DIR / "aptly_publish.py"), "--component", "base",
+                            "--channel", channel, "--debs", str(debs),
+                            "--pages-repo", "https://example.com/repo.git", "--aptly-root", str(aptly_root)],
+                           check=True, capture_output=True)
+        public = aptly_root / "public"
+        dists = public / "stable/dists/noble"
+        store = ContentStore(default_store(aptly_root))
+
+        session = RecordingSession()
+        promote(public, store, "testing", "stable", "noble", "base", session=session)
+        assert session.signed == [str(dists / "Release")]
+
+        (dists / "InRelease").write_text("stale signature")
+        promote(public, store, "testing", "feelpp", "noble", "base")
+        promote(public, store, "testing", "stable", "noble", "base")
+        assert not (dists / "InRelease").exists()
+
+        sha256 = dict(parse_release((dists / "Release").read_text()))["SHA256"]
+        listed = {line.split()[2]: line.split()[0] for line in sha256}
+        index = "base/binary-amd64/Packages"
+        assert listed[index] == file_checksums(dists / index)[1]["sha256"]
+        assert (public / "feelpp/dists/noble/Release").exists()
+        refs = RefIndex.load(public / "stable" / REFS_NAME)
+        assert refs.refs("pool/base/m/mmg/mmg_1.0.0_amd64.deb") == 1
+        assert refs.refs("pool/base/g/gmsh/gmsh_1.0.0_amd64.deb") == 1
+
+def test_sync_hashes_and_writes_linked_content_once():
+    """Test that linked pool files across channels are pushed as one blob."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        pages = tmpdir_path / "pages.git"
+        subprocess.run(["git", "init", "-q", "--bare", str(pages)], check=True)
+        source = tmpdir_path / "public"
+        for channel in ("testing", "stable"):
+            (source / channel / "pool").mkdir(parents=True)
+        (source / "testing/pool/big.deb").write_bytes(b"x" * 10000)
+        os.link(source / "testing/pool/big.deb", source / "stable/pool/big.deb")
+
+        result = sync_tree(source, str(pages), ["testing/pool", "stable/pool"])
+
+        assert result.written == 2 and result.bytes_written == 10000
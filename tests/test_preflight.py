@@ -0,0 +1,95 @@
+import dataclasses
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+from benchmark import build_deb
+from preflight import load_records, preflight, save_records, scan_known
+
+from tests.test_utils import create_mock_deb_package
+
+
+def test_preflight_accepts_valid_packages_with_digests():
+    """Test that valid packages come back with size, SHA256 and MD5."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        deb = create_mock_deb_package(tmpdir_path, "pkg-a", "1.0.0")
+        build_deb(tmpdir_path, "pkg-b", "1:2.0-1", payload_size=3 << 20)
+        epoch = tmpdir_path / "pkg-b_1:2.0-1_amd64.deb"
+        epoch.rename(tmpdir_path / "pkg-b_2.0-1_amd64.deb")
+
+        result = preflight(tmpdir_path.glob("*.deb"), jobs=2)
+
+        assert result.ok
+        assert [(p.name, p.version) for p in result.packages] == [("pkg-a", "1.0.0"), ("pkg-b", "1:2.0-1")]
+        data = deb.read_bytes()
+        assert result.packages[0].size == len(data)
+        assert result.packages[0].sha256 == hashlib.sha256(data).hexdigest()
+        assert result.packages[0].md5 == hashlib.md5(data).hexdigest()
+
+def test_preflight_reports_each_problem():
+    """Test detection of bad magic, truncation, missing fields and mislabeled files."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        (tmpdir_path / "text_1.0_amd64.deb").write_text("mock deb content")
+
+        good = build_deb(tmpdir_path, "trunc", "1.0", payload_size=4096)
+        data = good.read_bytes()
+        good.write_bytes(data[:len(data) - 100])
+
+        build_deb(tmpdir_path, "nodesc", "1.0", fields={"Description": ""})
+
+        renamed = build_deb(tmpdir_path, "real", "1.0")
+        shutil.move(str(renamed), str(tmpdir_path / "other_1.0_amd64.deb"))
+
+        result = preflight(tmpdir_path.glob("*.deb"), jobs=1)
+
+        failures = {Path(path).name: problems[0] for path, problems in result.failures.items()}
+        assert not result.packages
+        assert failures["text_1.0_amd64.deb"] == "Missing ar archive magic"
+        assert "truncated" in failures["trunc_1.0_amd64.deb"]
+        assert failures["nodesc_1.0_amd64.deb"] == "Control file lacks Description"
+        assert failures["other_1.0_amd64.deb"] == (
+            "File name does not match control metadata (expected real_1.0_amd64.deb)")
+
+def test_saved_records_are_reused_for_matching_files():
+    """Test that staged links reuse saved records, and files whose size or mtime changed are read again."""
+    script_path = Path(__file__).parent.parent / "scripts" / "preflight.py"
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        debs = tmpdir_path / "debs"
+        create_mock_deb_package(debs, "pkg-a", "1.0.0")
+        create_mock_deb_package(debs, "pkg-b", "1.0.0")
+        create_mock_deb_package(debs, "pkg-c", "1.0.0")
+        records_file = tmpdir_path / "records.json"
+        subprocess.run(["python3", str(script_path), str(debs), "--records", str(records_file)],
+                       capture_output=True, check=True)
+        records = load_records(records_file)
+        assert sorted(records) == ["pkg-a_1.0.0_amd64.deb", "pkg-b_1.0.0_amd64.deb", "pkg-c_1.0.0_amd64.deb"]
+
+        # A marker digest shows which records were reused rather than recomputed
+        marked = {name: dataclasses.replace(info, sha256="0" * 64) for name, (info, _, _) in records.items()}
+        save_records(marked.values(), records_file)
+        stage = tmpdir_path / "stage"
+        stage.mkdir()
+        for name in ("pkg-a_1.0.0_amd64.deb", "pkg-b_1.0.0_amd64.deb"):
+            os.link(debs / name, stage / name)
+        (stage / "pkg-b_1.0.0_amd64.deb").unlink()
+        build_deb(stage, "pkg-b", "1.0.0", payload_size=4096)
+        # Same name and size as its record, but rewritten since
+        shutil.copyfile(debs / "pkg-c_1.0.0_amd64.deb", stage / "pkg-c_1.0.0_amd64.deb")
+        st = os.stat(debs / "pkg-c_1.0.0_amd64.deb")
+        os.utime(stage / "pkg-c_1.0.0_amd64.deb", ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+        checked = preflight(stage.glob("*.deb"), jobs=1, records=load_records(records_file))
+        scanned = scan_known(stage.glob("*.deb"), load_records(records_file), jobs=1)
+
+        for packages in (checked.packages, scanned):
+            assert [p.path for p in packages] == sorted(str(p) for p in stage.glob("*.deb"))
+            assert packages[0].sha256 == "0" * 64
+            assert packages[1].sha256 == hashlib.sha256((stage / "pkg-b_1.0.0_amd64.deb").read_bytes()).hexdigest()
+            assert packages[2].sha256 == hashlib.sha256((stage / "pkg-c_1.0.0_amd64.deb").read_bytes()).hexdigest()
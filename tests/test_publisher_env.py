@@ -0,0 +1,65 @@
+import json
+import tempfile
+from pathlib import Path
+
+import pytest
+from publisher_env import EnvError, env_spec, resolve_version, stamp, verify
+
+
+def make_env(env_dir: Path, exit_code: int = 0) -> None:
+    """A stand-in environment: an entry point script and one library file."""
+    (env_dir / "bin").mkdir(parents=True)
+    entry = env_dir / "bin" / "feelpp-apt-publish"
+    entry.write_text(f"#!/bin/sh\nexit {exit_code}\n")
+    entry.chmod(0o755)
+    (env_dir / "lib").mkdir()
+    (env_dir / "lib" / "publisher.py").write_text("VERSION = '1.0'\n")
+
+
+def test_env_spec_keys_on_version_or_project_files():
+    """Test that the key follows the resolved version or the pyproject/uv.lock content."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        index = tmpdir_path / "index"
+        (index / "feelpp-aptly-publisher").mkdir(parents=True)
+        (index / "feelpp-aptly-publisher" / "json").write_text(json.dumps({"info": {"version": "2.3.0"}}))
+        assert resolve_version(index_url=index.as_uri()) == "2.3.0"
+        released = env_spec(tmpdir_path / "no-project", index_url=index.as_uri())
+        assert released.key.endswith("-2.3.0") and released.requirement == "feelpp-aptly-publisher==2.3.0"
+        assert env_spec(None, version="2.2.5").key != released.key
+        with pytest.raises(EnvError):
+            resolve_version(index_url=(tmpdir_path / "missing").as_uri())
+
+        source = tmpdir_path / "apt"
+        source.mkdir()
+        (source / "pyproject.toml").write_text("[project]\nname = 'feelpp-aptly-publisher'\n")
+        first = env_spec(source)
+        assert first.editable == str(source.resolve()) and "-src-" in first.key and not first.requirement
+        assert env_spec(source).key == first.key
+        (source / "uv.lock").write_text("version = 1\n")
+        assert env_spec(source).key != first.key
+
+def test_verify_detects_tampered_environments():
+    """Test key, file digests and entry point checks of a restored environment."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        env = Path(tmpdir) / "venv"
+        make_env(env)
+        stamp(env, "publisher-env-a")
+        (env / "lib" / "__pycache__").mkdir()
+        (env / "lib" / "__pycache__" / "publisher.pyc").write_bytes(b"\0")
+        assert verify(env, "publisher-env-a") == (True, [])
+        assert verify(env, "publisher-env-b") == (False, ["built for publisher-env-a"])
+
+        (env / "lib" / "publisher.py").write_text("VERSION = '2.0'\n")
+        (env / "lib" / "extra.py").write_text("")
+        assert verify(env, "publisher-env-a") == (False, ["lib/extra.py unexpected", "lib/publisher.py modified"])
+        stamp(env, "publisher-env-a")
+        (env / "lib" / "extra.py").unlink()
+        assert verify(env, "publisher-env-a") == (False, ["lib/extra.py missing"])
+
+        broken = Path(tmpdir) / "broken"
+        make_env(broken, exit_code=1)
+        stamp(broken, "publisher-env-a")
+        valid, reasons = verify(broken, "publisher-env-a")
+        assert not valid and "does not run" in reasons[0]
+        assert verify(Path(tmpdir) / "missing", "publisher-env-a") == (False, ["no environment manifest"])
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import tempfile
+from pathlib import Path
+
+from indexes import packages_stanza, pool_path, write_indexes
+from pages_sync import sync_tree
+from preflight import preflight
+from release import parse_release
+from retention import REFS_NAME, RefIndex, RetentionPolicy, collect, collect_pages
+
+from tests.test_pages_sync import git, make_bare_repo
+from tests.test_utils import create_mock_deb_package
+
+DAY = 86400
+
+
+def publish_version(channel_root: Path, debs: Path, distros, name: str, version: str) -> None:
+    """Add one package version to the pool and to the Packages index of each distro."""
+    deb = create_mock_deb_package(debs, name, version)
+    pkg = preflight([deb]).packages[0]
+    filename = pool_path("base", pkg)
+    (channel_root / filename).parent.mkdir(parents=True, exist_ok=True)
+    (channel_root / filename).write_bytes(deb.read_bytes())
+    for distro in distros:
+        dists = channel_root / "dists" / distro
+        packages = dists / "base/binary-amd64/Packages"
+        existing = packages.read_text() if packages.exists() else ""
+        stanza = "".join(f"{k}: {v}\n" for k, v in packages_stanza(pkg, filename).items())
+        write_indexes(dists, {"base/binary-amd64/Packages": (existing + stanza + "\n").encode()})
+        (dists / "Release").write_text(f"Codename: {distro}\nDate: old\nSHA256:\n")
+
+
+def test_ref_index_counts_and_rereads_only_changed_indexes():
+    """Test reference counts across distributions and incremental reconcile."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        channel = tmpdir_path / "pr"
+        publish_version(channel, tmpdir_path / "debs", ["noble", "jammy"], "pkg-a", "1.0.0")
+
+        refs = RefIndex.load(channel / REFS_NAME)
+        assert refs.reconcile(channel, now=0) == ["dists/jammy/base/binary-amd64/Packages",
+                                                  "dists/noble/base/binary-amd64/Packages"]
+        filename = "pool/base/p/pkg-a/pkg-a_1.0.0_amd64.deb"
+        assert refs.refs(filename) == 2
+        refs.save()
+
+        publish_version(channel, tmpdir_path / "debs", ["noble"], "pkg-a", "1.1.0")
+        refs = RefIndex.load(channel / REFS_NAME)
+        assert refs.reconcile(channel, now=DAY) == ["dists/noble/base/binary-amd64/Packages"]
+        assert refs.files[filename]["published"] == 0
+        assert refs.files["pool/base/p/pkg-a/pkg-a_1.1.0_amd64.deb"]["published"] == DAY
+
+        refs.drop_index("dists/jammy/base/binary-amd64/Packages")
+        assert refs.refs(filename) == 1 and refs.unreferenced() == []
+
+def test_collect_keeps_newest_and_sweeps_unreferenced():
+    """Test keep-last-N: indexes are rewritten, Release patched, orphans deleted once."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        channel = tmpdir_path / "pr"
+        debs = tmpdir_path / "debs"
+        for day, version in enumerate(["1.0.0", "1.1.0", "1.2.0"]):
+            publish_version(channel, debs, ["noble"], "pkg-a", version)
+            refs = RefIndex.load(channel / REFS_NAME)
+            refs.reconcile(channel, now=day * DAY)
+            refs.save()
+        # jammy still serves 1.0.0, so that pool file must survive
+        (channel / "dists/jammy/base/binary-amd64").mkdir(parents=True)
+        noble = (channel / "dists/noble/base/binary-amd64/Packages").read_text()
+        jammy = [p for p in noble.split("\n\n") if "Version: 1.0.0" in p][0] + "\n\n"
+        (channel / "dists/jammy/base/binary-amd64/Packages").write_text(jammy)
+
+        dry = collect(channel, RetentionPolicy(keep=1), now=3 * DAY, dry_run=True)
+        assert [s["Version"] for s in dry.removed] == ["1.1.0", "1.0.0"]
+        assert dry.deleted == ["pool/base/p/pkg-a/pkg-a_1.1.0_amd64.deb"]
+        assert (channel / dry.deleted[0]).exists()
+
+        result = collect(channel, RetentionPolicy(keep=1), now=3 * DAY)
+        assert result.indexes == ["dists/noble/base/binary-amd64/Packages"]
+        assert result.deleted == ["pool/base/p/pkg-a/pkg-a_1.1.0_amd64.deb"]
+        assert not (channel / result.deleted[0]).exists()
+        assert (channel / "pool/base/p/pkg-a/pkg-a_1.0.0_amd64.deb").exists()
+        packages = (channel / "dists/noble/base/binary-amd64/Packages").read_bytes()
+        assert b"Version: 1.2.0" in packages and b"Version: 1.1.0" not in packages
+
+        release = dict(parse_release((channel / "dists/noble/Release").read_text()))
+        sums = {line.split()[2]: line.split()[0] for line in release["SHA256"]}
+        assert sums["base/binary-amd64/Packages"] == hashlib.sha256(packages).hexdigest()
+        assert set(sums) == {"base/binary-amd64/Packages", "base/binary-amd64/Packages.gz",
+                             "base/binary-amd64/Packages.xz"}
+        assert release["Date"] != ["old"]
+
+        # jammy's entry expires by age; its file is the last reference and goes too
+        aged = collect(channel, RetentionPolicy(max_age_days=2), now=3 * DAY)
+        assert [s["Version"] for s in aged.removed] == ["1.0.0"]
+        assert aged.deleted == ["pool/base/p/pkg-a/pkg-a_1.0.0_amd64.deb"]
+        assert collect(channel, RetentionPolicy(keep=1), now=3 * DAY).removed == []
+
+def test_collect_pages_pushes_the_sweep_without_fetching_the_pool():
+    """Test GC against the pages repository: one commit, pool files deleted by path, never fetched."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        source = tmpdir_path / "public"
+        channel = source / "pr"
+        for day, version in enumerate(["1.0.0", "1.1.0", "1.2.0"]):
+            publish_version(channel, tmpdir_path / "debs", ["noble"], "pkg-a", version)
+            refs = RefIndex.load(channel / REFS_NAME)
+            refs.reconcile(channel, now=day * DAY)
+            refs.save()
+        pages = make_bare_repo(tmpdir_path / "pages.git")
+        sync_tree(source, str(pages), ["pr"])
+        pool = "pr/pool/base/p/pkg-a/pkg-a_%s_amd64.deb"
+        pool_blobs = {git("rev-parse", f"gh-pages:{pool % version}", cwd=pages).strip()
+                      for version in ("1.0.0", "1.1.0", "1.2.0")}
+
+        dry = collect_pages(str(pages), "pr", RetentionPolicy(keep=1), dry_run=True)
+        assert dry.deleted == ["pool/base/p/pkg-a/pkg-a_1.0.0_amd64.deb",
+                               "pool/base/p/pkg-a/pkg-a_1.1.0_amd64.deb"]
+        assert len(git("rev-list", "gh-pages", cwd=pages).split()) == 1
+
+        result = collect_pages(str(pages), "pr", RetentionPolicy(keep=1), workdir=tmpdir_path / "work")
+        objects = git("cat-file", "--batch-check", "--batch-all-objects",
+                      cwd=tmpdir_path / "work" / "pages.git")
+
+        assert result.deleted == dry.deleted
+        assert result.bytes_freed == sum(len((channel / name).read_bytes()) for name in result.deleted)
+        assert git("ls-tree", "-r", "--name-only", "gh-pages", "pr/pool", cwd=pages).split() == [pool % "1.2.0"]
+        packages = git("show", "gh-pages:pr/dists/noble/base/binary-amd64/Packages", cwd=pages)
+        assert "Version: 1.2.0" in packages and "Version: 1.1.0" not in packages
+        refs = json.loads(git("show", "gh-pages:pr/refs.json", cwd=pages))
+        assert set(refs["files"]) == {"pool/base/p/pkg-a/pkg-a_1.2.0_amd64.deb"}
+        assert git("log", "-1", "--format=%s", "gh-pages", cwd=pages).strip() == "GC pr channel"
+        assert not pool_blobs & {line.split()[0] for line in objects.splitlines()}
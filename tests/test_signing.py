@@ -0,0 +1,64 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+import pytest
+from signing import GpgSession, SigningError, latency_summary
+
+from tests.conftest import PASSPHRASE, generate_key
+
+pytestmark = pytest.mark.skipif(shutil.which("gpg") is None, reason="gpg not installed")
+
+
+def test_sign_all_with_preset_passphrase(gnupghome):
+    """Test that one session signs several Release files verifiably."""
+    keyid = generate_key(gnupghome)
+    env = {**os.environ, "GNUPGHOME": str(gnupghome)}
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        releases = []
+        for distro in ("noble", "jammy", "bookworm"):
+            release = Path(tmpdir) / "dists" / distro / "Release"
+            release.parent.mkdir(parents=True)
+            release.write_text(f"Origin: Feel++\nCodename: {distro}\n")
+            releases.append(release)
+
+        with GpgSession(keyid, PASSPHRASE, gnupghome=gnupghome, jobs=3) as session:
+            results = session.sign_all(releases)
+
+        assert [r.release for r in results] == [str(r) for r in releases]
+        for release in releases:
+            inrelease = release.with_name("InRelease")
+            assert "BEGIN PGP SIGNED MESSAGE" in inrelease.read_text()
+            subprocess.run(["gpg", "--batch", "--verify", str(inrelease)], env=env, check=True,
+                           capture_output=True)
+            subprocess.run(["gpg", "--batch", "--verify", str(release) + ".gpg", str(release)],
+                           env=env, check=True, capture_output=True)
+
+        summary = latency_summary(results)
+        assert summary["files"] == 3
+        assert 0 < summary["min"] <= summary["mean"] <= summary["max"]
+        assert not (gnupghome / "gpg-agent.conf").exists()
+
+def test_running_agent_without_presets_falls_back_to_loopback(gnupghome):
+    """Test that an agent that refuses presets is neither reconfigured nor an obstacle to signing."""
+    keyid = generate_key(gnupghome)
+    env = {**os.environ, "GNUPGHOME": str(gnupghome)}
+    subprocess.run(["gpgconf", "--launch", "gpg-agent"], env=env, check=True)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        release = Path(tmpdir) / "Release"
+        release.write_text("Origin: Feel++\nCodename: noble\n")
+        with GpgSession(keyid, PASSPHRASE, gnupghome=gnupghome) as session:
+            session.sign_all([release])
+
+        subprocess.run(["gpg", "--batch", "--verify", str(release.with_name("InRelease"))], env=env,
+                       check=True, capture_output=True)
+    assert not (gnupghome / "gpg-agent.conf").exists()
+
+def test_unknown_key_is_reported(gnupghome):
+    """Test that a missing key fails when the session starts, before any signing."""
+    with pytest.raises(SigningError):
+        GpgSession("ABCD1234", gnupghome=gnupghome).start()
@@ -0,0 +1,89 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from timing import PhaseTimer, github_outputs, load_report, markdown_summary
+
+from tests.test_utils import create_mock_deb_package
+
+TIMING_SCRIPT = Path(__file__).parent.parent / "scripts" / "timing.py"
+
+
+def test_phase_timer_records_spans():
+    """Test wall/CPU measurement, package counts and I/O accounting per phase."""
+    timer = PhaseTimer()
+    with timer.phase("wait") as span:
+        time.sleep(0.05)
+        span.packages = 3
+    with timer.phase("write") as span:
+        with tempfile.TemporaryFile() as f:
+            f.write(b"x" * 100000)
+    with timer.phase("explicit") as span:
+        span.bytes_read = 42
+
+    report = timer.report()
+
+    wait, write, explicit = report["phases"]
+    assert wait["wall_seconds"] >= 0.05 and wait["packages"] == 3
+    assert wait["cpu_seconds"] < wait["wall_seconds"]
+    if os.path.exists("/proc/self/io"):
+        assert write["bytes_written"] >= 100000
+    assert explicit["bytes_read"] == 42
+    assert report["total"]["wall_seconds"] >= wait["wall_seconds"]
+    assert report["total"]["packages"] == 3
+
+def test_github_outputs_and_summary():
+    """Test the GITHUB_OUTPUT keys and step-summary table for a report."""
+    timer = PhaseTimer()
+    with timer.phase("publish stable/noble/base"):
+        pass
+    report = timer.report()
+
+    outputs = github_outputs(report)
+    assert set(outputs) == {"publish-seconds", "phase-publish-stable-noble-base-seconds"}
+    assert "| publish stable/noble/base |" in markdown_summary(report)
+
+def test_run_command_appends_to_report():
+    """Test that wrapped shell commands accumulate phases and keep their exit code."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        report = Path(tmpdir) / "report.json"
+        github_output = Path(tmpdir) / "github_output"
+        env = {**os.environ, "GITHUB_OUTPUT": str(github_output)}
+
+        ok = subprocess.run([sys.executable, str(TIMING_SCRIPT), "run", "--report", str(report),
+                             "--phase", "install", "--", "true"], env=env)
+        failed = subprocess.run([sys.executable, str(TIMING_SCRIPT), "run", "--report", str(report),
+                                 "--phase", "publish", "--packages", "5", "--", "false"], env=env)
+        subprocess.run([sys.executable, str(TIMING_SCRIPT), "summary", "--report", str(report),
+                        "--github-output"], env=env, check=True, capture_output=True)
+
+        assert (ok.returncode, failed.returncode) == (0, 1)
+        assert [p["name"] for p in load_report(report)["phases"]] == ["install", "publish"]
+        assert "phase-publish-seconds=" in github_output.read_text()
+
+def test_mock_publish_writes_report():
+    """Test that the mock publish pipeline reports every phase."""
+    script_path = Path(__file__).parent.parent / "scripts" / "aptly_publish.py"
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir_path = Path(tmpdir)
+        deb = create_mock_deb_package(tmpdir_path, "pkg-a", "1.0.0")
+        report = tmpdir_path / "report.json"
+
+        result = subprocess.run([
+            "python3", str(script_path),
+            "--component", "base",
+            "--debs", str(tmpdir_path),
+            "--pages-repo", "https://example.com/repo.git",
+            "--report", str(report),
+        ], capture_output=True, text=True)
+
+        assert result.returncode == 0
+        phases = json.loads(report.read_text())["phases"]
+        assert [p["name"] for p in phases] == ["preflight", "add-packages", "snapshot", "publish", "sync"]
+        assert phases[0]["packages"] == 1
+        assert phases[0]["bytes_read"] == deb.stat().st_size
@@ -7,11 +7,12 @@ import tempfile
 import subprocess
 from pathlib import Path
 
-def create_mock_deb_package(output_dir: Path, package_name: str = "test-package", version: str = "1.0.0") -> Path:
+def create_mock_deb_package(output_dir: Path, package_name: str = "test-package", version: str = "1.0.0",
+                            architecture: str = "amd64") -> Path:
     """Create a mock .deb package for testing."""
     
     # Create package structure
-    pkg_dir = output_dir / f"{package_name}-{version}"
+    pkg_dir = output_dir / f"{package_name}-{version}-{architecture}"
     debian_dir = pkg_dir / "DEBIAN" 
     debian_dir.mkdir(parents=True, exist_ok=True)
     
@@ -20,7 +21,7 @@ def create_mock_deb_package(output_dir: Path, package_name: str = "test-package"
 Version: {version}
 Section: utils
 Priority: optional
-Architecture: amd64
+Architecture: {architecture}
 Maintainer: Test <test@example.com>
 Description: Mock package for testing setup-aptly action
 """
@@ -34,7 +35,7 @@ Description: Mock package for testing setup-aptly action
     (usr_bin / package_name).write_text("#!/bin/bash\necho 'Mock executable'\n")
     
     # Build the .deb package
-    deb_file = output_dir / f"{package_name}_{version}_amd64.deb"
+    deb_file = output_dir / f"{package_name}_{version}_{architecture}.deb"
     result = subprocess.run([
         "dpkg-deb", "--build", str(pkg_dir), str(deb_file)
     ], capture_output=True, text=True)
@@ -0,0 +1,65 @@
+import itertools
+import random
+import shutil
+import subprocess
+
+import pytest
+from versions import (
+    VersionError,
+    VersionIndex,
+    bump_revision,
+    compare_versions,
+    parse_version,
+    version_key,
+)
+
+# Ascending dpkg order; each line is strictly greater than the previous one
+ORDERED = [
+    "0.9", "1.0~~", "1.0~~a", "1.0~", "1.0~rc1", "1.0", "1.0-0.1", "1.0-1~bpo1", "1.0-1",
+    "1.0-1ubuntu1", "1.0-2", "1.0-10", "1.0a", "1.0+dfsg-1", "1.0.0", "1.00.1", "1.1", "10.0", "1:0.1",
+]
+
+
+def test_compare_versions_orders_like_dpkg():
+    """Test epochs, tildes, letters vs. symbols and numeric runs."""
+    shuffled = list(ORDERED)
+    random.Random(1).shuffle(shuffled)
+    assert sorted(shuffled, key=version_key) == ORDERED
+    for lower, higher in zip(ORDERED, ORDERED[1:]):
+        assert compare_versions(lower, higher) == -1
+        assert compare_versions(higher, lower) == 1
+    assert compare_versions("1.0", "1.0-0") == 0
+    assert compare_versions("1.0", "0:1.00") == 0
+    assert parse_version("2:1.0-1-3").revision == "3"
+    for bad in ("", "a1.0", "1.0-", "1.0 beta"):
+        with pytest.raises(VersionError):
+            parse_version(bad)
+
+@pytest.mark.skipif(shutil.which("dpkg") is None, reason="dpkg not available")
+def test_compare_versions_matches_dpkg_binary():
+    """Test agreement with dpkg --compare-versions on every pair of the table."""
+    for a, b in itertools.combinations(ORDERED[::3] + ["1.0-1", "1.0~rc1-1"], 2):
+        op = {-1: "lt", 0: "eq", 1: "gt"}[compare_versions(a, b)]
+        assert subprocess.run(["dpkg", "--compare-versions", a, op, b]).returncode == 0, (a, op, b)
+
+def test_version_index_lookups_and_auto_bump():
+    """Test sorted per-package versions, existence checks and the next free revision."""
+    index = VersionIndex.from_stanzas([
+        {"Package": "feelpp-tools", "Version": "1.0-2", "Architecture": "amd64"},
+        {"Package": "feelpp-tools", "Version": "1.0-1", "Architecture": "amd64"},
+        {"Package": "feelpp-tools", "Version": "1.0-1", "Architecture": "arm64"},
+        {"Package": "feelpp-tools", "Version": "1.0~rc1-1", "Architecture": "amd64"},
+        {"Package": "feelpp-doc", "Version": "2.0", "Architecture": "all"},
+    ])
+    assert len(index) == 4
+    assert index.versions("feelpp-tools") == ["1.0~rc1-1", "1.0-1", "1.0-2"]
+    assert index.latest("feelpp-tools") == "1.0-2" and index.latest("missing") is None
+    assert index.exists("feelpp-tools", "1.0-1", "arm64")
+    assert not index.exists("feelpp-tools", "1.0-2", "arm64")
+    assert index.exists("feelpp-doc", "2.0-0", "amd64")
+
+    assert index.next_revision("feelpp-tools", "1.1-1") == "1.1-1"
+    assert index.next_revision("feelpp-tools", "1.0-1") == "1.0-3"
+    assert index.next_revision("feelpp-doc", "2.0") == "2.0-1"
+    assert bump_revision("1:1.0-1ubuntu") == "1:1.0-1ubuntu1"
+    assert bump_revision("1.0-0.9") == "1.0-0.10"